@@ -0,0 +1,190 @@
+"""Compare event loop implementations on the same bot driven workload.
+
+For each loop, starts a server on that loop in a subprocess (no prepare
+delay, short answer window, logging at WARNING), plays the same matches
+against it with tools/bot_swarm.py and reports the server's CPU time next to
+the swarm's latency figures.
+
+    python benchmarks/bench_loops.py --bots 500 --matches 3
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+SERVER_DIR = os.path.join(os.path.dirname(__file__), "..", "server")
+BOT_SWARM = os.path.join(os.path.dirname(__file__), "..", "tools", "bot_swarm.py")
+sys.path.insert(0, SERVER_DIR)
+
+import log  # noqa: E402
+from loops import LOOP_CHOICES, new_event_loop  # noqa: E402
+from server import Server  # noqa: E402
+
+
+def serve(args: argparse.Namespace) -> None:
+    log.setup_logging("WARNING")
+    loop: asyncio.AbstractEventLoop = new_event_loop(args.loop)
+    asyncio.set_event_loop(loop)
+
+    async def run() -> None:
+        server_state = Server(
+            args.room_size, args.race_length, args.bots, args.answer_time, 0
+        )
+        server = await asyncio.start_server(
+            server_state.handle_conversation, "localhost", args.port
+        )
+        async with server:
+            await server.serve_forever()
+
+    loop.run_until_complete(run())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10) -> None:
+    deadline: float = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("localhost", port), 0.1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def run_loop(args: argparse.Namespace, loop_name: str) -> Dict[str, Any]:
+    port: int = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            "--serve",
+            "--loop",
+            loop_name,
+            "--port",
+            str(port),
+            "--bots",
+            str(args.bots),
+            "--room-size",
+            str(args.room_size),
+            "--race-length",
+            str(args.race_length),
+            "--answer-time",
+            str(args.answer_time),
+        ]
+    )
+    try:
+        # The probe connection is accepted and dropped by the server
+        wait_for_port(port)
+        with tempfile.NamedTemporaryFile(suffix=".json") as report_file:
+            started: float = time.perf_counter()
+            subprocess.run(
+                [
+                    sys.executable,
+                    BOT_SWARM,
+                    "--port",
+                    str(port),
+                    "--bots",
+                    str(args.bots),
+                    "--room-size",
+                    str(args.room_size),
+                    "--race-length",
+                    str(args.race_length),
+                    "--matches",
+                    str(args.matches),
+                    "--think-time",
+                    args.think_time,
+                    "--loop",
+                    loop_name,
+                    "--seed",
+                    "1",
+                    "--json",
+                    report_file.name,
+                    *(["--binary"] if args.binary else []),
+                ],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            elapsed: float = time.perf_counter() - started
+            swarm: Dict[str, Any] = json.load(report_file)
+    finally:
+        server.terminate()
+    _, _, usage = os.wait4(server.pid, 0)
+    return {
+        "loop": loop_name,
+        "elapsed_s": elapsed,
+        "server_cpu_s": usage.ru_utime + usage.ru_stime,
+        "swarm": swarm,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Event loop comparison")
+    parser.add_argument(
+        "--loops",
+        type=lambda value: value.split(","),
+        default=["asyncio", "uvloop"],
+        help="Comma separated loops to compare. Default to asyncio,uvloop.",
+    )
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--room-size", type=int, default=10)
+    parser.add_argument("--race-length", type=int, default=5)
+    parser.add_argument("--matches", type=int, default=2)
+    parser.add_argument("--answer-time", type=int, default=1)
+    parser.add_argument("--think-time", default="uniform:0,0.5")
+    parser.add_argument("--binary", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    # used by the server subprocess
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--loop", default="asyncio", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    results: List[Dict[str, Any]] = []
+    for loop_name in args.loops:
+        if loop_name not in LOOP_CHOICES:
+            parser.error(f"Unknown loop: {loop_name}")
+        if loop_name != "asyncio" and importlib.util.find_spec("uvloop") is None:
+            print(f"{loop_name}: uvloop is not installed, skipping.", file=sys.stderr)
+            continue
+        results.append(run_loop(args, loop_name))
+
+    print(
+        f"{'loop':<10}{'server cpu':>12}{'connect/s':>12}"
+        f"{'fan-out p99':>14}{'result p99':>12}{'errors':>8}"
+    )
+    for result in results:
+        swarm: Dict[str, Any] = result["swarm"]
+        fan_out: Dict[str, Any] = swarm["broadcast_fan_out"].get("QUESTION", {})
+        errors: int = sum(swarm["errors"].values())
+        print(
+            f"{result['loop']:<10}"
+            f"{result['server_cpu_s']:>11.2f}s"
+            f"{swarm['connect_rate_per_s'] or 0:>12.0f}"
+            f"{fan_out.get('p99_ms', 0):>12.2f}ms"
+            f"{swarm['answer_to_result'].get('p99_ms', 0):>10.0f}ms"
+            f"{errors:>8}"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
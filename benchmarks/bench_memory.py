@@ -0,0 +1,203 @@
+"""Measure how much server memory each connection takes.
+
+Starts a server in a subprocess, opens --connections sockets to it that send
+nothing, then has every one of them register as a player in rooms of
+--room-size. Reports the growth of the server's resident set size per idle
+and per active (registered) connection, and what the server would need to
+hold --target players.
+
+    python benchmarks/bench_memory.py --connections 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+SERVER_DIR = os.path.join(os.path.dirname(__file__), "..", "server")
+sys.path.insert(0, SERVER_DIR)
+
+import log  # noqa: E402
+import server  # noqa: E402
+from bench_loops import free_port, wait_for_port  # noqa: E402
+from connection import READ_LIMIT  # noqa: E402
+from protocol import TEXT  # noqa: E402
+
+# Connections opened at once
+CONNECT_BATCH = 200
+RACE_LENGTH = 10
+
+Stream = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def raise_fd_limit() -> None:
+    # Each connection is a descriptor on both ends
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def serve(args: argparse.Namespace) -> None:
+    raise_fd_limit()
+    log.setup_logging("WARNING")
+    # Room for the measured connections and the one settle() opens
+    server.MAX_CONNECTIONS = args.connections + 1
+
+    async def run() -> None:
+        server_state = server.Server(
+            args.room_size,
+            RACE_LENGTH,
+            args.connections // args.room_size + 1,
+            prepare_time_limit=0,
+        )
+        listener = await asyncio.start_server(
+            server_state.handle_conversation, "localhost", args.port, limit=READ_LIMIT
+        )
+        async with listener:
+            await listener.serve_forever()
+
+    asyncio.run(run())
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("VmRSS not found.")
+
+
+async def request(stream: Stream, command: str, *args: Any) -> List[Any]:
+    """Send a request and wait for the reply, skipping room broadcasts."""
+    reader, writer = stream
+    writer.write(TEXT.encode(command, args))
+    while True:
+        frame: bytes = await TEXT.read_frame(reader)
+        if not frame:
+            raise ConnectionError(f"Server closed the connection after {command}.")
+        reply, reply_args = TEXT.decode(frame)
+        if reply not in ("PLAYER_JOINED", "PLAYER_LEFT"):
+            return [reply, *reply_args]
+
+
+async def settle(port: int) -> None:
+    # The server accepts in order, so once a new connection got its reply,
+    # every earlier one has been accepted too
+    stream: Stream = await asyncio.open_connection("localhost", port)
+    reply: List[Any] = await request(stream, "ROOM_LIST")
+    if reply[0] != "ROOM_LIST":
+        raise RuntimeError(f"Server did not take the connection: {reply}")
+    stream[1].close()
+    await asyncio.sleep(0.5)
+
+
+async def open_connections(port: int, count: int) -> List[Stream]:
+    streams: List[Stream] = []
+    while len(streams) < count:
+        batch: int = min(CONNECT_BATCH, count - len(streams))
+        streams += await asyncio.gather(
+            *(asyncio.open_connection("localhost", port) for _ in range(batch))
+        )
+    return streams
+
+
+async def fill_room(streams: List[Stream], room_size: int, first: int) -> None:
+    reply: List[Any] = await request(streams[0], "ROOM_CREATE", room_size, RACE_LENGTH)
+    if reply[0] != "ROOM_CREATED":
+        raise RuntimeError(f"Could not create a room: {reply}")
+    room_id: int = int(reply[1])
+    for index, stream in enumerate(streams):
+        if index > 0:
+            await request(stream, "ROOM_JOIN", room_id)
+        reply = await request(stream, "REGISTER", f"p{first + index}")
+        if reply[0] != "REGISTRATION_SUCCESS":
+            raise RuntimeError(f"Could not register: {reply}")
+
+
+async def measure(args: argparse.Namespace, pid: int) -> Dict[str, Any]:
+    await settle(args.port)
+    baseline: int = rss_bytes(pid)
+
+    streams: List[Stream] = await open_connections(args.port, args.connections)
+    await settle(args.port)
+    idle: int = rss_bytes(pid)
+
+    await asyncio.gather(
+        *(
+            fill_room(streams[first : first + args.room_size], args.room_size, first)
+            for first in range(0, len(streams), args.room_size)
+        )
+    )
+    await settle(args.port)
+    active: int = rss_bytes(pid)
+
+    for _, writer in streams:
+        writer.close()
+
+    idle_per_connection: float = (idle - baseline) / args.connections
+    active_per_connection: float = (active - baseline) / args.connections
+    return {
+        "connections": args.connections,
+        "room_size": args.room_size,
+        "baseline_rss_mb": baseline / 2**20,
+        "idle_bytes_per_connection": round(idle_per_connection),
+        "active_bytes_per_connection": round(active_per_connection),
+        "target_players": args.target,
+        "target_rss_mb": (baseline + args.target * active_per_connection) / 2**20,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Racing Arena memory benchmark")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--room-size", type=int, default=100)
+    parser.add_argument(
+        "--target",
+        type=int,
+        default=100000,
+        help="Players to extrapolate the server's memory to. Default to 100000.",
+    )
+    parser.add_argument("--json", help="Also write the report to this file.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    raise_fd_limit()
+    args.port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            "--serve",
+            "--port",
+            str(args.port),
+            "--connections",
+            str(args.connections),
+            "--room-size",
+            str(args.room_size),
+        ]
+    )
+    try:
+        wait_for_port(args.port)
+        started: float = time.perf_counter()
+        report: Dict[str, Any] = asyncio.run(measure(args, process.pid))
+        report["wall_time_s"] = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
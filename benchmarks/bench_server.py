@@ -0,0 +1,267 @@
+"""Microbenchmarks for the server's per-round hot paths.
+
+Times the player roster scans, the roster packing, grading every answer of a
+round, finishing the round and question generation at several room sizes,
+prints a table and optionally writes the results as JSON. Given a baseline
+file, any benchmark slower than the baseline by more than --tolerance makes
+the run exit non-zero.
+
+    python benchmarks/bench_server.py --baseline benchmarks/baseline.json
+    python benchmarks/bench_server.py --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import scoring  # noqa: E402
+from client_manager import ClientManager  # noqa: E402
+from game import Game, GameState  # noqa: E402
+from player_manager import MAX_WA_STREAK, PlayerManager  # noqa: E402
+from question_manager import Question, QuestionManager, QuestionPool  # noqa: E402
+
+SIZES = [10, 1_000, 100_000]
+# Fail when a benchmark is this much slower than the baseline (0.5 = +50%)
+TOLERANCE = 0.5
+# Cap on individually timed calls per benchmark
+MAX_SAMPLES = 10_000
+
+
+def make_players(player_manager: PlayerManager, count: int) -> None:
+    # register_player enforces the room limit, so add the players directly
+    rng = random.Random(count)
+    for index in range(count):
+        player = player_manager.new_player(f"p{index}")
+        player.is_ready = True
+        player.position = rng.randint(1, 5)
+        player.diff_points = rng.randint(-1, 1)
+        player.wa_streak = rng.randint(0, 2)
+        player_manager.add_player(player)
+
+
+def make_game(count: int, use_board: bool) -> Game:
+    # Nobody reaches the finish line, so the match never ends
+    game = Game(1, count, 1 << 30, ClientManager({}), use_score_board=use_board)
+    make_players(game.player_manager, count)
+    game.state = GameState.PROCESSING
+    return game
+
+
+def open_round(game: Game, question: Question) -> None:
+    # Nobody is disqualified yet
+    for player in game.player_manager.players.values():
+        player.reset_new_round()
+        player.is_disqualified = False
+        player.wa_streak = 0
+    game.player_manager.reindex()
+    game.open_answer_window(question)
+
+
+def answer_round(game: Game, question: Question) -> None:
+    # Nine in ten players answer correctly
+    for index, nickname in enumerate(game.player_manager.players):
+        game.handle_answer(nickname, question.answer + (index % 10 == 0))
+
+
+def measure(
+    func: Callable[[], Any],
+    setup: Optional[Callable[[], Any]],
+    repeat: int,
+    budget: float,
+) -> Dict[str, float]:
+    """Per-call time in seconds: best and median over the samples.
+
+    Without setup, calls are batched so that each of the repeat batches takes
+    about budget seconds. With setup, every call gets a fresh state and is
+    timed alone, until repeat samples and repeat * budget seconds, setups
+    included, are spent.
+    """
+    samples: List[float] = []
+    if setup is None:
+        started: float = time.perf_counter()
+        func()
+        elapsed: float = time.perf_counter() - started
+        number: int = max(1, int(budget / max(elapsed, 1e-9)))
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - started) / number)
+    else:
+        deadline: float = time.perf_counter() + repeat * budget
+        while len(samples) < repeat or (
+            time.perf_counter() < deadline and len(samples) < MAX_SAMPLES
+        ):
+            setup()
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+    return {"best": min(samples), "median": statistics.median(samples)}
+
+
+def benchmarks(count: int, use_board: bool) -> Dict[str, Dict[str, Any]]:
+    """Benchmarks for a room of count players: name -> func and optional setup."""
+    game = make_game(count, use_board)
+    player_manager: PlayerManager = game.player_manager
+    question = Question(6, 7, "*", 42)
+
+    def reset_streaks() -> None:
+        # Everybody is on their last wrong answer, so every call disqualifies
+        for player in player_manager.players.values():
+            player.is_disqualified = False
+            player.wa_streak = MAX_WA_STREAK
+        player_manager.reindex()
+
+    return {
+        "is_over": {"func": game.is_over},
+        "start_round": {"func": player_manager.start_round},
+        "handle_answer": {
+            "func": lambda: answer_round(game, question),
+            "setup": lambda: open_round(game, question),
+        },
+        "finish_round": {
+            "func": lambda: game.finish_round(question),
+            "setup": lambda: (open_round(game, question), answer_round(game, question)),
+        },
+        "disqualify_players": {
+            "func": player_manager.disqualify_players,
+            "setup": reset_streaks,
+        },
+        "get_qualified_players": {"func": player_manager.get_qualified_players},
+        "can_start_game": {"func": player_manager.can_start_game},
+        "pack_players_lobby_info": {"func": player_manager.pack_players_lobby_info},
+        "pack_players_round_info": {"func": player_manager.pack_players_round_info},
+        "pack_players_round_delta": {
+            "func": player_manager.pack_players_round_delta,
+            "setup": player_manager.forget_sent_scores,
+        },
+    }
+
+
+def run(
+    sizes: List[int], repeat: int, budget: float, only: Optional[List[str]] = None
+) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    random.seed(0)
+    question_manager = QuestionManager(0)
+    if only is None or "generate_question" in only:
+        results["generate_question"] = measure(
+            question_manager.generate_question, None, repeat, budget
+        )
+    if only is None or "generate_batch" in only:
+        results["generate_batch"] = measure(
+            QuestionPool(0).generate_batch, None, repeat, budget
+        )
+    # Rooms score player by player, and with NumPy also on a ScoreBoard
+    engines: List[bool] = [False, True] if scoring.is_available() else [False]
+    for count in sizes:
+        for use_board in engines:
+            for name, bench in benchmarks(count, use_board).items():
+                key: str = f"{name}[{count}{',board' if use_board else ''}]"
+                if only is None or key in only:
+                    results[key] = measure(
+                        bench["func"], bench.get("setup"), repeat, budget
+                    )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    regressions: List[str] = []
+    for name, timing in results.items():
+        if name in baseline and timing["best"] > baseline[name]["best"] * (
+            1 + tolerance
+        ):
+            regressions.append(name)
+    return regressions
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server hot path benchmarks")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=SIZES,
+        help="Comma separated player counts. Default to 10,1000,100000.",
+    )
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument(
+        "--budget", type=float, default=0.05, help="Seconds per timed batch."
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against this results file.")
+    parser.add_argument(
+        "--save-baseline", help="Write the results to this file as the new baseline."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="Allowed slowdown against the baseline. Default to 0.5 (+50%%).",
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = run(args.sizes, args.repeat, args.budget)
+    baseline: Dict[str, Dict[str, float]] = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+    regressions: List[str] = compare(results, baseline, args.tolerance)
+    if regressions:
+        # Measure the suspects again so one noisy run does not fail the build
+        retry: Dict[str, Dict[str, float]] = run(
+            args.sizes, args.repeat, args.budget, regressions
+        )
+        for name, timing in retry.items():
+            if timing["best"] < results[name]["best"]:
+                results[name] = timing
+        regressions = compare(results, baseline, args.tolerance)
+
+    for name, timing in results.items():
+        line: str = f"{name:<36}{format_time(timing['best']):>12}"
+        if name in baseline:
+            ratio: float = timing["best"] / baseline[name]["best"]
+            line += f"{ratio:>9.2f}x"
+            if name in regressions:
+                line += "  REGRESSION"
+        print(line)
+
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+
+    if regressions:
+        print(
+            f"{len(regressions)} benchmark(s) regressed by more than "
+            f"{args.tolerance:.0%}: {', '.join(regressions)}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
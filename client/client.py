@@ -1,13 +1,17 @@
-import asyncio
+import argparse
 import pygame
-import threading
 import queue
 from typing import Tuple, List, Optional
 
 from registration_scene import RegistrationScene
 from scene_manager import SceneManager
 from globals import SCREEN_SIZE, LOGGER
-from connection_manager import ConnectionManager
+from connection_manager import (
+    ConnectionManager,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TIMEOUT,
+)
+from loops import LOOP_CHOICES
 
 connection = ConnectionManager()
 
@@ -34,16 +38,42 @@ def game_loop() -> None:
 
 
 if __name__ == "__main__":
-    loop = asyncio.new_event_loop()
-    asyncio.run_coroutine_threadsafe(
-        connection.handle_conversation("localhost", 54321), loop
+    parser = argparse.ArgumentParser(description="Client for Racing Arena")
+    parser.add_argument(
+        "--loop",
+        choices=LOOP_CHOICES,
+        default="asyncio",
+        help="Event loop for the network thread. uvloop falls back to asyncio when it is not installed. Default to asyncio.",
+    )
+    parser.add_argument(
+        "--heartbeat-interval",
+        type=float,
+        default=HEARTBEAT_INTERVAL,
+        help=f"Ping the server this often, 0 to never. Default to {HEARTBEAT_INTERVAL} (seconds).",
+    )
+    parser.add_argument(
+        "--heartbeat-timeout",
+        type=float,
+        default=HEARTBEAT_TIMEOUT,
+        help=f"Drop the connection when the server sends nothing for this long. Default to {HEARTBEAT_TIMEOUT} (seconds).",
+    )
+    args = parser.parse_args()
+    if (
+        args.heartbeat_interval > 0
+        and args.heartbeat_timeout <= args.heartbeat_interval
+    ):
+        parser.error("--heartbeat-timeout must be longer than --heartbeat-interval")
+
+    connection.start(
+        "localhost",
+        54321,
+        args.loop,
+        args.heartbeat_interval,
+        args.heartbeat_timeout,
     )
-    game_thread = threading.Thread(target=loop.run_forever)
-    game_thread.start()
     try:
         game_loop()
     except SystemExit:
-        # terminate the thread
-        loop.call_soon_threadsafe(loop.stop)
-        game_thread.join()
+        # terminate the network thread
+        connection.stop()
         LOGGER.info("Client closed")
@@ -1,7 +1,24 @@
 import asyncio
 import queue
-from typing import Optional, Tuple, List
+import threading
+import time
+from typing import Any, Coroutine, Optional, Tuple, List
 from globals import LOGGER
+from loops import new_event_loop
+from protocol import BINARY, TEXT, Codec, ProtocolError
+
+# Protocol features offered to the server with HELLO
+PREFERRED_FEATURES = ["binary", "delta", "resume", "heartbeat"]
+# How long to wait for the server to answer HELLO before assuming text only
+HELLO_TIMEOUT = 2.0
+# Ping the server this often once it agreed on heartbeats (seconds, 0 to never)
+HEARTBEAT_INTERVAL = 5.0
+# Give up on a server that sent nothing for this long (seconds)
+HEARTBEAT_TIMEOUT = 15.0
+# Retry a dropped connection this many times, this far apart, to resume the
+# seat; the server holds it for 15 seconds by default
+RECONNECT_ATTEMPTS = 10
+RECONNECT_DELAY = 1.0
 
 
 class ConnectionManager:
@@ -11,13 +28,88 @@ class ConnectionManager:
         self.__dict__ = self._shared_state
         if not hasattr(self, "writer"):
             self.writer: Optional[asyncio.StreamWriter] = None
+            self.codec: Codec = TEXT
             self.messages: queue.Queue = queue.Queue()
+            # the network runs on its own loop and thread, apart from the UI
+            self.loop: Optional[asyncio.AbstractEventLoop] = None
+            self.thread: Optional[threading.Thread] = None
+            self.heartbeat_interval: float = HEARTBEAT_INTERVAL
+            self.heartbeat_timeout: float = HEARTBEAT_TIMEOUT
+            # monotonic time the server last sent anything
+            self.last_heard: float = 0.0
+            # latest heartbeat round-trip time (seconds)
+            self.rtt: Optional[float] = None
+            # features the server accepted with HELLO
+            self.features: List[str] = []
+            # set from SESSION until the seat is given up, see message_format.txt
+            self.session_token: Optional[str] = None
+            # messages received since SESSION, as counted by RESUME
+            self.received: int = 0
+            # connections tried since the last one was lost
+            self.reconnects: int = 0
+            # set from a drop until RESUMED or giving up; UI commands sent
+            # meanwhile are held and go out once the seat is back
+            self.is_resuming: bool = False
+            self.held: List[Tuple[str, Tuple[Any, ...]]] = []
+            self.conversation: Optional[asyncio.Task] = None
+
+    def start(
+        self,
+        host: str,
+        port: int,
+        loop_name: str = "asyncio",
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+    ) -> None:
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.loop = new_event_loop(loop_name)
+        # The loop is not running yet, so the task can be created from here
+        self.conversation = self.loop.create_task(self.handle_conversation(host, port))
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def submit(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        """Run coroutine on the network loop; safe to call from the UI thread."""
+        asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def close(self) -> None:
+        self.conversation.cancel()
+        try:
+            await self.conversation
+        except asyncio.CancelledError:
+            pass
 
-    async def write_to_server(self, message: str) -> None:
-        byte_message: bytes = (message + "\n").encode()
-        self.writer.write(byte_message)
+    async def write(self, command: str, *args: Any) -> None:
+        self.writer.write(self.codec.encode(command, args))
         await self.writer.drain()
 
+    async def write_to_server(self, command: str, *args: Any) -> None:
+        """Send a command from the UI, holding it while the session resumes."""
+        if self.is_resuming:
+            self.held.append((command, args))
+        elif self.writer is None:
+            LOGGER.info(f"[Connection Thread] Not connected, dropped {command}.")
+        else:
+            await self.write(command, *args)
+
+    def stop_resuming(self) -> None:
+        # Held commands go out on the resumed connection, or nowhere
+        self.is_resuming = False
+        if self.writer is not None and self.session_token is not None:
+            for command, args in self.held:
+                self.writer.write(self.codec.encode(command, args))
+        elif self.held:
+            LOGGER.info(
+                f"[Connection Thread] Seat lost, dropped {len(self.held)} commands."
+            )
+        self.held = []
+
     async def send_ready_signal(self) -> None:
         LOGGER.info("[Connection Thread] Sending READY signal to server.")
         await self.write_to_server("READY")
@@ -28,36 +120,137 @@ class ConnectionManager:
 
     async def send_answer(self, answer: int) -> None:
         LOGGER.info(f"[Connection Thread] Sending answer to server: {answer}")
-        await self.write_to_server(f"ANSWER;{answer}")
+        await self.write_to_server("ANSWER", answer)
+
+    async def request_scores_keyframe(self) -> None:
+        LOGGER.info("[Connection Thread] Requesting full scores from server.")
+        await self.write_to_server("SCORES_KEYFRAME")
 
     async def send_registration(self, nickname: str) -> None:
         LOGGER.info(
             f"[Connection Thread] Sending REGISTER signal to server: {nickname}"
         )
-        await self.write_to_server(f"REGISTER;{nickname}")
+        await self.write_to_server("REGISTER", nickname)
 
-    async def handle_conversation(self, host: str, port: int) -> None:
-        LOGGER.info(f"[Connection Thread] Connecting to {host}:{port}.")
+    async def keep_alive(self, writer: asyncio.StreamWriter) -> None:
+        # Not drained, a stalled connection must not hold up the check
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            silent: float = time.monotonic() - self.last_heard
+            if silent > self.heartbeat_timeout:
+                LOGGER.info(
+                    f"[Connection Thread] Server silent for {silent:.1f} s, closing."
+                )
+                # The read loop sees the end of the stream and cleans up
+                writer.transport.abort()
+                return
+            writer.write(self.codec.encode("PING", [int(time.monotonic() * 1000)]))
+
+    def answer_heartbeat(self, command: str, args: List[Any]) -> None:
+        if command == "PING":
+            self.writer.write(self.codec.encode("PONG", args))
+        elif args:
+            self.rtt = max(time.monotonic() * 1000 - args[0], 0) / 1000
+
+    async def negotiate(self, reader: asyncio.StreamReader) -> None:
+        """Agree on features with the server, kept in self.features."""
+        # Servers without HELLO ignore it, so fall back to text on silence
+        self.codec = TEXT
+        self.features = []
+        await self.write("HELLO", *PREFERRED_FEATURES)
         try:
-            reader, writer = await asyncio.open_connection(host, port)
-            self.writer = writer
+            data: bytes = await asyncio.wait_for(reader.readline(), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            LOGGER.info("[Connection Thread] Server did not answer HELLO.")
+            return
+        command, args = TEXT.decode(data)
+        if command != "HELLO":
+            self.messages.put((command, args))
+            return
+        LOGGER.info(f"[Connection Thread] Server accepted features: {args}")
+        self.features = args
+        if "binary" in args:
+            self.codec = BINARY
+
+    def track_session(self, command: str, args: List[Any]) -> None:
+        # The server counts what it sent since SESSION the same way, RESUMED
+        # and RESUME_FAILURE aside
+        if command == "SESSION":
+            self.session_token = args[0]
+            self.received = 0
+        elif command == "RESUMED":
+            LOGGER.info(f"[Connection Thread] Resumed in room {args[0]}.")
+            self.reconnects = 0
+            self.stop_resuming()
+        elif command == "RESUME_FAILURE":
+            LOGGER.info(f"[Connection Thread] Could not resume: {args[0]}")
+            self.session_token = None
+            self.stop_resuming()
+        elif command == "DISCONNECTED":
+            # Sent on purpose, the seat is not held
+            self.session_token = None
+        elif self.session_token is not None:
+            self.received += 1
+            # The token is not valid after the match
+            if command == "GAME_OVER":
+                self.session_token = None
 
-            address: Tuple[str, int] = writer.get_extra_info("peername")
-            LOGGER.info(f"[Connection Thread] Accepted connection from {address}.")
+    async def handle_conversation(self, host: str, port: int) -> None:
+        while True:
+            LOGGER.info(f"[Connection Thread] Connecting to {host}:{port}.")
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as e:
+                LOGGER.info(f"[Connection Thread] Could not connect: {str(e)}")
+            else:
+                await self.converse(reader, writer)
+            # Lost with a seat held, try to take it back
+            if self.session_token is None or self.reconnects >= RECONNECT_ATTEMPTS:
+                self.session_token = None
+                self.stop_resuming()
+                return
+            self.is_resuming = True
+            self.reconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def converse(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.writer = writer
+        address: Tuple[str, int] = writer.get_extra_info("peername")
+        LOGGER.info(f"[Connection Thread] Accepted connection from {address}.")
+        heartbeat_task: Optional[asyncio.Task] = None
+        try:
+            await self.negotiate(reader)
+            if "heartbeat" in self.features and self.heartbeat_interval > 0:
+                self.last_heard = time.monotonic()
+                heartbeat_task = asyncio.create_task(self.keep_alive(writer))
+            if self.session_token is not None:
+                LOGGER.info("[Connection Thread] Resuming the session.")
+                await self.write("RESUME", self.session_token, self.received)
             while True:
-                data: bytes = await reader.readline()
+                data: bytes = await self.codec.read_frame(reader)
                 if not data:
                     break
-                message: str = data.decode().strip()
+                self.last_heard = time.monotonic()
 
                 command: str
-                args: List[str]
-                command, *args = message.split(";")
-                command = command.upper()
+                args: List[Any]
+                try:
+                    command, args = self.codec.decode(data)
+                except ProtocolError as e:
+                    LOGGER.info(f"[Connection Thread] Dropped bad message: {str(e)}")
+                    continue
+                if command in ("PING", "PONG"):
+                    self.answer_heartbeat(command, args)
+                    continue
+                self.track_session(command, args)
+                if command == "DISCONNECTED":
+                    LOGGER.info(f"[Connection Thread] Disconnected by server: {args[0]}")
                 self.messages.put((command, args))
 
                 LOGGER.info(
-                    f"[Connection Thread] Received message from {address}: {message}"
+                    f"[Connection Thread] Received message from {address}: {command} {args}"
                 )
 
         except ConnectionResetError:
@@ -65,5 +258,7 @@ class ConnectionManager:
                 f"[Connection Thread] Connection reset by peer, address {address}."
             )
         finally:
+            if heartbeat_task is not None:
+                heartbeat_task.cancel()
             self.writer = None
             writer.close()
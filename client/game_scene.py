@@ -4,7 +4,6 @@ import pygame_gui
 import queue
 from typing import List, Optional, Tuple, Dict
 from enum import Enum
-import asyncio
 
 from scene import Scene
 from globals import SCREEN_SIZE, LOGGER
@@ -140,18 +139,18 @@ class GameScene(Scene):
                                 f"[UI Thread] [In Game] User submit answer: {answer}"
                             )
 
-                            if re.match(r"^[-+]*\d+$", answer):
+                            if re.match(r"^[-+]?\d+$", answer):
                                 self.answer_error = None
                                 self.answer_success = "Answer submitted."
-                                loop = asyncio.new_event_loop()
-                                loop.run_until_complete(connection.send_answer(answer))
+                                connection.submit(
+                                    connection.send_answer(int(answer))
+                                )
                             else:
                                 self.answer_success = None
                                 self.answer_error = "Answer must be an integer."
 
                         elif self.current_state == InGameState.GAME_OVER:
-                            loop = asyncio.new_event_loop()
-                            loop.run_until_complete(
+                            connection.submit(
                                 connection.send_registration(globals.current_nickname)
                             )
                             LOGGER.info(
@@ -185,8 +184,8 @@ class GameScene(Scene):
                     self.handle_answer_failure_command(args)
                 elif cmd == "DISQUALIFICATION":
                     self.handle_disqualification_command(args)
-                elif cmd == "SCORES":
-                    self.handle_score_command(args)
+                elif cmd == "SCORES" or cmd == "SCORES_DELTA":
+                    self.handle_score_command(args, cmd == "SCORES_DELTA")
                 elif cmd == "GAME_OVER":
                     self.handle_game_over_command(args)
                 elif cmd == "PLAYER_LEFT":
@@ -212,7 +211,7 @@ class GameScene(Scene):
     def handle_question_command(self, args):
         round_index, first_number, operator, second_number = args
         self.question_text = f"{first_number} {operator} {second_number} = ?"
-        self.question_number_text = f"Question #{round_index.zfill(2)}"
+        self.question_number_text = f"Question #{str(round_index).zfill(2)}"
         self.answer_error = None
         self.answer_success = None
         self.switch_state(InGameState.QUESTION)
@@ -244,12 +243,19 @@ class GameScene(Scene):
             self.is_disqualified = True
         self.switch_state(InGameState.SHOW_RESULT)
 
-    def handle_score_command(self, args):
+    def handle_score_command(self, args, is_delta=False):
+        # Also applies SCORES_DELTA, which only lists the players that
+        # changed since the previous scores; the others keep their entry
         self.fastest_player, *rest = args
-        for player_points in rest:
-            player, diff_points, score = player_points.split(",")
+        if is_delta and (
+            not self.players or any(player not in self.players for player, _, _ in rest)
+        ):
+            # The players this delta leaves out were never seen, ask for all
+            LOGGER.info("[UI Thread] [In Game] Scores out of sync, asking for all.")
+            connection.submit(connection.request_scores_keyframe())
+        for player, diff_points, score in rest:
             if player not in self.players or self.players[player][1] != -1:
-                self.players[player] = [int(diff_points), int(score)]
+                self.players[player] = [diff_points, score]
         self.switch_state(InGameState.SHOW_RESULT)
 
     def handle_game_over_command(self, args):
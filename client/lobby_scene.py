@@ -1,7 +1,6 @@
 import pygame
 import pygame_gui
 import queue
-import asyncio
 from typing import List, Optional
 import globals
 
@@ -48,8 +47,7 @@ class LobbyScene(Scene):
                             self.ready_button_timer = pygame.time.set_timer(
                                 self.READY_BUTTON_TIMEOUT, 100, 1
                             )
-                            loop = asyncio.new_event_loop()
-                            loop.run_until_complete(connection.send_ready_signal())
+                            connection.submit(connection.send_ready_signal())
                             for player in self.players:
                                 if player.nickname == globals.current_nickname:
                                     player.is_ready = True
@@ -61,8 +59,7 @@ class LobbyScene(Scene):
                             self.ready_button_timer = pygame.time.set_timer(
                                 self.READY_BUTTON_TIMEOUT, 100, 1
                             )
-                            loop = asyncio.new_event_loop()
-                            loop.run_until_complete(connection.send_unready_signal())
+                            connection.submit(connection.send_unready_signal())
                             for player in self.players:
                                 if player.nickname == globals.current_nickname:
                                     player.is_ready = False
@@ -0,0 +1,28 @@
+"""Event loop selection, shared by the server and the client.
+
+Both ship a copy of this module; tests/test_shared_modules.py keeps the two
+identical.
+"""
+import asyncio
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+# asyncio: the standard library loop
+# uvloop:  uvloop, falling back to asyncio when it is not installed
+# auto:    uvloop when installed, asyncio otherwise, without a warning
+LOOP_CHOICES = ["asyncio", "uvloop", "auto"]
+
+
+def new_event_loop(name: str = "asyncio") -> asyncio.AbstractEventLoop:
+    if name not in LOOP_CHOICES:
+        raise ValueError(f"Unknown event loop: {name}")
+    if name != "asyncio":
+        try:
+            import uvloop
+        except ImportError:
+            if name == "uvloop":
+                LOGGER.warning("uvloop is not installed, using the asyncio loop.")
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
@@ -0,0 +1,269 @@
+"""Wire formats for the messages exchanged with clients.
+
+A message is a command name and a list of arguments. Arguments are str,
+int or bool, or tuples of those for roster entries.
+
+Text framing, the default:
+    COMMAND;arg;arg;field,field,field\n
+
+Binary framing, negotiated with HELLO;binary:
+    !I payload length, !B opcode, then the arguments packed per SCHEMAS.
+    Strings are !H length + UTF-8, "q" is !q, "i" is !i and "?" is !B. A
+    trailing "*" part is a !I count followed by that many items.
+
+The server and the client each ship a copy of this module;
+tests/test_shared_modules.py keeps the two identical.
+"""
+import asyncio
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# Refuse frames larger than this unless told otherwise (bytes)
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# command: (opcode, schema)
+# Schema codes: s = string, q = 64-bit int, i = 32-bit int, ? = bool.
+# "*x" repeats x for the rest of the message, "(...)" is a roster entry.
+# Fixed fields may be left out from the end, e.g. ROOM_CREATE without args.
+SCHEMAS: Dict[str, Tuple[int, str]] = {
+    # Client requests
+    "HELLO": (1, "*s"),
+    "REGISTER": (2, "s"),
+    "READY": (3, ""),
+    "UNREADY": (4, ""),
+    "ANSWER": (5, "q"),
+    "ROOM_LIST": (6, "*(iii?)"),
+    "ROOM_CREATE": (7, "ii"),
+    "ROOM_JOIN": (8, "i"),
+    "SCORES_KEYFRAME": (9, ""),
+    "SPECTATE": (10, "i"),
+    "RESUME": (11, "sq"),
+    # Server responses and broadcasts
+    "REGISTRATION_SUCCESS": (32, "*(s?)"),
+    "REGISTRATION_FAILURE": (33, "s"),
+    "READY_FAILURE": (34, "s"),
+    "UNREADY_FAILURE": (35, "s"),
+    "ANSWER_FAILURE": (36, "s"),
+    "ROOM_FAILURE": (37, "s"),
+    "ROOM_CREATED": (38, "i"),
+    "ROOM_JOINED": (39, "i"),
+    "PLAYER_JOINED": (40, "s"),
+    "PLAYER_READY": (41, "s"),
+    "PLAYER_UNREADY": (42, "s"),
+    "PLAYER_LEFT": (43, "s"),
+    "GAME_STARTING": (48, "iii"),
+    "QUESTION": (49, "iqsq"),
+    "ANSWER_CORRECT": (50, "q"),
+    "ANSWER_INCORRECT": (51, "q"),
+    "DISQUALIFICATION": (52, "*s"),
+    "SCORES": (53, "s*(sii)"),
+    "GAME_OVER": (54, "s"),
+    "SCORES_DELTA": (55, "s*(sii)"),
+    "SCORES_FAILURE": (56, "s"),
+    "DISCONNECTED": (57, "s"),
+    "SPECTATING": (58, "i"),
+    "SESSION": (59, "s"),
+    "RESUMED": (60, "is"),
+    "RESUME_FAILURE": (61, "s"),
+    # Either side
+    "PING": (62, "q"),
+    "PONG": (63, "q"),
+}
+
+Message = Tuple[str, List[Any]]
+Field = Union[str, Tuple[str, ...]]
+
+_LENGTH = struct.Struct("!I")
+_OPCODE = struct.Struct("!B")
+_STRING_LENGTH = struct.Struct("!H")
+_SCALARS: Dict[str, struct.Struct] = {
+    "q": struct.Struct("!q"),
+    "i": struct.Struct("!i"),
+    "?": struct.Struct("!B"),
+}
+
+
+class ProtocolError(Exception):
+    def __init__(self, message: str, command: Optional[str] = None):
+        super().__init__(message)
+        self.command: Optional[str] = command
+
+
+def parse_schema(schema: str) -> Tuple[List[str], Optional[Field]]:
+    fixed, _, rest = schema.partition("*")
+    if not rest:
+        return list(fixed), None
+    if rest.startswith("("):
+        return list(fixed), tuple(rest[1:-1])
+    return list(fixed), rest
+
+
+_PARSED: Dict[str, Tuple[List[str], Optional[Field]]] = {
+    command: parse_schema(schema) for command, (_, schema) in SCHEMAS.items()
+}
+_COMMANDS: Dict[int, str] = {opcode: command for command, (opcode, _) in SCHEMAS.items()}
+
+
+def format_text_arg(arg: Any) -> str:
+    if isinstance(arg, tuple):
+        return ",".join(str(value) for value in arg)
+    return str(arg)
+
+
+def parse_text_value(code: str, value: str) -> Any:
+    if code == "s":
+        return value
+    if code == "?":
+        return value.strip() == "True"
+    return int(value.strip())
+
+
+class TextCodec:
+    codec_id: int = 0
+    name: str = "text"
+
+    async def read_frame(
+        self, reader: asyncio.StreamReader, max_size: int = MAX_FRAME_SIZE
+    ) -> bytes:
+        try:
+            line: bytes = await reader.readline()
+        except ValueError:  # longer than the reader's limit
+            raise ProtocolError("Line is too long.")
+        if len(line) > max_size:
+            raise ProtocolError(f"Line of {len(line)} bytes is too long.")
+        return line
+
+    def encode(self, command: str, args: Sequence[Any]) -> bytes:
+        return (";".join([command, *map(format_text_arg, args)]) + "\n").encode()
+
+    def decode(self, frame: bytes) -> Message:
+        command: str
+        fields: List[str]
+        command, *fields = frame.decode().strip().split(";")
+        command = command.upper()
+        if command not in _PARSED:
+            return command, fields
+
+        fixed, rest = _PARSED[command]
+        args: List[Any] = []
+        try:
+            for index, field in enumerate(fields):
+                if index < len(fixed):
+                    args.append(parse_text_value(fixed[index], field))
+                elif rest is None:
+                    # Let the handler reject extra arguments
+                    args.append(field)
+                elif isinstance(rest, tuple):
+                    if field == "" and len(fields) == len(fixed) + 1:
+                        break  # empty roster
+                    values: List[str] = field.split(",")
+                    if len(values) != len(rest):
+                        raise ValueError(f"Bad roster entry: {field}")
+                    args.append(
+                        tuple(parse_text_value(c, v) for c, v in zip(rest, values))
+                    )
+                else:
+                    if field == "" and len(fields) == len(fixed) + 1:
+                        break
+                    args.append(parse_text_value(rest, field))
+        except ValueError as e:
+            raise ProtocolError(str(e), command)
+        return command, args
+
+
+class BinaryCodec:
+    codec_id: int = 1
+    name: str = "binary"
+
+    async def read_frame(
+        self, reader: asyncio.StreamReader, max_size: int = MAX_FRAME_SIZE
+    ) -> bytes:
+        try:
+            header: bytes = await reader.readexactly(_LENGTH.size)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            return b""
+        (length,) = _LENGTH.unpack(header)
+        if length > max_size:
+            raise ProtocolError(f"Frame of {length} bytes is too large.")
+        return header + await reader.readexactly(length)
+
+    def pack_value(self, code: str, value: Any, parts: List[bytes]) -> None:
+        if code == "s":
+            data: bytes = str(value).encode()
+            parts.append(_STRING_LENGTH.pack(len(data)))
+            parts.append(data)
+        else:
+            parts.append(_SCALARS[code].pack(value))
+
+    def unpack_value(self, code: str, payload: bytes, offset: int) -> Tuple[Any, int]:
+        if code == "s":
+            (length,) = _STRING_LENGTH.unpack_from(payload, offset)
+            offset += _STRING_LENGTH.size
+            return payload[offset : offset + length].decode(), offset + length
+        scalar: struct.Struct = _SCALARS[code]
+        (value,) = scalar.unpack_from(payload, offset)
+        if code == "?":
+            value = bool(value)
+        return value, offset + scalar.size
+
+    def encode(self, command: str, args: Sequence[Any]) -> bytes:
+        opcode: int
+        opcode, _ = SCHEMAS[command]
+        fixed, rest = _PARSED[command]
+        parts: List[bytes] = [b"", _OPCODE.pack(opcode)]
+        for code, value in zip(fixed, args):
+            self.pack_value(code, value, parts)
+        if rest is not None:
+            items: Sequence[Any] = args[len(fixed) :]
+            parts.append(_LENGTH.pack(len(items)))
+            for item in items:
+                if isinstance(rest, tuple):
+                    for code, value in zip(rest, item):
+                        self.pack_value(code, value, parts)
+                else:
+                    self.pack_value(rest, item, parts)
+        parts[0] = _LENGTH.pack(sum(map(len, parts)))
+        return b"".join(parts)
+
+    def decode(self, frame: bytes) -> Message:
+        payload: bytes = frame[_LENGTH.size :]
+        if not payload:
+            raise ProtocolError("Empty frame.")
+        command: Optional[str] = _COMMANDS.get(payload[0])
+        if command is None:
+            raise ProtocolError(f"Unknown opcode {payload[0]}.")
+
+        fixed, rest = _PARSED[command]
+        args: List[Any] = []
+        offset: int = _OPCODE.size
+        try:
+            for code in fixed:
+                if offset >= len(payload):
+                    break
+                value, offset = self.unpack_value(code, payload, offset)
+                args.append(value)
+            if rest is not None and offset < len(payload):
+                (count,) = _LENGTH.unpack_from(payload, offset)
+                offset += _LENGTH.size
+                for _ in range(count):
+                    if isinstance(rest, tuple):
+                        item: List[Any] = []
+                        for code in rest:
+                            value, offset = self.unpack_value(code, payload, offset)
+                            item.append(value)
+                        args.append(tuple(item))
+                    else:
+                        value, offset = self.unpack_value(rest, payload, offset)
+                        args.append(value)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ProtocolError(str(e), command)
+        return command, args
+
+
+Codec = Union[TextCodec, BinaryCodec]
+
+TEXT = TextCodec()
+BINARY = BinaryCodec()
+CODECS: Dict[int, Codec] = {TEXT.codec_id: TEXT, BINARY.codec_id: BINARY}
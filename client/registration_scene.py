@@ -1,6 +1,5 @@
 import pygame
 import pygame_gui
-import asyncio
 import queue
 from typing import List, Optional
 
@@ -89,19 +88,15 @@ class RegistrationScene(Scene):
                             )
                             return None
                         else:
-                            loop = asyncio.new_event_loop()
-                            loop.run_until_complete(
-                                connection.send_registration(username)
-                            )
+                            connection.submit(connection.send_registration(username))
 
         try:
             while message := messages.get(block=False):
                 command, args = message
                 if command == "REGISTRATION_SUCCESS":
                     players: List[Player] = []
-                    for player_str in args:
-                        nickname, is_ready = player_str.split(",")
-                        players.append(Player(nickname, is_ready == "True"))
+                    for nickname, is_ready in args:
+                        players.append(Player(nickname, is_ready))
                     return LobbyScene(players)
                 elif command == "REGISTRATION_FAILURE":
                     globals.current_nickname = None
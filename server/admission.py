@@ -0,0 +1,41 @@
+"""Limits that keep one client from degrading the whole server.
+
+Past each limit the server tells the client why with a failure reply or a
+DISCONNECTED message, and counts it in metrics.REJECTIONS.
+"""
+import asyncio
+
+# Refuse connections past this many open at once, 0 for no limit
+MAX_CONNECTIONS = 10000
+# Commands a connection may send per second, 0 for no limit
+COMMAND_RATE = 20.0
+# Commands a connection may send at once before the rate applies
+COMMAND_BURST = 40
+# Close a connection that sends nothing for this long before registering or
+# spectating (seconds), 0 to never close it
+IDLE_TIMEOUT = 300.0
+
+
+class TokenBucket:
+    """Allows burst commands at once, refilled at rate per second.
+
+    Runs on the event loop's clock, so replays on a virtual clock limit
+    the same commands as the recorded session.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate: float = rate
+        self.burst: float = burst
+        self.tokens: float = burst
+        self.updated: float = asyncio.get_running_loop().time()
+
+    def take(self) -> bool:
+        now: float = asyncio.get_running_loop().time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
@@ -0,0 +1,260 @@
+import time
+import asyncio
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import metrics
+import recorder
+from connection import Connection
+from relay_link import RelayedConnection, RelayLink
+from sessions import Session, new_token
+
+# Broadcasts that spectators get as well
+SPECTATOR_COMMANDS = {
+    "GAME_STARTING",
+    "QUESTION",
+    "DISQUALIFICATION",
+    "SCORES",
+    "SCORES_DELTA",
+    "GAME_OVER",
+}
+# Spectators served before the fan-out lets other tasks run
+SPECTATOR_CHUNK = 256
+
+# sequence number, command, args, encodings by codec id, recipient filter
+SpectatorEvent = Tuple[
+    int, str, Tuple[Any, ...], Dict[int, bytes], Optional[Callable[[Connection], bool]]
+]
+# session ids of relayed recipients by relay link and codec id
+RelayedRecipients = Dict[Tuple[RelayLink, int], List[int]]
+
+
+def send_shared(
+    conn: Connection,
+    command: str,
+    args: Tuple[Any, ...],
+    encoded: Dict[int, bytes],
+    relayed: RelayedRecipients,
+) -> None:
+    """Send one recipient's copy of a broadcast, encoded once per codec.
+
+    Clients behind a relay are only collected in relayed, send_relayed then
+    writes one BROADCAST frame per relay link for all of them.
+    """
+    if conn.session is not None:
+        conn.session.record(command, args)
+    codec_id: int = conn.codec.codec_id
+    data: Optional[bytes] = encoded.get(codec_id)
+    if data is None:
+        data = conn.codec.encode(command, args)
+        encoded[codec_id] = data
+    if isinstance(conn, RelayedConnection):
+        if not (conn.is_closed or conn.is_closing):
+            relayed.setdefault((conn.link, codec_id), []).append(conn.session_id)
+    else:
+        conn.send(data)
+
+
+def send_relayed(relayed: RelayedRecipients, encoded: Dict[int, bytes]) -> None:
+    for (link, codec_id), session_ids in relayed.items():
+        link.broadcast(session_ids, encoded[codec_id])
+
+
+class ClientManager:
+    """Connections that joined one room, and the ones registered as players.
+
+    Spectators are served after the players: their copies of a broadcast
+    are queued and handed out by a background task a chunk at a time, so a
+    large audience does not hold up the game.
+    """
+
+    def __init__(
+        self, connections: Dict[asyncio.StreamWriter, Connection], room_id: int = 0
+    ):
+        self.room_id: int = room_id
+        # every open socket of the server, shared by all rooms
+        self.connections: Dict[asyncio.StreamWriter, Connection] = connections
+        # sockets that joined this room, registered or not
+        self.members: Set[asyncio.StreamWriter] = set()
+        # registered sockets and their nicknames
+        self.clients: Dict[asyncio.StreamWriter, str] = {}
+        self.writers: Dict[str, asyncio.StreamWriter] = {}
+        # resumable sessions by token, and the ones whose socket dropped by
+        # that socket, which stays among the clients until they resume
+        self.sessions: Dict[str, Session] = {}
+        self.suspended: Dict[asyncio.StreamWriter, Session] = {}
+        # watching sockets and how many events were published before they joined
+        self.spectators: Dict[asyncio.StreamWriter, int] = {}
+        self.published: int = 0
+        self.spectator_events: Deque[SpectatorEvent] = deque()
+        self.fan_out_task: Optional[asyncio.Task] = None
+
+    def reset_clients(self) -> None:
+        for session in list(self.sessions.values()):
+            self.end_session(session)
+        self.clients = {}
+        self.writers = {}
+
+    def add_client(self, writer: asyncio.StreamWriter, nickname: str) -> None:
+        self.clients[writer] = nickname
+        self.writers[nickname] = writer
+
+    def remove_client(self, writer: asyncio.StreamWriter) -> Optional[str]:
+        nickname: Optional[str] = self.clients.pop(writer, None)
+        if nickname is not None:
+            self.writers.pop(nickname, None)
+        return nickname
+
+    def open_session(self, writer: asyncio.StreamWriter, history_size: int) -> Session:
+        # Counting starts once the caller attaches it, after SESSION went out
+        session: Session = Session(
+            new_token(self.room_id), self.clients[writer], history_size
+        )
+        self.sessions[session.token] = session
+        return session
+
+    def suspend(
+        self,
+        session: Session,
+        grace: float,
+        on_expiry: Callable[[Session], None],
+    ) -> None:
+        """Hold the player's seat after their socket dropped."""
+        session.detach()
+        self.suspended[session.writer] = session
+        session.expiry = asyncio.get_running_loop().call_later(
+            grace, on_expiry, session
+        )
+
+    def resume(
+        self, session: Session, writer: asyncio.StreamWriter, conn: Connection
+    ) -> None:
+        """Seat the player again on a new socket."""
+        session.cancel_expiry()
+        self.suspended.pop(session.writer, None)
+        self.remove_client(session.writer)
+        self.add_client(writer, session.nickname)
+        session.attach(writer, conn)
+
+    def end_session(self, session: Session) -> None:
+        session.cancel_expiry()
+        session.detach()
+        self.sessions.pop(session.token, None)
+        self.suspended.pop(session.writer, None)
+
+    def add_spectator(self, writer: asyncio.StreamWriter) -> None:
+        # Only events published from now on, the caller sends the rest
+        self.spectators[writer] = self.published
+
+    def remove_spectator(self, writer: asyncio.StreamWriter) -> None:
+        self.spectators.pop(writer, None)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Coalesce everything sent to the room's clients inside the block.
+
+        Each client then gets a single vectored write and drain for the whole
+        burst instead of one per message.
+        """
+        corked: List[Connection] = []
+        for client in self.clients:
+            conn: Optional[Connection] = self.connections.get(client)
+            if conn and not conn.is_corked:
+                conn.cork()
+                corked.append(conn)
+        try:
+            yield
+        finally:
+            for conn in corked:
+                conn.uncork()
+
+    def send(self, writer: asyncio.StreamWriter, command: str, *args: Any) -> None:
+        conn: Optional[Connection] = self.connections.get(writer)
+        if conn:
+            conn.send_message(command, args)
+        elif writer in self.suspended:
+            self.keep_for(self.suspended[writer], command, args)
+
+    @staticmethod
+    def keep_for(
+        session: Session,
+        command: str,
+        args: Tuple[Any, ...],
+        only: Optional[Callable[[Connection], bool]] = None,
+    ) -> None:
+        # Filtered as if the dropped connection were still there
+        if only is None or session.conn is None or only(session.conn):
+            session.record(command, args)
+
+    def has_client_without(self, feature: str) -> bool:
+        return any(
+            feature not in self.connections[client].features
+            for client in itertools.chain(self.clients, self.spectators)
+            if client in self.connections
+        ) or any(
+            feature not in session.conn.features for session in self.suspended.values()
+        )
+
+    def broadcast(
+        self,
+        command: str,
+        *args: Any,
+        except_nicknames: List[str] = [],
+        only: Optional[Callable[[Connection], bool]] = None,
+    ) -> None:
+        # Only enqueues; each connection's writer task does the actual sending.
+        # The message is encoded once per wire format in use.
+        started: float = time.perf_counter()
+        encoded: Dict[int, bytes] = {}
+        relayed: RelayedRecipients = {}
+        recipients: int = 0
+        for client in self.clients:
+            if self.clients[client] not in except_nicknames:
+                conn: Optional[Connection] = self.connections.get(client)
+                if conn and (only is None or only(conn)):
+                    send_shared(conn, command, args, encoded, relayed)
+                    recipients += 1
+                elif conn is None and client in self.suspended:
+                    self.keep_for(self.suspended[client], command, args, only)
+        send_relayed(relayed, encoded)
+        metrics.MESSAGES_SENT.inc(recipients, command)
+        if recorder.RECORDER is not None:
+            recorder.RECORDER.broadcast(self.room_id, recipients, command, args)
+        if self.spectators and command in SPECTATOR_COMMANDS:
+            self.published += 1
+            self.spectator_events.append((self.published, command, args, encoded, only))
+            if self.fan_out_task is None:
+                self.fan_out_task = asyncio.create_task(self.fan_out())
+        metrics.BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+    async def fan_out(self) -> None:
+        try:
+            while self.spectator_events:
+                sequence, command, args, encoded, only = (
+                    self.spectator_events.popleft()
+                )
+                recipients: int = 0
+                relayed: RelayedRecipients = {}
+                for index, (writer, joined) in enumerate(list(self.spectators.items())):
+                    if index and index % SPECTATOR_CHUNK == 0:
+                        # Relayed spectators of this chunk get it before yielding
+                        send_relayed(relayed, encoded)
+                        relayed = {}
+                        await asyncio.sleep(0)
+                    conn: Optional[Connection] = self.connections.get(writer)
+                    if joined >= sequence or conn is None:
+                        continue
+                    if only is None or only(conn):
+                        send_shared(conn, command, args, encoded, relayed)
+                        recipients += 1
+                send_relayed(relayed, encoded)
+                metrics.SPECTATOR_MESSAGES_SENT.inc(recipients, command)
+        finally:
+            self.fan_out_task = None
+
+    def write_to_player(self, nickname: str, command: str, *args: Any) -> None:
+        writer: Optional[asyncio.StreamWriter] = self.writers.get(nickname)
+        if writer:
+            self.send(writer, command, *args)
@@ -0,0 +1,212 @@
+import time
+import asyncio
+import itertools
+import logging
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import metrics
+import recorder
+from protocol import Codec, TEXT
+
+if TYPE_CHECKING:
+    from sessions import Session
+
+LOGGER = logging.getLogger(__name__)
+
+# Evict a client once this many bytes are waiting to be sent to it
+MAX_PENDING_BYTES = 256 * 1024
+# Evict a client once a queued message has waited this long (seconds)
+MAX_SEND_LATENCY = 5.0
+# Longest line or unread backlog kept for one client (bytes). Requests are
+# short, a client going past this is disconnected.
+READ_LIMIT = 4 * 1024
+# Transport buffer size past which the writer waits for the peer, and the
+# size it waits to come down to (bytes)
+WRITE_HIGH_WATER = 64 * 1024
+WRITE_LOW_WATER = 16 * 1024
+
+_connection_ids: Iterator[int] = itertools.count(1)
+
+
+def unread_bytes(reader: asyncio.StreamReader) -> bytes:
+    """What the client sent that was not read yet, to pass on with its socket."""
+    # StreamReader has no public way to take its buffer without waiting for
+    # more, so this is the one place that reaches into it
+    return bytes(reader._buffer)
+
+
+class Connection:
+    """Outbound side of a client socket.
+
+    Messages are queued with send() and written by a writer task, so a slow
+    peer only ever delays itself. The task only lives while there is
+    something to write, an idle connection costs no task. Peers that fall
+    behind the byte or latency budget are evicted by aborting their
+    transport.
+    """
+
+    __slots__ = (
+        "writer",
+        "codec",
+        "conn_id",
+        "room_id",
+        "features",
+        "max_pending_bytes",
+        "max_send_latency",
+        "address",
+        "pending",
+        "pending_bytes",
+        "is_closed",
+        "is_closing",
+        "is_corked",
+        "writer_task",
+        "session",
+        "last_heard",
+        "rtt",
+    )
+
+    def __init__(
+        self,
+        writer: asyncio.StreamWriter,
+        max_pending_bytes: int = MAX_PENDING_BYTES,
+        max_send_latency: float = MAX_SEND_LATENCY,
+        codec: Codec = TEXT,
+        write_high_water: int = WRITE_HIGH_WATER,
+        write_low_water: int = WRITE_LOW_WATER,
+    ):
+        self.writer: asyncio.StreamWriter = writer
+        self.codec: Codec = codec
+        # identifies the connection in session logs
+        self.conn_id: int = next(_connection_ids)
+        # room joined, 0 when none
+        self.room_id: int = 0
+        # protocol features agreed on with HELLO
+        self.features: Set[str] = set()
+        self.max_pending_bytes: int = max_pending_bytes
+        self.max_send_latency: float = max_send_latency
+        self.address: Tuple[str, int] = writer.get_extra_info("peername")
+        writer.transport.set_write_buffer_limits(write_high_water, write_low_water)
+        # (enqueue time, data) pairs waiting for the writer task
+        self.pending: Deque[Tuple[float, bytes]] = deque()
+        self.pending_bytes: int = 0
+        self.is_closed: bool = False
+        self.is_closing: bool = False
+        # While corked, send() only queues and no writer task is started
+        self.is_corked: bool = False
+        self.writer_task: Optional[asyncio.Task] = None
+        # set while the client plays with HELLO;resume, see sessions.py
+        self.session: Optional["Session"] = None
+        # monotonic time the client last sent anything, see heartbeat.py
+        self.last_heard: float = time.monotonic()
+        # latest heartbeat round-trip time (seconds)
+        self.rtt: Optional[float] = None
+
+    def buffered_bytes(self) -> int:
+        # Queued here plus what the transport has not handed to the kernel yet
+        return self.pending_bytes + self.writer.transport.get_write_buffer_size()
+
+    def send(self, data: bytes) -> bool:
+        if self.is_closed or self.is_closing:
+            return False
+        if self.buffered_bytes() + len(data) > self.max_pending_bytes:
+            self.evict("outbound buffer over budget")
+            return False
+        now: float = time.monotonic()
+        if self.pending and now - self.pending[0][0] > self.max_send_latency:
+            self.evict("outbound queue stalled")
+            return False
+
+        self.pending.append((now, data))
+        self.pending_bytes += len(data)
+        if not self.is_corked:
+            self.start_writing()
+        return True
+
+    def cork(self) -> None:
+        self.is_corked = True
+
+    def uncork(self) -> None:
+        """Hand everything queued while corked to the writer task at once."""
+        self.is_corked = False
+        if self.pending:
+            self.start_writing()
+
+    def start_writing(self) -> None:
+        if self.writer_task is None and not self.is_closed:
+            self.writer_task = asyncio.create_task(self.write_loop())
+
+    def send_message(self, command: str, args: Sequence[Any]) -> bool:
+        metrics.MESSAGES_SENT.inc(label=command)
+        if recorder.RECORDER is not None:
+            recorder.RECORDER.outbound(self.conn_id, self.room_id, command, args)
+        if self.session is not None:
+            self.session.record(command, tuple(args))
+        return self.send(self.codec.encode(command, args))
+
+    async def write_loop(self) -> None:
+        # Runs until the queue is empty, sends made while draining included
+        try:
+            while self.pending and not self.is_closed:
+                chunks: List[bytes] = [data for _, data in self.pending]
+                self.pending.clear()
+                self.pending_bytes = 0
+                self.writer.writelines(chunks)
+                metrics.BYTES_SENT.inc(sum(map(len, chunks)))
+                started: float = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self.writer.drain(), self.max_send_latency)
+                except asyncio.TimeoutError:
+                    self.evict("drain timed out")
+                metrics.DRAIN_SECONDS.observe(time.perf_counter() - started)
+        except ConnectionError:
+            self.is_closed = True
+        finally:
+            self.writer_task = None
+
+    def evict(self, reason: str) -> None:
+        if self.is_closed:
+            return
+        LOGGER.info("[Client Thread] Evicting client %s: %s.", self.address, reason)
+        self.is_closed = True
+        self.pending.clear()
+        self.pending_bytes = 0
+        # Aborting makes the reader side see the disconnection and clean up
+        self.writer.transport.abort()
+
+    async def detach(self) -> bool:
+        """Flush what is still queued and stop writing, leaving the socket open.
+
+        Returns False when the peer did not take the data in time.
+        """
+        self.is_closing = True
+        # Data queued while corked has not been handed to a writer task yet
+        self.is_corked = False
+        if self.pending:
+            self.start_writing()
+        task: Optional[asyncio.Task] = self.writer_task
+        try:
+            if task is not None:
+                await asyncio.wait_for(asyncio.shield(task), self.max_send_latency)
+        except asyncio.TimeoutError:
+            task.cancel()
+            return False
+        finally:
+            self.is_closed = True
+        return True
+
+    async def close(self) -> None:
+        """Flush what is still queued, then close the socket."""
+        if not await self.detach():
+            self.writer.transport.abort()
+        self.writer.close()
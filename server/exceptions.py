@@ -4,3 +4,7 @@ class RegistrationError(Exception):
 
 class WrongStateError(Exception):
     pass
+
+
+class RoomError(Exception):
+    pass
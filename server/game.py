@@ -0,0 +1,560 @@
+import time
+import asyncio
+from enum import Enum
+import logging
+from typing import Any, Dict, Tuple, List, Optional, Set
+
+import log
+import metrics
+import snapshots
+from client_manager import ClientManager
+from exceptions import WrongStateError
+from player_manager import Player, PlayerManager
+from question_manager import Question, QuestionManager
+from snapshots import PlayerState, RoomState
+
+ANSWER_TIME_LIMIT = 30
+PREPARE_TIME_LIMIT = 10
+# Send full SCORES to delta clients every this many rounds
+SCORES_KEYFRAME_INTERVAL = 10
+
+LOGGER = logging.getLogger(__name__)
+ANSWERS_LOGGER = log.get_logger("answers")
+RESULTS_LOGGER = log.get_logger("results")
+
+
+class GameState(Enum):
+    # LOBBY: accept REGISTER, READY, UNREADY
+    LOBBY = 1
+    # PROCESSING: will not accept any command
+    PROCESSING = 2
+    # WAITING_FOR_ANSWERS: accept ANSWER
+    WAITING_FOR_ANSWERS = 3
+
+
+class Game:
+    def __init__(
+        self,
+        room_id: int,
+        max_players: int,
+        race_length: int,
+        clients: ClientManager,
+        answer_time_limit: int = ANSWER_TIME_LIMIT,
+        prepare_time_limit: int = PREPARE_TIME_LIMIT,
+        scores_keyframe_interval: int = SCORES_KEYFRAME_INTERVAL,
+        question_seed: Optional[int] = None,
+        use_score_board: Optional[bool] = None,
+    ):
+        self.room_id: int = room_id
+        self.race_length: int = race_length
+        self.max_players: int = max_players
+        self.answer_time_limit: int = answer_time_limit
+        self.prepare_time_limit: int = prepare_time_limit
+        self.scores_keyframe_interval: int = scores_keyframe_interval
+        self.clients: ClientManager = clients
+        # None lets PlayerManager pick by room size
+        self.use_score_board: Optional[bool] = use_score_board
+        self.loop_task: Optional[asyncio.Task] = None
+        # Kept across matches, so a seeded room's questions follow one sequence
+        self.question_manager: QuestionManager = QuestionManager(question_seed)
+        # set once every qualified player answered, ending the answer window
+        self.all_answered: asyncio.Event = asyncio.Event()
+        # event loop time the current phase ends
+        self.deadline: float = 0.0
+        # answers came in since the last snapshot
+        self.snapshot_dirty: bool = False
+        self.reset_game()
+
+    def reset_game(self) -> None:
+        self.player_manager: PlayerManager = PlayerManager(
+            self.max_players, self.race_length, self.use_score_board
+        )
+        self.state: GameState = GameState.LOBBY
+        self.round_index: int = 0
+        # question of the current round, answers are graded against it
+        self.question: Optional[Question] = None
+        # qualified players yet to answer in this round
+        self.awaiting: Dict[str, Player] = {}
+        # players who answered correctly, in order of arrival
+        self.correct_players: List[Player] = []
+        self.incorrect_count: int = 0
+        # (nickname, ANSWER_CORRECT or ANSWER_INCORRECT) of the graded answers,
+        # held back until the window closes so nobody learns the answer early
+        self.results: List[Tuple[str, str]] = []
+        # fastest player of the last round, "" if nobody answered correctly
+        self.fastest_nickname: str = ""
+        # players restored from a snapshot whose client has not registered again
+        self.vacant: Set[str] = set()
+
+    def is_playing(self) -> bool:
+        return self.state != GameState.LOBBY
+
+    def is_open(self) -> bool:  # can take another player right now
+        return (
+            self.state == GameState.LOBBY
+            and len(self.player_manager.players) < self.max_players
+        )
+
+    def pack_room_info(self) -> Tuple[int, int, int, bool]:
+        return (
+            self.room_id,
+            len(self.player_manager.players),
+            self.max_players,
+            self.is_playing(),
+        )
+
+    def pack_snapshot(self) -> List[Tuple[str, List[Any]]]:
+        """Messages that bring a new spectator up to date."""
+        messages: List[Tuple[str, List[Any]]] = []
+        if self.is_playing():
+            messages.append(
+                (
+                    "GAME_STARTING",
+                    [self.race_length, self.answer_time_limit, self.prepare_time_limit],
+                )
+            )
+        if self.state == GameState.WAITING_FOR_ANSWERS:
+            messages.append(
+                (
+                    "QUESTION",
+                    [
+                        self.round_index,
+                        self.question.first_number,
+                        self.question.operator,
+                        self.question.second_number,
+                    ],
+                )
+            )
+        messages.append(
+            (
+                "SCORES",
+                [self.fastest_nickname, *self.player_manager.pack_players_round_info()],
+            )
+        )
+        return messages
+
+    def handle_registration(self, nickname: str) -> Player:
+        if self.state != GameState.LOBBY:
+            # A restored match takes its players back under their nicknames
+            if nickname in self.vacant:
+                self.vacant.discard(nickname)
+                return self.player_manager.players[nickname]
+            raise WrongStateError("Cannot register. Game has already started.")
+        return self.player_manager.register_player(nickname)
+
+    def handle_ready(self, nickname: str) -> None:
+        if self.state != GameState.LOBBY:
+            raise WrongStateError("Cannot ready up. Game has already started.")
+
+        self.player_manager.set_ready(nickname, True)
+        if self.player_manager.can_start_game():
+            # Start the game
+            self.state = GameState.PROCESSING
+            self.clients.broadcast(
+                "GAME_STARTING",
+                self.race_length,
+                self.answer_time_limit,
+                self.prepare_time_limit,
+            )
+            self.loop_task = asyncio.create_task(self.game_loop())
+
+    def handle_unready(self, nickname: str) -> None:
+        if self.state != GameState.LOBBY:
+            raise WrongStateError("Cannot unready. Game has already started.")
+
+        self.player_manager.set_ready(nickname, False)
+
+    def open_answer_window(self, question: Question) -> None:
+        self.question = question
+        # Taken now, since players may have left while preparing
+        self.awaiting = {
+            player.nickname: player
+            for player in self.player_manager.get_qualified_players()
+        }
+        self.correct_players = []
+        self.incorrect_count = 0
+        self.results = []
+        self.all_answered.clear()
+        if not self.awaiting:
+            self.all_answered.set()
+        self.state = GameState.WAITING_FOR_ANSWERS
+
+    def handle_answer(self, nickname: str, answer: int) -> None:
+        if self.state != GameState.WAITING_FOR_ANSWERS:
+            raise WrongStateError("Not in answering phase.")
+        player: Player = self.player_manager.players[nickname]
+        if player.is_disqualified:
+            raise WrongStateError("You have been disqualified.")
+        # Answers are graded right away, so the first one is final: taking a
+        # later one would mean undoing its move, streak and place in the
+        # arrival order, or grading at the end of the round again
+        if self.awaiting.pop(nickname, None) is None:
+            raise WrongStateError("Already answered.")
+        ANSWERS_LOGGER.info("[Room %d] %s answered: %d.", self.room_id, nickname, answer)
+
+        player.answer = answer
+        player.answer_time = time.time()
+        self.snapshot_dirty = True
+        if self.question_manager.check_player_answer(self.question, answer):
+            self.grade_correct(player)
+        else:
+            self.grade_incorrect(player)
+        if not self.awaiting:
+            self.all_answered.set()
+
+    def grade_correct(self, player: Player) -> None:
+        self.player_manager.move_player(player, 1)
+        self.player_manager.record_answer(player, True)
+        self.correct_players.append(player)
+        self.results.append((player.nickname, "ANSWER_CORRECT"))
+        RESULTS_LOGGER.info(
+            "[Room %d] %s answered correctly, position: %d.",
+            self.room_id,
+            player.nickname,
+            player.position,
+        )
+
+    def grade_incorrect(self, player: Player) -> None:
+        self.player_manager.move_player(player, -1)
+        self.player_manager.record_answer(player, False)
+        self.report_incorrect(player)
+
+    def report_incorrect(self, player: Player) -> None:
+        self.incorrect_count += 1
+        self.results.append((player.nickname, "ANSWER_INCORRECT"))
+        RESULTS_LOGGER.info(
+            "[Room %d] %s answered incorrectly, position: %d.",
+            self.room_id,
+            player.nickname,
+            player.position,
+        )
+
+    def handle_disconnection(self, nickname: str) -> None:
+        if self.state == GameState.LOBBY:
+            self.player_manager.remove_player(nickname)
+        else:
+            player: Player = self.player_manager.players[nickname]
+            if (
+                self.state == GameState.WAITING_FOR_ANSWERS
+                and not player.is_disqualified
+                and nickname not in self.awaiting
+            ):
+                self.take_back_answer(player)
+            self.player_manager.disqualify(player)
+            self.snapshot_dirty = True
+            # Nobody waits for an answer from a player who left
+            if self.awaiting.pop(nickname, None) is not None and not self.awaiting:
+                self.all_answered.set()
+        self.clients.broadcast("PLAYER_LEFT", nickname, except_nicknames=[nickname])
+
+    def take_back_answer(self, player: Player) -> None:
+        """Undo the grading of a player who leaves before the window closes.
+
+        A player who left is only disqualified, as if the answer had never
+        been given: it neither moves them nor counts towards the bonus.
+        """
+        # The answer is the only move since the round started; the streak
+        # stays, it no longer counts once disqualified
+        self.player_manager.move_player(player, -player.diff_points)
+        if player in self.correct_players:
+            self.correct_players.remove(player)
+        else:
+            self.incorrect_count -= 1
+        self.results = [
+            result for result in self.results if result[0] != player.nickname
+        ]
+
+    def send_scores(self) -> None:
+        # Clients that negotiated "delta" get only the players that changed,
+        # except on keyframe rounds where everybody gets the full roster.
+        changed: List[Tuple[str, int, int]] = (
+            self.player_manager.pack_players_round_delta()
+        )
+        is_keyframe: bool = self.round_index % self.scores_keyframe_interval == 0
+        if is_keyframe or self.clients.has_client_without("delta"):
+            scores: List[Tuple[str, int, int]] = (
+                self.player_manager.pack_players_round_info()
+            )
+            self.clients.broadcast(
+                "SCORES",
+                self.fastest_nickname,
+                *scores,
+                only=lambda conn: is_keyframe or "delta" not in conn.features,
+            )
+        if not is_keyframe:
+            self.clients.broadcast(
+                "SCORES_DELTA",
+                self.fastest_nickname,
+                *changed,
+                only=lambda conn: "delta" in conn.features,
+            )
+
+    def pack_state(self) -> RoomState:
+        question: Optional[Question] = self.question
+        is_answering: bool = self.state == GameState.WAITING_FOR_ANSWERS
+        correct_ranks: Dict[str, int] = {
+            player.nickname: rank for rank, player in enumerate(self.correct_players)
+        }
+        return RoomState(
+            self.room_id,
+            self.max_players,
+            self.race_length,
+            self.answer_time_limit,
+            self.prepare_time_limit,
+            self.scores_keyframe_interval,
+            self.question_manager.seed,
+            self.question_manager.taken,
+            self.round_index,
+            is_answering,
+            time.time() + self.deadline - asyncio.get_running_loop().time(),
+            (
+                (
+                    question.first_number,
+                    question.operator,
+                    question.second_number,
+                    question.answer,
+                )
+                if is_answering
+                else None
+            ),
+            self.incorrect_count,
+            self.fastest_nickname,
+            [
+                PlayerState(
+                    player.nickname,
+                    player.position,
+                    player.diff_points,
+                    player.wa_streak,
+                    player.is_ready,
+                    player.is_disqualified,
+                    player.answer_time,
+                    player.nickname in self.awaiting,
+                    correct_ranks.get(player.nickname, -1),
+                )
+                for player in self.player_manager.players.values()
+            ],
+        )
+
+    def save_snapshot(self) -> None:
+        self.snapshot_dirty = False
+        if snapshots.STORE is None:
+            return
+        if self.is_playing():
+            snapshots.STORE.save(self.pack_state())
+        else:
+            snapshots.STORE.close_room(self.room_id)
+
+    def restore(self, state: RoomState) -> None:
+        """Pick up the match of a snapshot and run it from where it was.
+
+        Its players are vacant until their clients register again.
+        """
+        self.question_manager.skip(state.questions_taken)
+        self.round_index = state.round_index
+        self.incorrect_count = state.incorrect_count
+        self.fastest_nickname = state.fastest_nickname
+        correct: List[Tuple[int, Player]] = []
+        for saved in state.players:
+            player: Player = self.player_manager.new_player(saved.nickname)
+            player.position = saved.position
+            player.diff_points = saved.diff_points
+            player.wa_streak = saved.wa_streak
+            player.is_ready = saved.is_ready
+            player.is_disqualified = saved.is_disqualified
+            player.answer_time = saved.answer_time
+            self.player_manager.add_player(player)
+            self.vacant.add(player.nickname)
+            if saved.is_awaited:
+                self.awaiting[player.nickname] = player
+            if saved.correct_rank >= 0:
+                correct.append((saved.correct_rank, player))
+            elif state.is_answering and not (saved.is_awaited or saved.is_disqualified):
+                self.results.append((player.nickname, "ANSWER_INCORRECT"))
+        self.correct_players = [player for _, player in sorted(correct)]
+        if state.is_answering:
+            # Results not sent yet when the snapshot was taken go out at the
+            # end of the round as usual
+            self.results.extend(
+                (player.nickname, "ANSWER_CORRECT") for player in self.correct_players
+            )
+
+        if state.is_answering:
+            self.question = Question(
+                state.question[0],
+                state.question[2],
+                state.question[1],
+                state.question[3],
+            )
+            self.state = GameState.WAITING_FOR_ANSWERS
+            if not self.awaiting:
+                self.all_answered.set()
+        else:
+            self.state = GameState.PROCESSING
+        # The phase keeps whatever time it had left when the snapshot was taken
+        self.deadline = asyncio.get_running_loop().time() + max(
+            0.0, state.deadline - time.time()
+        )
+        self.loop_task = asyncio.create_task(self.game_loop(resumed=True))
+
+    def is_over(self) -> Tuple[bool, Optional[Player]]:
+        player_manager: PlayerManager = self.player_manager
+        if not player_manager.qualified:
+            return True, None
+        if not player_manager.finishers:
+            return False, None
+
+        # The leader has finished, so the winner is one of the finishers
+        winner: Optional[Player] = None
+        for player in player_manager.finishers.values():
+            if winner is None:
+                winner = player
+            elif player.position > winner.position:
+                winner = player
+            elif (
+                player.position == winner.position
+                and player.answer_time is not None
+                # Players who did not answer lose ties
+                and (
+                    winner.answer_time is None
+                    or player.answer_time < winner.answer_time
+                )
+            ):
+                winner = player
+        return True, winner
+
+    async def game_loop(self, resumed: bool = False):
+        # A resumed loop continues the round and phase restore left it in
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while self.state != GameState.LOBBY:
+            if not resumed:
+                self.round_index += 1
+                LOGGER.info(
+                    "[Room %d] Starting round %d.", self.room_id, self.round_index
+                )
+
+                # Generate a new question
+                self.player_manager.start_round()
+
+                self.state = GameState.PROCESSING
+                self.deadline = loop.time() + self.prepare_time_limit
+                self.save_snapshot()
+
+            if self.state == GameState.PROCESSING:
+                started: float = time.perf_counter()
+                await asyncio.sleep(self.deadline - loop.time())
+                metrics.GAME_PHASE_SECONDS.observe(
+                    time.perf_counter() - started, "prepare"
+                )
+
+                question: Question = self.question_manager.generate_question()
+                LOGGER.info(
+                    "[Room %d] Question #%d: %d %s %d = %d.",
+                    self.room_id,
+                    self.round_index,
+                    question.first_number,
+                    question.operator,
+                    question.second_number,
+                    question.answer,
+                )
+
+                # Send the question to all clients
+                self.clients.broadcast(
+                    "QUESTION",
+                    self.round_index,
+                    question.first_number,
+                    question.operator,
+                    question.second_number,
+                )
+
+                self.open_answer_window(question)
+                self.deadline = loop.time() + self.answer_time_limit
+                self.save_snapshot()
+                LOGGER.info(
+                    "[Room %d] State changed: WAITING_FOR_ANSWERS.", self.room_id
+                )
+            resumed = False
+
+            # Wait for the clients to answer, or only until all of them did
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.all_answered.wait(), self.deadline - loop.time()
+                )
+            except asyncio.TimeoutError:
+                pass
+            metrics.GAME_PHASE_SECONDS.observe(time.perf_counter() - started, "answer")
+
+            self.state = GameState.PROCESSING
+            LOGGER.info("[Room %d] State changed: PROCESSING.", self.room_id)
+            # Everything sent while finishing the round reaches each client
+            # in a single write
+            started = time.perf_counter()
+            with self.clients.batch():
+                self.finish_round(self.question)
+            metrics.GAME_PHASE_SECONDS.observe(
+                time.perf_counter() - started, "processing"
+            )
+
+    def finish_round(self, question: Question) -> None:
+        # Answers were graded as they arrived; only the silent players are left
+        silent_players: List[Player] = list(self.awaiting.values())
+        self.player_manager.record_missed_answers(silent_players)
+        for player in silent_players:
+            self.report_incorrect(player)
+        self.awaiting = {}
+        for nickname, result in self.results:
+            self.clients.write_to_player(nickname, result, question.answer)
+        self.results = []
+        for nickname in self.player_manager.disqualified:
+            self.clients.write_to_player(nickname, "ANSWER", question.answer)
+
+        # Add bonus score for the fastest player still in the race
+        fastest_player: Optional[Player] = next(
+            (player for player in self.correct_players if not player.is_disqualified),
+            None,
+        )
+        fastest_bonus: int = self.incorrect_count
+        if fastest_player is not None:
+            self.player_manager.move_player(fastest_player, fastest_bonus)
+            LOGGER.info(
+                "[Room %d] Fastest player: %s, bonus: %d.",
+                self.room_id,
+                fastest_player.nickname,
+                fastest_bonus,
+            )
+
+        # Disqualify players with consecutive wrong answers
+        disqualified_players: List[Player] = (
+            self.player_manager.disqualify_players()
+        )
+        if disqualified_players:
+            disqualified_nicknames: List[str] = [
+                player.nickname for player in disqualified_players
+            ]
+            self.clients.broadcast("DISQUALIFICATION", *disqualified_nicknames)
+            LOGGER.info(
+                "[Room %d] Disqualified players: %s.",
+                self.room_id,
+                ";".join(disqualified_nicknames),
+            )
+
+        # Send the updated scores to all clients
+        fastest_player_nickname = (
+            fastest_player.nickname if fastest_player else None
+        )
+        self.fastest_nickname = fastest_player_nickname or ""
+        self.send_scores()
+
+        # Check if the game is over
+        is_over: bool
+        winner: Optional[Player]
+        is_over, winner = self.is_over()
+        winner_nickname = winner.nickname if winner else None
+        if is_over:
+            self.clients.broadcast("GAME_OVER", winner_nickname or "")
+            LOGGER.info(
+                "[Room %d] Game over. Winner is %s.", self.room_id, winner_nickname or ""
+            )
+            self.reset_game()
+            self.clients.reset_clients()
+            self.save_snapshot()
@@ -0,0 +1,67 @@
+"""Heartbeats: finding peers that went away without closing the connection.
+
+A client that negotiated HELLO;heartbeat is sent PING;<stamp> every INTERVAL
+seconds and answers PONG;<stamp>. Anything it sends shows it is alive; one
+that stays silent for TIMEOUT seconds is taken for dead and evicted, which
+frees its seat, buffers and writer task like any disconnection. The echoed
+stamp gives the round-trip time. Clients may ping the server the same way.
+
+The PINGs the server sends and the PONGs it answers with are neither
+recorded nor kept for RESUME, they only make sense on the connection they
+were sent on. What clients send is recorded like any other frame, and a
+replay answers it the same way.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List
+
+import metrics
+from connection import Connection
+from protocol import Codec
+
+LOGGER = logging.getLogger(__name__)
+
+# Ping clients this often (seconds, 0 to never)
+INTERVAL = 5.0
+# Evict a client that sent nothing for this long (seconds)
+TIMEOUT = 15.0
+
+COMMANDS = ("PING", "PONG")
+
+
+def stamp() -> int:
+    # Milliseconds on this process's monotonic clock, only ever compared here
+    return int(time.monotonic() * 1000)
+
+
+def answer(conn: Connection, command: str, args: List[Any]) -> None:
+    if command == "PING":
+        conn.send(conn.codec.encode("PONG", args))
+    elif args:
+        conn.rtt = max(stamp() - args[0], 0) / 1000
+        metrics.HEARTBEAT_RTT_SECONDS.observe(conn.rtt)
+
+
+async def run(
+    connections: Dict[Any, Connection],
+    interval: float = INTERVAL,
+    timeout: float = TIMEOUT,
+) -> None:
+    """Ping every client that asked for heartbeats and evict the silent ones."""
+    while True:
+        await asyncio.sleep(interval)
+        now: float = time.monotonic()
+        # One PING frame per codec, like a broadcast
+        frames: Dict[Codec, bytes] = {}
+        for conn in list(connections.values()):
+            if "heartbeat" not in conn.features or conn.is_closed:
+                continue
+            silent: float = now - conn.last_heard
+            if silent > timeout:
+                metrics.REJECTIONS.inc(label="heartbeat_timeout")
+                conn.evict(f"silent for {silent:.1f} s")
+                continue
+            if conn.codec not in frames:
+                frames[conn.codec] = conn.codec.encode("PING", [stamp()])
+            conn.send(frames[conn.codec])
@@ -0,0 +1,129 @@
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+LOG_FORMAT = "%(asctime)s %(message)s"
+LOG_DATE_FORMAT = "%m/%d/%Y %H:%M:%S"
+
+# High volume log lines, each with its own logger so that they can be
+# sampled or rate limited separately:
+#   messages:    every request received from a client
+#   answers:     every answer submitted
+#   results:     every answer's result
+#   connections: connections accepted and closed
+CATEGORIES = ["messages", "answers", "results", "connections"]
+
+
+class CategoryLogger(logging.Logger):
+    """Logger that keeps one in sample_every messages and at most rate_limit
+    messages per second.
+
+    Both checks happen in isEnabledFor, so a dropped message costs about as
+    much as a disabled one: no record is built and no argument formatted.
+    The number of dropped messages is logged before the next one that
+    passes.
+    """
+
+    def __init__(self, name: str, level: int = logging.NOTSET):
+        super().__init__(name, level)
+        self.sample_every: int = 1
+        self.rate_limit: float = 0.0
+        self.tokens: float = 0.0
+        self.refilled_at: float = 0.0
+        self.seen: int = 0
+        self.dropped: int = 0
+        self.unreported: int = 0
+
+    def configure(self, sample_every: int = 1, rate_limit: float = 0.0) -> None:
+        self.sample_every = max(1, sample_every)
+        self.rate_limit = rate_limit
+        self.tokens = rate_limit
+        self.refilled_at = time.monotonic()
+
+    def isEnabledFor(self, level: int) -> bool:
+        if not super().isEnabledFor(level):
+            return False
+        self.seen += 1
+        if self.seen % self.sample_every:
+            self.dropped += 1
+            return False
+        if self.rate_limit > 0:
+            now: float = time.monotonic()
+            self.tokens = min(
+                self.rate_limit,
+                self.tokens + (now - self.refilled_at) * self.rate_limit,
+            )
+            self.refilled_at = now
+            if self.tokens < 1:
+                self.dropped += 1
+                self.unreported += 1
+                return False
+            self.tokens -= 1
+        return True
+
+    def _log(self, level: int, msg: object, args, **kwargs) -> None:
+        if self.unreported:
+            unreported: int = self.unreported
+            self.unreported = 0
+            super()._log(
+                level,
+                "[Log] Rate limit dropped %d %s messages.",
+                (unreported, self.name),
+            )
+        super()._log(level, msg, args, **kwargs)
+
+
+def get_logger(category: str) -> CategoryLogger:
+    manager: logging.Manager = logging.Logger.manager
+    previous = manager.loggerClass
+    manager.setLoggerClass(CategoryLogger)
+    try:
+        logger = logging.getLogger(category)
+    finally:
+        manager.loggerClass = previous
+    assert isinstance(logger, CategoryLogger)
+    return logger
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Hands records to the listener thread without formatting them.
+
+    QueueHandler formats in the caller so that records can be pickled; ours
+    stay in the process, so formatting is left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    sample_every: Optional[Dict[str, int]] = None,
+    rate_limits: Optional[Dict[str, float]] = None,
+) -> QueueListener:
+    """Route all logging through a queue drained by a background thread.
+
+    Must be called again in every forked worker, since the listener thread
+    does not survive the fork. Returns the listener; stop it on shutdown to
+    flush what is still queued.
+    """
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    listener = QueueListener(records, stream_handler)
+
+    root: logging.Logger = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(level.upper())
+
+    for category in CATEGORIES:
+        get_logger(category).configure(
+            (sample_every or {}).get(category, 1),
+            (rate_limits or {}).get(category, 0.0),
+        )
+    listener.start()
+    return listener
@@ -0,0 +1,256 @@
+"""Server metrics, served in the Prometheus text format.
+
+Metrics are plain module level objects updated by the code they describe.
+Nothing is exported unless the HTTP endpoint is started with
+start_metrics_server.
+"""
+import asyncio
+import bisect
+import logging
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+]
+PHASE_BUCKETS = [0.001, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0]
+# How often the event loop lag is sampled (seconds)
+LOOP_LAG_INTERVAL = 0.5
+
+# keeps the lag monitor from being garbage collected
+_monitor_task: Optional[asyncio.Task] = None
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metric:
+    kind: str = "untyped"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name: str = name
+        self.help: str = help
+        # name of the single label told apart by this metric, if any
+        self.label: Optional[str] = label
+        REGISTRY.append(self)
+
+    def labels_for(self, value: str) -> Tuple[Tuple[str, str], ...]:
+        return ((self.label, value),) if self.label else ()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        return "\n".join(
+            [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+            + self.samples()
+        )
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        super().__init__(name, help, label)
+        self.values: Dict[str, float] = {}
+
+    def inc(self, amount: float = 1, label: str = "") -> None:
+        self.values[label] = self.values.get(label, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.labels_for(label))} {value}"
+            for label, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.value: float = 0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from function at scrape time instead."""
+        self.function = function
+
+    def samples(self) -> List[str]:
+        value: float = self.function() if self.function else self.value
+        return [f"{self.name} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: List[float] = LATENCY_BUCKETS,
+        label: Optional[str] = None,
+    ):
+        super().__init__(name, help, label)
+        self.buckets: List[float] = buckets
+        # label -> observations per bucket, +Inf last
+        self.counts: Dict[str, List[int]] = {}
+        self.sums: Dict[str, float] = {}
+
+    def observe(self, value: float, label: str = "") -> None:
+        counts: Optional[List[int]] = self.counts.get(label)
+        if counts is None:
+            counts = self.counts[label] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[label] = self.sums.get(label, 0.0) + value
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for label, counts in sorted(self.counts.items()):
+            labels: Tuple[Tuple[str, str], ...] = self.labels_for(label)
+            cumulative: int = 0
+            bounds: List[str] = [repr(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{format_labels(labels)} {self.sums[label]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+CONNECTIONS = Gauge("racing_arena_connections", "Open client connections.")
+PLAYERS = Gauge("racing_arena_players", "Players registered in a room.")
+ROOMS = Gauge("racing_arena_rooms", "Open rooms.")
+MESSAGES_RECEIVED = Counter(
+    "racing_arena_messages_received_total",
+    "Messages received from clients.",
+    "command",
+)
+MESSAGES_SENT = Counter(
+    "racing_arena_messages_sent_total",
+    "Messages queued for clients, counting each recipient of a broadcast.",
+    "command",
+)
+REJECTIONS = Counter(
+    "racing_arena_rejections_total",
+    "Connections dropped and requests refused for going past an admission limit.",
+    "reason",
+)
+SPECTATOR_MESSAGES_SENT = Counter(
+    "racing_arena_spectator_messages_sent_total",
+    "Messages queued for spectators, counting each spectator.",
+    "command",
+)
+BYTES_RECEIVED = Counter(
+    "racing_arena_bytes_received_total", "Bytes received from clients."
+)
+BYTES_SENT = Counter("racing_arena_bytes_sent_total", "Bytes written to clients.")
+BROADCAST_SECONDS = Histogram(
+    "racing_arena_broadcast_seconds",
+    "Time to encode a broadcast and queue it for every recipient.",
+)
+DRAIN_SECONDS = Histogram(
+    "racing_arena_drain_seconds",
+    "Time for a connection's writes to drain to the socket.",
+)
+HEARTBEAT_RTT_SECONDS = Histogram(
+    "racing_arena_heartbeat_rtt_seconds",
+    "Round-trip time of heartbeats to clients.",
+)
+LOOP_LAG_SECONDS = Histogram(
+    "racing_arena_event_loop_lag_seconds",
+    "How late the event loop runs a timer that is due.",
+)
+GAME_PHASE_SECONDS = Histogram(
+    "racing_arena_game_phase_seconds",
+    "Duration of each game loop phase.",
+    PHASE_BUCKETS,
+    "phase",
+)
+
+
+def expose() -> str:
+    return "\n".join(metric.expose() for metric in REGISTRY) + "\n"
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL) -> None:
+    while True:
+        started: float = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+async def handle_scrape(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        request_line: bytes = await asyncio.wait_for(reader.readline(), 5)
+        # Skip the headers, nothing in them matters here
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass
+        method, path, *_ = request_line.decode().split() + ["", ""]
+        if method == "GET" and path.split("?")[0] in ("/", "/metrics"):
+            status: str = "200 OK"
+            body: bytes = expose().encode()
+        else:
+            status = "404 Not Found"
+            body = b"Not found.\n"
+        writer.write(
+            f"HTTP/1.0 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    sock: Optional[socket.socket] = None,
+) -> asyncio.AbstractServer:
+    """Serve metrics at host and port, or on an already listening sock."""
+    global _monitor_task
+    server: asyncio.AbstractServer = await asyncio.start_server(
+        handle_scrape, host, port, sock=sock
+    )
+    # One monitor however many sockets metrics are served on
+    if _monitor_task is None:
+        _monitor_task = asyncio.create_task(monitor_loop_lag())
+    if sock is not None:
+        host, port = sock.getsockname()[:2]
+    LOGGER.info("[Metrics] Serving metrics at http://%s:%d/metrics.", host, port)
+    return server
@@ -0,0 +1,65 @@
+"""Framing of the channel between an edge relay and the game server.
+
+A relay (relay.py) terminates client sockets and carries all of them over a
+few upstream connections. Every frame on such a link is
+
+    !I length of the rest, !B kind, !I session id, payload
+
+    OPEN       relay to server, a client connected; payload is its
+               "host:port" address
+    DATA       relay to server: bytes the client sent
+               server to relay: bytes to write to the client
+    BROADCAST  server to relay: !I count, that many !I session ids, then
+               the bytes to write to each of those clients
+    CLOSE      relay to server: the client disconnected
+               server to relay: close the client's socket
+
+A session id names one client connection for the lifetime of its link.
+"""
+import asyncio
+import struct
+from typing import List, NamedTuple, Optional, Tuple
+
+OPEN = 1
+DATA = 2
+BROADCAST = 3
+CLOSE = 4
+
+HEADER = struct.Struct("!IBI")
+_COUNT = struct.Struct("!I")
+# Refuse link frames larger than this (bytes)
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class Frame(NamedTuple):
+    kind: int
+    session_id: int
+    payload: bytes
+
+
+def pack(kind: int, session_id: int, payload: bytes = b"") -> bytes:
+    # The length covers the kind and session id, so an empty payload is 5
+    return HEADER.pack(len(payload) + 5, kind, session_id) + payload
+
+
+def pack_broadcast(session_ids: List[int], data: bytes) -> bytes:
+    ids: bytes = struct.pack(f"!{len(session_ids)}I", *session_ids)
+    return pack(BROADCAST, 0, _COUNT.pack(len(session_ids)) + ids + data)
+
+
+def unpack_broadcast(payload: bytes) -> Tuple[Tuple[int, ...], bytes]:
+    (count,) = _COUNT.unpack_from(payload)
+    end: int = _COUNT.size + 4 * count
+    return struct.unpack_from(f"!{count}I", payload, _COUNT.size), payload[end:]
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Frame]:
+    """The next frame of the link, None once it is closed."""
+    try:
+        header: bytes = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    length, kind, session_id = HEADER.unpack(header)
+    if not 5 <= length <= MAX_FRAME_SIZE:
+        raise ValueError(f"Bad link frame length {length}.")
+    return Frame(kind, session_id, await reader.readexactly(length - 5))
@@ -1,9 +1,26 @@
 import re
-from typing import Optional, Dict, List
+import sys
+import math
+from typing import Any, Callable, Optional, Dict, List, Tuple
+
+import scoring
 from exceptions import RegistrationError
+from scoring import ScoreBoard
 
 
 class Player:
+    # No per-instance __dict__, a room can hold a lot of players
+    __slots__ = (
+        "nickname",
+        "answer",
+        "answer_time",
+        "diff_points",
+        "position",
+        "wa_streak",
+        "is_ready",
+        "is_disqualified",
+    )
+
     def __init__(self, nickname: str):
         self.nickname: str = nickname
         self.answer: Optional[str] = None
@@ -35,10 +52,78 @@ class Player:
         self.diff_points += self.position - tmp
 
 
+def _board_field(
+    name: str, load: Callable[[Any], Any], store: Callable[[Any], Any] = lambda v: v
+) -> property:
+    def get(self: "BoardPlayer") -> Any:
+        return load(getattr(self.board, name)[self.slot])
+
+    def set(self: "BoardPlayer", value: Any) -> None:
+        getattr(self.board, name)[self.slot] = store(value)
+
+    return property(get, set)
+
+
+class BoardPlayer(Player):
+    """Player whose scores live in a slot of the room's ScoreBoard."""
+
+    __slots__ = ("board", "slot")
+
+    def __init__(self, nickname: str, board: ScoreBoard):
+        self.board: ScoreBoard = board
+        self.slot: int = board.add(nickname)
+        super().__init__(nickname)
+
+    answer = _board_field("answers", lambda value: value)
+    answer_time = _board_field(
+        "answer_times",
+        lambda value: None if math.isnan(value) else float(value),
+        lambda value: math.nan if value is None else value,
+    )
+    diff_points = _board_field("diff_points", int)
+    position = _board_field("positions", int)
+    wa_streak = _board_field("wa_streaks", int)
+    is_disqualified = _board_field("disqualified", bool)
+
+
+# Wrong answers in a row that get a player disqualified
+MAX_WA_STREAK = 3
+
+
 class PlayerManager:
-    def __init__(self, max_players: int):
+    """Registered players of a room.
+
+    Player state that the game checks often is indexed here and kept up to
+    date by the methods below, so change it through them rather than on the
+    Player directly (or call reindex afterwards).
+
+    Rooms for scoring.MIN_PLAYERS players or more keep the scores in a
+    ScoreBoard when NumPy is installed; use_board overrides the room size
+    check.
+    """
+
+    def __init__(
+        self, max_players: int, race_length: int = 0, use_board: Optional[bool] = None
+    ):
         self.max_players: int = max_players
+        # players at this position or past it have finished the race
+        self.race_length: int = race_length
+        if use_board is None:
+            use_board = max_players >= scoring.MIN_PLAYERS
+        self.board: Optional[ScoreBoard] = (
+            ScoreBoard() if use_board and scoring.is_available() else None
+        )
         self.players: Dict[str, Player] = {}
+        # (diff points, position) of each player as last sent in SCORES
+        self.sent_scores: Dict[str, Tuple[int, int]] = {}
+        self.ready_count: int = 0
+        # in registration order
+        self.qualified: Dict[str, Player] = {}
+        self.disqualified: Dict[str, Player] = {}
+        # qualified players due to be disqualified for their wrong answers
+        self.streak_candidates: Dict[str, Player] = {}
+        # qualified players who reached the finish line
+        self.finishers: Dict[str, Player] = {}
 
     def check_valid_nickname(self, nickname: str) -> bool:
         return bool(re.match(r"^[a-zA-Z0-9_]{1,10}$", nickname))
@@ -53,20 +138,125 @@ class PlayerManager:
             raise RegistrationError("Invalid nickname.")
         if self.check_existed_nickname(nickname):
             raise RegistrationError("Nickname already exists.")
-        player = Player(nickname)
-        self.players[player.nickname] = player
+        player: Player = self.new_player(nickname)
+        self.add_player(player)
         return player
 
+    def new_player(self, nickname: str) -> Player:
+        # Every index and the room's client table then share one string
+        nickname = sys.intern(nickname)
+        if self.board is not None:
+            return BoardPlayer(nickname, self.board)
+        return Player(nickname)
+
+    def add_player(self, player: Player) -> None:
+        self.players[player.nickname] = player
+        self.index_player(player)
+
+    def index_player(self, player: Player) -> None:
+        nickname: str = player.nickname
+        self.ready_count += player.is_ready
+        if player.is_disqualified:
+            self.disqualified[nickname] = player
+            return
+        self.qualified[nickname] = player
+        if player.wa_streak >= MAX_WA_STREAK:
+            self.streak_candidates[nickname] = player
+        if player.position >= self.race_length > 0:
+            self.finishers[nickname] = player
+
+    def reindex(self) -> None:
+        """Rebuild the indexes after changing players directly."""
+        self.ready_count = 0
+        self.qualified = {}
+        self.disqualified = {}
+        self.streak_candidates = {}
+        self.finishers = {}
+        for player in self.players.values():
+            self.index_player(player)
+
     def remove_player(self, nickname: str) -> None:
-        if nickname in self.players:
-            del self.players[nickname]
+        player: Optional[Player] = self.players.pop(nickname, None)
+        if player is None:
+            return
+        if self.board is not None:
+            self.board.remove(player.slot)
+        self.ready_count -= player.is_ready
+        self.qualified.pop(nickname, None)
+        self.disqualified.pop(nickname, None)
+        self.streak_candidates.pop(nickname, None)
+        self.finishers.pop(nickname, None)
+
+    def set_ready(self, nickname: str, is_ready: bool) -> None:
+        player: Player = self.players[nickname]
+        if player.is_ready != is_ready:
+            self.ready_count += 1 if is_ready else -1
+            if is_ready:
+                player.ready()
+            else:
+                player.unready()
+
+    def move_player(self, player: Player, received_points: int) -> None:
+        player.update_state(received_points)
+        if player.is_disqualified or self.race_length <= 0:
+            return
+        if player.position >= self.race_length:
+            self.finishers[player.nickname] = player
+        else:
+            self.finishers.pop(player.nickname, None)
+
+    def record_answer(self, player: Player, is_correct: bool) -> None:
+        if is_correct:
+            player.wa_streak = 0
+            self.streak_candidates.pop(player.nickname, None)
+        else:
+            player.wa_streak += 1
+            if player.wa_streak >= MAX_WA_STREAK and not player.is_disqualified:
+                self.streak_candidates[player.nickname] = player
+
+    def start_round(self) -> None:
+        if self.board is not None:
+            self.board.start_round()
+            return
+        for player in self.qualified.values():
+            player.reset_new_round()
+
+    def record_missed_answers(self, players: List[Player]) -> None:
+        """Score qualified players who did not answer as wrong answers."""
+        if self.board is None:
+            for player in players:
+                self.move_player(player, -1)
+                self.record_answer(player, False)
+            return
+        if not players:
+            return
+        by_slot: Dict[int, Player] = {player.slot: player for player in players}
+        short: List[int]
+        streaky: List[int]
+        short, streaky = self.board.grade_incorrect(
+            list(by_slot), self.race_length, MAX_WA_STREAK
+        )
+        # Players only moved back, so some may have left the finishers
+        for slot in short:
+            self.finishers.pop(by_slot[slot].nickname, None)
+        for slot in streaky:
+            self.streak_candidates[by_slot[slot].nickname] = by_slot[slot]
+
+    def disqualify(self, player: Player) -> None:
+        if player.is_disqualified:
+            return
+        player.disqualify()
+        nickname: str = player.nickname
+        self.qualified.pop(nickname, None)
+        self.streak_candidates.pop(nickname, None)
+        self.finishers.pop(nickname, None)
+        self.disqualified[nickname] = player
 
     def disqualify_players(self) -> List[Player]:
-        disqualified_players: List[Player] = []
-        for player in self.players.values():
-            if player.wa_streak >= 3:
-                player.disqualify()
-                disqualified_players.append(player)
+        # Only the players disqualified just now
+        disqualified_players: List[Player] = list(self.streak_candidates.values())
+        for player in disqualified_players:
+            self.disqualify(player)
         return disqualified_players
 
     def get_all_players(self) -> List[Player]:  # all registered players
@@ -75,25 +265,40 @@ class PlayerManager:
     def get_readied_players(self) -> List[Player]:
         return [player for player in self.players.values() if player.is_ready]
 
-    def pack_players_lobby_info(self) -> str:
-        return ";".join(
-            [f"{player.nickname},{player.is_ready}" for player in self.players.values()]
-        )
+    def pack_players_lobby_info(self) -> List[Tuple[str, bool]]:
+        return [(player.nickname, player.is_ready) for player in self.players.values()]
 
-    def pack_players_round_info(self) -> str:
-        return ";".join(
-            [
-                f"{player.nickname},{player.diff_points},{player.position}"
-                for player in self.players.values()
-            ]
-        )
-
-    def get_qualified_players(self) -> List[Player]:  # players who are not disqualified
+    def pack_players_round_info(self) -> List[Tuple[str, int, int]]:
+        if self.board is not None:
+            return self.board.pack_round_info()
         return [
-            player for player in self.players.values() if not player.is_disqualified
+            (player.nickname, player.diff_points, player.position)
+            for player in self.players.values()
         ]
 
+    def pack_players_round_delta(self) -> List[Tuple[str, int, int]]:
+        # Only players whose entry differs from the last one sent. Clients
+        # start everybody at 0 diff points, position 1.
+        if self.board is not None:
+            return self.board.pack_round_delta()
+        changed: List[Tuple[str, int, int]] = []
+        for player in self.players.values():
+            score: Tuple[int, int] = (player.diff_points, player.position)
+            if self.sent_scores.get(player.nickname, (0, 1)) != score:
+                self.sent_scores[player.nickname] = score
+                changed.append((player.nickname, player.diff_points, player.position))
+        return changed
+
+    def forget_sent_scores(self) -> None:
+        self.sent_scores.clear()
+        if self.board is not None:
+            self.board.forget_sent_scores()
+
+    def get_qualified_players(self) -> List[Player]:  # players who are not disqualified
+        return list(self.qualified.values())
+
     def can_start_game(self) -> bool:
-        return len(self.get_all_players()) <= self.max_players and all(
-            player.is_ready for player in self.get_all_players()
+        return (
+            len(self.players) <= self.max_players
+            and self.ready_count == len(self.players)
         )
@@ -1,6 +1,25 @@
 import random
-import math
-from typing import List
+import logging
+import threading
+from collections import deque
+from typing import Deque, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # optional, batches are generated in pure Python without it
+    np = None
+
+LOGGER = logging.getLogger(__name__)
+
+OPERATORS: List[str] = ["+", "-", "*", "/", "%"]
+LOW = -10000
+HIGH = 10000
+# Questions generated per refill
+BATCH_SIZE = 1024
+# A seeded pool belongs to a single room, keep it small
+ROOM_BATCH_SIZE = 64
+# Refill in the background once a pool holds fewer questions than this
+LOW_WATER = 16
 
 
 class Question:
@@ -16,45 +35,173 @@ class Question:
         return f"{self.first_number};{self.operator};{self.second_number}"
 
 
+def compute_answer(first_number: int, second_number: int, operator: str) -> int:
+    if operator == "+":
+        return first_number + second_number
+    elif operator == "-":
+        return first_number - second_number
+    elif operator == "*":
+        return first_number * second_number
+    elif operator == "/":
+        return first_number // second_number
+    elif operator == "%":
+        return first_number % second_number
+    raise ValueError("Invalid operator.")
+
+
+def random_question(rng: random.Random) -> Question:
+    operator: str = rng.choice(OPERATORS)
+    if operator in ("/", "%"):
+        # Draw from [LOW, HIGH] without 0
+        second_number = rng.randint(LOW, HIGH - 1)
+        second_number += second_number >= 0
+    else:
+        second_number = rng.randint(LOW, HIGH)
+    if operator == "/":
+        # A multiple of the divisor that stays within [LOW, HIGH]
+        bound: int = min(-LOW, HIGH) // abs(second_number)
+        first_number = second_number * rng.randint(-bound, bound)
+    else:
+        first_number = rng.randint(LOW, HIGH)
+    return Question(
+        first_number,
+        second_number,
+        operator,
+        compute_answer(first_number, second_number, operator),
+    )
+
+
+def generate_batch_python(rng: random.Random, count: int) -> List[Question]:
+    return [random_question(rng) for _ in range(count)]
+
+
+def generate_batch_numpy(rng: "np.random.Generator", count: int) -> List[Question]:
+    operators = rng.integers(0, len(OPERATORS), count)
+    divides = operators == OPERATORS.index("/")
+    is_divisor = divides | (operators == OPERATORS.index("%"))
+
+    second = rng.integers(LOW, HIGH + 1, count)
+    nonzero = rng.integers(LOW, HIGH, count)
+    nonzero += nonzero >= 0
+    second = np.where(is_divisor, nonzero, second)
+
+    # Division and modulo by 1 stand in for the rows that do neither
+    divisor = np.where(is_divisor, second, 1)
+
+    first = rng.integers(LOW, HIGH + 1, count)
+    bound = min(-LOW, HIGH) // np.abs(divisor)
+    quotient = rng.integers(-bound, bound + 1)
+    first = np.where(divides, second * quotient, first)
+
+    answers = np.select(
+        [
+            operators == OPERATORS.index("+"),
+            operators == OPERATORS.index("-"),
+            operators == OPERATORS.index("*"),
+            divides,
+        ],
+        [first + second, first - second, first * second, first // divisor],
+        first % divisor,
+    )
+    return [
+        Question(first_number, second_number, OPERATORS[operator], answer)
+        for first_number, second_number, operator, answer in zip(
+            first.tolist(), second.tolist(), operators.tolist(), answers.tolist()
+        )
+    ]
+
+
+class QuestionPool:
+    """Questions generated ahead of time in batches, handed out in order.
+
+    The sequence depends only on the seed (and on whether NumPy is
+    installed). take() starts a background refill when the pool runs low
+    and only generates in the caller when the pool ran dry.
+    """
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        batch_size: int = BATCH_SIZE,
+        low_water: int = LOW_WATER,
+    ):
+        self.rng: Union[random.Random, "np.random.Generator"] = (
+            np.random.default_rng(seed) if np is not None else random.Random(seed)
+        )
+        self.batch_size: int = batch_size
+        self.low_water: int = max(1, low_water)
+        self.questions: Deque[Question] = deque()
+        # held while generating, so batches come out of the generator in order
+        self.lock: threading.Lock = threading.Lock()
+        self.refilling: bool = False
+
+    def generate_batch(self) -> List[Question]:
+        if np is not None:
+            return generate_batch_numpy(self.rng, self.batch_size)
+        return generate_batch_python(self.rng, self.batch_size)
+
+    def refill(self) -> None:
+        with self.lock:
+            # Another refill may have finished while waiting for the lock
+            if len(self.questions) < self.low_water:
+                self.questions.extend(self.generate_batch())
+
+    def refill_in_background(self) -> None:
+        try:
+            self.refill()
+        except Exception:
+            LOGGER.exception("[Questions] Background refill failed.")
+        finally:
+            self.refilling = False
+
+    def take(self) -> Question:
+        while True:
+            try:
+                question: Question = self.questions.popleft()
+                break
+            except IndexError:
+                self.refill()
+        if len(self.questions) < self.low_water and not self.refilling:
+            self.refilling = True
+            threading.Thread(
+                target=self.refill_in_background, name="question-refill", daemon=True
+            ).start()
+        return question
+
+
+# Shared by every unseeded room of the process, created on first use so that
+# forked workers each get their own
+_shared_pool: Optional[QuestionPool] = None
+
+
+def shared_pool() -> QuestionPool:
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = QuestionPool()
+    return _shared_pool
+
+
 class QuestionManager:
-    def __init__(self):
-        self.operators: List[str] = ["+", "-", "*", "/", "%"]
+    def __init__(self, seed: Optional[int] = None):
+        self.operators: List[str] = OPERATORS
+        self.seed: Optional[int] = seed
+        # A seeded room draws from its own pool to keep its sequence
+        self.pool: QuestionPool = (
+            shared_pool() if seed is None else QuestionPool(seed, ROOM_BATCH_SIZE)
+        )
+        # questions handed out so far, where a restored room picks up
+        self.taken: int = 0
 
     def generate_question(self) -> Question:
-        lrange = -10000
-        rrange = 10000
-        # lrange = 1
-        # rrange = 8
-        operator: str = random.choice(self.operators)
-        if operator == "/":
-            second_number = 0
-            while second_number == 0:
-                second_number = random.randint(lrange, rrange)
-            first_number = second_number * random.randint(math.ceil(lrange/second_number), math.floor(rrange/second_number))
-        elif operator == "%":
-            second_number = 0
-            while second_number == 0:
-                second_number = random.randint(lrange, rrange)
-            first_number = random.randint(lrange, rrange)
-        else:
-            first_number = random.randint(lrange, rrange)
-            second_number = random.randint(lrange, rrange)
-
-        answer: int = 0
-        if operator == "+":
-            answer = first_number + second_number
-        elif operator == "-":
-            answer = first_number - second_number
-        elif operator == "*":
-            answer = first_number * second_number
-        elif operator == "/":
-            answer = first_number // second_number
-        elif operator == "%":
-            answer = first_number % second_number
-        else:
-            raise ValueError("Invalid operator.")
-
-        return Question(first_number, second_number, operator, answer)
+        self.taken += 1
+        return self.pool.take()
+
+    def skip(self, count: int) -> None:
+        # Only a seeded sequence has a place to pick up from
+        if self.seed is not None:
+            for _ in range(count):
+                self.pool.take()
+        self.taken += count
 
     def check_player_answer(self, question: Question, player_answer: int) -> bool:
         return question.answer == player_answer
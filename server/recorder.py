@@ -0,0 +1,168 @@
+"""Session recorder, an append-only binary log of a server's traffic.
+
+The log starts with MAGIC and a CONFIG record holding the server settings
+as JSON. Every record is a RECORD header followed by its payload:
+
+    !B kind, !Q microseconds since recording started, !i room id,
+    !I connection id (recipient count for BROADCAST), !I payload length
+
+    OPEN       a connection was accepted; payload is its codec id (!B)
+    INBOUND    a frame exactly as read from the connection
+    OUTBOUND   a message queued for one connection, binary encoded
+    BROADCAST  a message queued for a room, binary encoded once
+    CLOSE      the connection is no longer handled by this process
+
+Room id 0 stands for a connection outside any room. tools/replay.py feeds
+the INBOUND frames of a log to a fresh server.
+"""
+import asyncio
+import io
+import json
+import logging
+import struct
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from protocol import BINARY
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"RACELOG1"
+RECORD = struct.Struct("!BQiII")
+CODEC_ID = struct.Struct("!B")
+# Writes are buffered up to this size (bytes)...
+BUFFER_SIZE = 64 * 1024
+# ...and for at most this long, all a crash can lose of the log (seconds)
+FLUSH_INTERVAL = 0.2
+
+CONFIG = 0
+OPEN = 1
+INBOUND = 2
+OUTBOUND = 3
+BROADCAST = 4
+CLOSE = 5
+KIND_NAMES = ["CONFIG", "OPEN", "INBOUND", "OUTBOUND", "BROADCAST", "CLOSE"]
+
+
+class Record(NamedTuple):
+    kind: int
+    timestamp: float  # seconds since recording started
+    room_id: int
+    conn_id: int
+    payload: bytes
+
+
+class Recorder:
+    def __init__(self, path: str, config: Dict[str, Any]):
+        self.path: str = path
+        self.file: BinaryIO = open(path, "ab", buffering=BUFFER_SIZE)
+        self.started: int = time.monotonic_ns()
+        # set while records wait in the buffer
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # Each recording is self contained, even when appended to an old log
+        self.file.write(MAGIC)
+        self.write_record(CONFIG, 0, 0, json.dumps(config).encode())
+        self.file.flush()
+
+    def write_record(
+        self, kind: int, room_id: int, conn_id: int, payload: bytes
+    ) -> None:
+        elapsed: int = (time.monotonic_ns() - self.started) // 1000
+        self.file.write(RECORD.pack(kind, elapsed, room_id, conn_id, len(payload)))
+        self.file.write(payload)
+
+    def write(self, kind: int, room_id: int, conn_id: int, payload: bytes) -> None:
+        self.write_record(kind, room_id, conn_id, payload)
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                FLUSH_INTERVAL, self.flush
+            )
+
+    def flush(self) -> None:
+        self.flush_handle = None
+        self.file.flush()
+
+    def open(self, conn_id: int, codec_id: int) -> None:
+        self.write(OPEN, 0, conn_id, CODEC_ID.pack(codec_id))
+
+    def inbound(self, conn_id: int, room_id: int, frame: bytes) -> None:
+        self.write(INBOUND, room_id, conn_id, frame)
+
+    def outbound(
+        self, conn_id: int, room_id: int, command: str, args: Sequence[Any]
+    ) -> None:
+        self.write(OUTBOUND, room_id, conn_id, BINARY.encode(command, args))
+
+    def broadcast(
+        self, room_id: int, recipients: int, command: str, args: Sequence[Any]
+    ) -> None:
+        self.write(BROADCAST, room_id, recipients, BINARY.encode(command, args))
+
+    def close_connection(self, conn_id: int, room_id: int) -> None:
+        self.write(CLOSE, room_id, conn_id, b"")
+
+    def close(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.file.close()
+
+
+# The active recorder, None unless recording was started
+RECORDER: Optional[Recorder] = None
+
+
+def start_recording(path: str, config: Dict[str, Any]) -> Recorder:
+    global RECORDER
+    RECORDER = Recorder(path, config)
+    LOGGER.info("[Recorder] Recording traffic to %s.", path)
+    return RECORDER
+
+
+def stop_recording() -> None:
+    global RECORDER
+    if RECORDER is not None:
+        RECORDER.close()
+        RECORDER = None
+
+
+def read_records(file: BinaryIO) -> Iterator[Record]:
+    """Yield the records of the recording at the file position, CONFIG first.
+
+    Stops at the end of the file, at a truncated record, or right before the
+    next recording appended to the same file. A truncated record is left
+    unread, the next recording may start inside what it claims as payload.
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a session log.")
+    while True:
+        start: int = file.tell()
+        header: bytes = file.read(RECORD.size)
+        if header.startswith(MAGIC):
+            file.seek(start)
+            return
+        if len(header) < RECORD.size:
+            file.seek(start)
+            return
+        kind, elapsed, room_id, conn_id, length = RECORD.unpack(header)
+        payload: bytes = file.read(length)
+        if kind >= len(KIND_NAMES) or len(payload) < length:
+            file.seek(start)
+            return
+        yield Record(kind, elapsed / 1e6, room_id, conn_id, payload)
+
+
+def read_recordings(path: str) -> List[List[Record]]:
+    """Every recording appended to the session log at path, oldest first."""
+    recordings: List[List[Record]] = []
+    with open(path, "rb") as file:
+        while file.peek(1):
+            recordings.append(list(read_records(file)))
+            if file.peek(len(MAGIC))[: len(MAGIC)] != MAGIC:
+                # The recording was cut short by a crash, skip to the next one
+                rest: bytes = file.read()
+                start: int = rest.find(MAGIC)
+                if start < 0:
+                    break
+                file.seek(start - len(rest), io.SEEK_CUR)
+    return recordings
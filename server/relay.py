@@ -0,0 +1,224 @@
+"""Edge relay in front of the game server.
+
+Terminates client connections and carries their bytes, tagged by session id,
+over a few upstream links to the server (see mux.py), so the server accepts
+and buffers a handful of sockets instead of one per client. The relay does
+not parse messages, the server still frames and decodes each session. A
+broadcast crosses each link once with the list of its recipients and is
+copied to their sockets here.
+
+    python server/server.py --relay-port 54322
+    python server/relay.py --port 54320 --upstream localhost:54322
+
+Clients connect to the relay exactly as they would to the server.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import log
+import loops
+import mux
+from connection import MAX_PENDING_BYTES, READ_LIMIT, Connection
+from protocol import TEXT
+from relay_link import MAX_LINK_PENDING_BYTES
+
+LOGGER = logging.getLogger(__name__)
+
+# Upstream links opened to the server
+LINKS = 2
+# Wait between attempts to reopen a lost link (seconds)
+RECONNECT_DELAY = 1.0
+
+
+class ClientSession:
+    __slots__ = ("writer", "link")
+
+    def __init__(self, writer: asyncio.StreamWriter, link: Connection):
+        self.writer: asyncio.StreamWriter = writer
+        self.link: Connection = link
+
+
+class Relay:
+    def __init__(
+        self,
+        upstream: Tuple[str, int],
+        link_count: int = LINKS,
+        max_pending_bytes: int = MAX_PENDING_BYTES,
+    ):
+        self.upstream: Tuple[str, int] = upstream
+        self.max_pending_bytes: int = max_pending_bytes
+        # None while a link is down
+        self.links: List[Optional[Connection]] = [None] * link_count
+        self.sessions: Dict[int, ClientSession] = {}
+        self.session_ids: Iterator[int] = itertools.count(1)
+        self.link_tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self.link_tasks = [
+            asyncio.create_task(self.keep_link(index))
+            for index in range(len(self.links))
+        ]
+
+    def pick_link(self, session_id: int) -> Optional[Connection]:
+        links: List[Connection] = [link for link in self.links if link is not None]
+        return links[session_id % len(links)] if links else None
+
+    async def keep_link(self, index: int) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(*self.upstream)
+            except OSError as e:
+                LOGGER.warning("[Relay] Cannot reach %s: %s.", self.upstream, e)
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            link: Connection = Connection(writer, MAX_LINK_PENDING_BYTES)
+            self.links[index] = link
+            LOGGER.info("[Relay] Opened link %d to %s.", index, self.upstream)
+            try:
+                await self.read_upstream(reader, link)
+            except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+                LOGGER.warning("[Relay] Lost link %d: %s.", index, e)
+            finally:
+                self.links[index] = None
+                # The server ended these conversations with the link
+                for session_id, session in list(self.sessions.items()):
+                    if session.link is link:
+                        del self.sessions[session_id]
+                        session.writer.transport.abort()
+                await link.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def read_upstream(
+        self, reader: asyncio.StreamReader, link: Connection
+    ) -> None:
+        while True:
+            frame: Optional[mux.Frame] = await mux.read_frame(reader)
+            if frame is None:
+                return
+            if frame.kind == mux.DATA:
+                session: Optional[ClientSession] = self.sessions.get(frame.session_id)
+                if session is not None:
+                    self.write(session, frame.payload)
+            elif frame.kind == mux.BROADCAST:
+                session_ids, data = mux.unpack_broadcast(frame.payload)
+                for session_id in session_ids:
+                    session = self.sessions.get(session_id)
+                    if session is not None:
+                        self.write(session, data)
+            elif frame.kind == mux.CLOSE:
+                session = self.sessions.pop(frame.session_id, None)
+                if session is not None:
+                    # Closing still flushes what was written before
+                    session.writer.close()
+
+    def write(self, session: ClientSession, data: bytes) -> None:
+        transport: asyncio.WriteTransport = session.writer.transport
+        if transport.get_write_buffer_size() + len(data) > self.max_pending_bytes:
+            LOGGER.info(
+                "[Relay] Evicting slow client %s.",
+                session.writer.get_extra_info("peername"),
+            )
+            # The client's reader sees the abort and tells the server
+            transport.abort()
+            return
+        session.writer.write(data)
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        session_id: int = next(self.session_ids)
+        link: Optional[Connection] = self.pick_link(session_id)
+        if link is None:
+            writer.write(TEXT.encode("DISCONNECTED", ["Server is unavailable."]))
+            writer.close()
+            return
+        session: ClientSession = ClientSession(writer, link)
+        self.sessions[session_id] = session
+        host, port = writer.get_extra_info("peername")[:2]
+        link.send(mux.pack(mux.OPEN, session_id, f"{host}:{port}".encode()))
+        try:
+            # Bytes go up as they come, the server splits them into messages
+            while session_id in self.sessions:
+                data: bytes = await reader.read(READ_LIMIT)
+                if not data:
+                    break
+                link.send(mux.pack(mux.DATA, session_id, data))
+        except ConnectionError:
+            pass
+        finally:
+            if self.sessions.pop(session_id, None) is not None:
+                link.send(mux.pack(mux.CLOSE, session_id))
+                writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Edge relay for Racing Arena")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=54320,
+        help="Accept clients on this port. Default to 54320.",
+    )
+    parser.add_argument(
+        "--upstream",
+        default="localhost:54322",
+        metavar="HOST:PORT",
+        help="The server's --relay-port address. Default to localhost:54322.",
+    )
+    parser.add_argument(
+        "--links",
+        type=int,
+        default=LINKS,
+        help=f"Open this many links to the server. Default to {LINKS}.",
+    )
+    parser.add_argument(
+        "--max-pending-bytes",
+        type=int,
+        default=MAX_PENDING_BYTES,
+        help=f"Evict a client whose unsent data exceeds this many bytes. Default to {MAX_PENDING_BYTES}.",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=loops.LOOP_CHOICES,
+        default="asyncio",
+        help="Event loop implementation. Default to asyncio.",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        type=str.upper,
+        help="Set the logging level. Default to INFO.",
+    )
+    args = parser.parse_args()
+    if args.links < 1:
+        parser.error("--links must be at least 1")
+    upstream_host, _, upstream_port = args.upstream.rpartition(":")
+    if not upstream_port.isdigit():
+        parser.error(f"Invalid --upstream address: {args.upstream}")
+
+    async def serve() -> None:
+        relay: Relay = Relay(
+            (upstream_host or "localhost", int(upstream_port)),
+            args.links,
+            args.max_pending_bytes,
+        )
+        relay.start()
+        server = await asyncio.start_server(
+            relay.handle_client, "localhost", args.port, limit=READ_LIMIT
+        )
+        print(f"Relay listening at {('localhost', args.port)}")
+        async with server:
+            await server.serve_forever()
+
+    log_listener: log.QueueListener = log.setup_logging(args.log_level)
+    loop: asyncio.AbstractEventLoop = loops.new_event_loop(args.loop)
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(serve())
+    finally:
+        loop.close()
+        log_listener.stop()
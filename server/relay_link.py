@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import mux
+from connection import Connection
+
+LOGGER = logging.getLogger(__name__)
+
+# Close a relay link once this many bytes are waiting to be sent on it. A
+# link carries many clients, so its budget is that of many connections.
+MAX_LINK_PENDING_BYTES = 64 * 1024 * 1024
+# Close a relayed session once this many bytes it sent are still unread.
+# Messages past the read limit are refused before that, this only stops a
+# flood, since there is no client transport to stop reading from.
+MAX_SESSION_BACKLOG = 64 * 1024
+
+ConnectionHandler = Callable[
+    [asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]
+]
+
+
+class SessionTransport:
+    """The transport calls Connection makes, for a client behind a relay."""
+
+    __slots__ = ("link", "session_id")
+
+    def __init__(self, link: "RelayLink", session_id: int):
+        self.link: RelayLink = link
+        self.session_id: int = session_id
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def set_write_buffer_limits(self, high: int, low: int) -> None:
+        pass
+
+    def abort(self) -> None:
+        self.link.close_session(self.session_id)
+
+
+class SessionWriter:
+    """Stands in for the StreamWriter of a client behind a relay.
+
+    Everything written becomes a DATA frame on the link, so the session is
+    served by the same handle_conversation as a directly connected client.
+    """
+
+    __slots__ = ("link", "session_id", "transport", "address")
+
+    def __init__(self, link: "RelayLink", session_id: int, address: Tuple[str, int]):
+        self.link: RelayLink = link
+        self.session_id: int = session_id
+        self.transport: SessionTransport = SessionTransport(link, session_id)
+        self.address: Tuple[str, int] = address
+
+    def get_extra_info(self, name: str, default: object = None) -> object:
+        return self.address if name == "peername" else default
+
+    def write(self, data: bytes) -> None:
+        self.link.send_data(self.session_id, data)
+
+    def writelines(self, chunks: List[bytes]) -> None:
+        self.write(b"".join(chunks))
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.link.close_session(self.session_id)
+
+
+class RelayedConnection(Connection):
+    """A client behind a relay.
+
+    Sends go straight onto the link in order, the link's own queue batches
+    and paces them. Broadcasts skip send() altogether, see
+    ClientManager.broadcast.
+    """
+
+    __slots__ = ("link", "session_id")
+
+    def __init__(self, writer: SessionWriter, *args, **kwargs):
+        super().__init__(writer, *args, **kwargs)
+        self.link: RelayLink = writer.link
+        self.session_id: int = writer.session_id
+
+    def send(self, data: bytes) -> bool:
+        if self.is_closed or self.is_closing:
+            return False
+        return self.link.send_data(self.session_id, data)
+
+
+class RelayLink:
+    """One upstream connection from an edge relay, carrying many clients.
+
+    Each OPEN starts a conversation with a SessionWriter and a reader fed
+    from the session's DATA frames. A lost link ends every conversation on
+    it.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        read_limit: int,
+    ):
+        self.reader: asyncio.StreamReader = reader
+        self.upstream: Connection = Connection(writer, MAX_LINK_PENDING_BYTES)
+        self.read_limit: int = read_limit
+        # the reader of every open session
+        self.sessions: Dict[int, asyncio.StreamReader] = {}
+
+    def send_data(self, session_id: int, data: bytes) -> bool:
+        if session_id not in self.sessions:
+            return False
+        return self.upstream.send(mux.pack(mux.DATA, session_id, data))
+
+    def broadcast(self, session_ids: List[int], data: bytes) -> None:
+        self.upstream.send(mux.pack_broadcast(session_ids, data))
+
+    def close_session(self, session_id: int) -> None:
+        reader: Optional[asyncio.StreamReader] = self.sessions.pop(session_id, None)
+        if reader is not None:
+            reader.feed_eof()
+            self.upstream.send(mux.pack(mux.CLOSE, session_id))
+
+    async def run(self, handle_conversation: ConnectionHandler) -> None:
+        address: Tuple[str, int] = self.upstream.address
+        LOGGER.info("[Relay] Accepted relay link from %s.", address)
+        conversations: Dict[int, asyncio.Task] = {}
+        try:
+            while True:
+                frame: Optional[mux.Frame] = await mux.read_frame(self.reader)
+                if frame is None:
+                    break
+                if frame.kind == mux.OPEN:
+                    host, _, port = frame.payload.decode().rpartition(":")
+                    reader = asyncio.StreamReader(self.read_limit)
+                    self.sessions[frame.session_id] = reader
+                    writer = SessionWriter(self, frame.session_id, (host, int(port)))
+                    task: asyncio.Task = asyncio.create_task(
+                        handle_conversation(reader, writer)
+                    )
+                    conversations[frame.session_id] = task
+                    task.add_done_callback(
+                        lambda _, session_id=frame.session_id: conversations.pop(
+                            session_id, None
+                        )
+                    )
+                elif frame.kind == mux.DATA:
+                    session: Optional[asyncio.StreamReader] = self.sessions.get(
+                        frame.session_id
+                    )
+                    if session is not None:
+                        session.feed_data(frame.payload)
+                        if len(session._buffer) > MAX_SESSION_BACKLOG:
+                            LOGGER.info(
+                                "[Relay] Closing session %d: unread backlog too long.",
+                                frame.session_id,
+                            )
+                            self.close_session(frame.session_id)
+                elif frame.kind == mux.CLOSE:
+                    session = self.sessions.pop(frame.session_id, None)
+                    if session is not None:
+                        session.feed_eof()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            LOGGER.info("[Relay] Lost relay link from %s: %s.", address, e)
+        finally:
+            LOGGER.info("[Relay] Closing relay link from %s.", address)
+            for session in self.sessions.values():
+                session.feed_eof()
+            self.sessions.clear()
+            if conversations:
+                await asyncio.gather(*conversations.values(), return_exceptions=True)
+            await self.upstream.close()
+
+
+def relay_link_handler(
+    handle_conversation: ConnectionHandler, read_limit: int
+) -> ConnectionHandler:
+    """A start_server callback serving relay links with handle_conversation."""
+
+    async def handle_link(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        await RelayLink(reader, writer, read_limit).run(handle_conversation)
+
+    return handle_link
@@ -0,0 +1,122 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from client_manager import ClientManager
+from connection import Connection
+from exceptions import RoomError
+from snapshots import RoomState
+from game import (
+    Game,
+    ANSWER_TIME_LIMIT,
+    PREPARE_TIME_LIMIT,
+    SCORES_KEYFRAME_INTERVAL,
+)
+
+
+class RoomManager:
+    def __init__(
+        self,
+        connections: Dict[asyncio.StreamWriter, Connection],
+        max_players: int,
+        race_length: int,
+        max_rooms: int,
+        answer_time_limit: int = ANSWER_TIME_LIMIT,
+        prepare_time_limit: int = PREPARE_TIME_LIMIT,
+        first_room_id: int = 1,
+        room_id_step: int = 1,
+        scores_keyframe_interval: int = SCORES_KEYFRAME_INTERVAL,
+        question_seed: Optional[int] = None,
+    ):
+        self.connections: Dict[asyncio.StreamWriter, Connection] = connections
+        self.max_players: int = max_players
+        self.race_length: int = race_length
+        self.max_rooms: int = max_rooms
+        self.answer_time_limit: int = answer_time_limit
+        self.prepare_time_limit: int = prepare_time_limit
+        self.scores_keyframe_interval: int = scores_keyframe_interval
+        self.rooms: Dict[int, Game] = {}
+        # each room is seeded with question_seed + its id, None for random
+        self.question_seed: Optional[int] = question_seed
+        # Workers hand out interleaved ids so a room id names its owner
+        self.next_room_id: int = first_room_id
+        self.room_id_step: int = room_id_step
+        # set once a successor numbers the new rooms, see upgrade.py
+        self.is_handed_over: bool = False
+
+    def create_room(
+        self, max_players: Optional[int] = None, race_length: Optional[int] = None
+    ) -> Game:
+        max_players = self.max_players if max_players is None else max_players
+        race_length = self.race_length if race_length is None else race_length
+        if not 1 <= max_players <= self.max_players:
+            raise RoomError(f"Max players must be between 1 and {self.max_players}.")
+        if race_length < 1:
+            raise RoomError("Race length must be positive.")
+
+        if self.is_handed_over:
+            raise RoomError("Server is restarting.")
+        self.prune_rooms()
+        if len(self.rooms) >= self.max_rooms:
+            raise RoomError("Too many rooms.")
+
+        room_id: int = self.next_room_id
+        self.next_room_id += self.room_id_step
+        game = Game(
+            room_id,
+            max_players,
+            race_length,
+            ClientManager(self.connections, room_id),
+            self.answer_time_limit,
+            self.prepare_time_limit,
+            self.scores_keyframe_interval,
+            None if self.question_seed is None else self.question_seed + room_id,
+        )
+        self.rooms[room_id] = game
+        return game
+
+    def restore_room(self, state: RoomState) -> Game:
+        """Bring back a room whose match was snapshotted, and resume the match."""
+        if state.room_id in self.rooms:
+            raise RoomError(f"Room {state.room_id} is already open.")
+        game = Game(
+            state.room_id,
+            state.max_players,
+            state.race_length,
+            ClientManager(self.connections, state.room_id),
+            state.answer_time_limit,
+            state.prepare_time_limit,
+            state.scores_keyframe_interval,
+            state.question_seed,
+        )
+        game.restore(state)
+        self.rooms[state.room_id] = game
+        # New rooms keep to the ids of this process, after the restored ones
+        self.next_room_id = max(self.next_room_id, state.room_id + self.room_id_step)
+        return game
+
+    def get_room(self, room_id: int) -> Game:
+        if room_id not in self.rooms:
+            raise RoomError("Room does not exist.")
+        return self.rooms[room_id]
+
+    def find_open_room(self) -> Game:
+        # Rooms are kept in creation order, so older lobbies fill up first
+        for game in self.rooms.values():
+            if game.is_open():
+                return game
+        return self.create_room()
+
+    def is_abandoned(self, game: Game) -> bool:
+        return not game.clients.members and not game.is_playing()
+
+    def close_room_if_abandoned(self, game: Game) -> None:
+        if self.is_abandoned(game):
+            self.rooms.pop(game.room_id, None)
+
+    def prune_rooms(self) -> None:
+        # Rooms whose last member left mid-match are only abandoned once it ends
+        for game in [game for game in self.rooms.values() if self.is_abandoned(game)]:
+            del self.rooms[game.room_id]
+
+    def pack_rooms_info(self) -> List[Tuple[int, int, int, bool]]:
+        return [game.pack_room_info() for game in self.rooms.values()]
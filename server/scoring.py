@@ -0,0 +1,137 @@
+"""Player scores of a room kept in parallel NumPy arrays.
+
+A room for at least MIN_PLAYERS players keeps every player's position, diff
+points, wrong answer streak and round answer in a ScoreBoard, so the work
+done for the whole room each round (clearing the last round, grading the
+players who did not answer, packing SCORES) runs as whole-array operations
+instead of a Python loop over the players. The results are the same as
+scoring player by player. Without NumPy every room scores player by player.
+"""
+import itertools
+from typing import Any, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional, rooms then score player by player
+    np = None
+
+# Smaller rooms score player by player, the arrays do not pay off
+MIN_PLAYERS = 1000
+# Slots allocated for a new board, the arrays double when they run out
+INITIAL_CAPACITY = 64
+
+# Every per-slot array and the value of a fresh slot in it
+_FIELDS: List[Tuple[str, str, Any]] = [
+    ("positions", "int64", 1),
+    ("diff_points", "int64", 0),
+    ("wa_streaks", "int64", 0),
+    ("answers", "object", None),
+    # NaN when the player did not answer
+    ("answer_times", "float64", float("nan")),
+    ("present", "bool", False),
+    ("disqualified", "bool", False),
+    # (diff points, position) as last sent in SCORES
+    ("sent_diff_points", "int64", 0),
+    ("sent_positions", "int64", 1),
+]
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+class ScoreBoard:
+    """Per-player arrays indexed by slot.
+
+    A player gets the next slot when registering and keeps it until the
+    match ends; slots are never reused, so slot order is registration order.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.size: int = 0
+        self.nicknames: List[str] = []
+        for name, dtype, fill in _FIELDS:
+            setattr(self, name, np.full(capacity, fill, dtype))
+
+    def grow(self) -> None:
+        capacity: int = 2 * len(self.positions)
+        for name, dtype, fill in _FIELDS:
+            array = np.full(capacity, fill, dtype)
+            array[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, array)
+
+    def add(self, nickname: str) -> int:
+        if self.size == len(self.positions):
+            self.grow()
+        slot: int = self.size
+        self.size += 1
+        self.nicknames.append(nickname)
+        self.present[slot] = True
+        return slot
+
+    def remove(self, slot: int) -> None:
+        self.present[slot] = False
+
+    def qualified(self) -> "np.ndarray":
+        return self.present[: self.size] & ~self.disqualified[: self.size]
+
+    def start_round(self) -> None:
+        # Player.reset_new_round for every qualified player
+        qualified = self.qualified()
+        self.diff_points[: self.size][qualified] = 0
+        self.answers[: self.size][qualified] = None
+        self.answer_times[: self.size][qualified] = np.nan
+
+    def grade_incorrect(
+        self, slots: List[int], race_length: int, max_wa_streak: int
+    ) -> Tuple[List[int], List[int]]:
+        """Move the players back one step and extend their wrong answer streak.
+
+        Returns, in the given order, the slots that are now short of the
+        finish line and the slots whose streak reached max_wa_streak.
+        """
+        indexes = np.array(slots, np.intp)
+        old_positions = self.positions[indexes]
+        positions = np.maximum(old_positions - 1, 1)
+        self.positions[indexes] = positions
+        self.diff_points[indexes] += positions - old_positions
+        streaks = self.wa_streaks[indexes] + 1
+        self.wa_streaks[indexes] = streaks
+        short = indexes[positions < race_length] if race_length > 0 else indexes[:0]
+        return short.tolist(), indexes[streaks >= max_wa_streak].tolist()
+
+    def pack_round_info(self) -> List[Tuple[str, int, int]]:
+        rows = zip(
+            self.nicknames,
+            self.diff_points[: self.size].tolist(),
+            self.positions[: self.size].tolist(),
+        )
+        present = self.present[: self.size]
+        if present.all():
+            return list(rows)
+        return list(itertools.compress(rows, present.tolist()))
+
+    def pack_round_delta(self) -> List[Tuple[str, int, int]]:
+        size: int = self.size
+        changed = np.flatnonzero(
+            self.present[:size]
+            & (
+                (self.diff_points[:size] != self.sent_diff_points[:size])
+                | (self.positions[:size] != self.sent_positions[:size])
+            )
+        )
+        diff_points = self.diff_points[changed]
+        positions = self.positions[changed]
+        self.sent_diff_points[changed] = diff_points
+        self.sent_positions[changed] = positions
+        return list(
+            zip(
+                [self.nicknames[slot] for slot in changed.tolist()],
+                diff_points.tolist(),
+                positions.tolist(),
+            )
+        )
+
+    def forget_sent_scores(self) -> None:
+        self.sent_diff_points[:] = 0
+        self.sent_positions[:] = 1
@@ -1,272 +1,587 @@
-import time
 import asyncio
-from enum import Enum
+import functools
 import logging
-from asyncio import StreamWriter, StreamReader
-from typing import Tuple, List, Dict, Optional
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Any, Awaitable, Callable, Tuple, List, Dict, Optional
 import argparse
 
-from exceptions import RegistrationError, WrongStateError
-from player_manager import Player, PlayerManager
-from question_manager import Question, QuestionManager
-
-ANSWER_TIME_LIMIT = 30
-PREPARE_TIME_LIMIT = 10
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(message)s",
-    datefmt="%m/%d/%Y %H:%M:%S",
+import admission
+import connection
+import heartbeat
+import log
+import loops
+import metrics
+import recorder
+import sessions
+import snapshots
+import upgrade
+from admission import TokenBucket
+from connection import Connection, unread_bytes
+from exceptions import RegistrationError, RoomError, WrongStateError
+from game import (
+    Game,
+    ANSWER_TIME_LIMIT,
+    PREPARE_TIME_LIMIT,
+    SCORES_KEYFRAME_INTERVAL,
 )
+from protocol import BINARY, SCHEMAS, TEXT, Codec, ProtocolError
+from relay_link import RelayedConnection, SessionWriter, relay_link_handler
+from room_manager import RoomManager
+from sessions import Session, token_room_id
+from workers import WorkerRouter, send_connection, start_workers
+
+MAX_ROOMS = 500
+MAX_PENDING_BYTES = connection.MAX_PENDING_BYTES
+MAX_SEND_LATENCY = connection.MAX_SEND_LATENCY
+READ_LIMIT = connection.READ_LIMIT
+WRITE_HIGH_WATER = connection.WRITE_HIGH_WATER
+WRITE_LOW_WATER = connection.WRITE_LOW_WATER
+MAX_CONNECTIONS = admission.MAX_CONNECTIONS
+COMMAND_RATE = admission.COMMAND_RATE
+COMMAND_BURST = admission.COMMAND_BURST
+IDLE_TIMEOUT = admission.IDLE_TIMEOUT
+RESUME_GRACE = sessions.RESUME_GRACE
+RESUME_HISTORY = sessions.RESUME_HISTORY
+HEARTBEAT_INTERVAL = heartbeat.INTERVAL
+HEARTBEAT_TIMEOUT = heartbeat.TIMEOUT
+
 LOGGER = logging.getLogger(__name__)
+MESSAGES_LOGGER = log.get_logger("messages")
+ANSWERS_LOGGER = log.get_logger("answers")
+CONNECTIONS_LOGGER = log.get_logger("connections")
+
+# Optional protocol features a client can ask for with HELLO
+SUPPORTED_FEATURES = ["binary", "delta", "resume", "heartbeat"]
+# Reply used when a request's arguments cannot be parsed
+FAILURE_COMMANDS: Dict[str, str] = {
+    "REGISTER": "REGISTRATION_FAILURE",
+    "READY": "READY_FAILURE",
+    "UNREADY": "UNREADY_FAILURE",
+    "ANSWER": "ANSWER_FAILURE",
+    "ROOM_LIST": "ROOM_FAILURE",
+    "ROOM_CREATE": "ROOM_FAILURE",
+    "ROOM_JOIN": "ROOM_FAILURE",
+    "SPECTATE": "ROOM_FAILURE",
+    "SCORES_KEYFRAME": "SCORES_FAILURE",
+    "RESUME": "RESUME_FAILURE",
+}
+
+
+class Server:
+    def __init__(
+        self,
+        max_players: int,
+        race_length: int,
+        max_rooms: int,
+        answer_time_limit: int = ANSWER_TIME_LIMIT,
+        prepare_time_limit: int = PREPARE_TIME_LIMIT,
+        router: Optional[WorkerRouter] = None,
+        scores_keyframe_interval: int = SCORES_KEYFRAME_INTERVAL,
+        question_seed: Optional[int] = None,
+    ):
+        # set when running as one of several worker processes
+        self.router: Optional[WorkerRouter] = router
+        # every open socket, whether or not it joined a room
+        self.connections: Dict[asyncio.StreamWriter, Connection] = {}
+        # the room each socket joined
+        self.rooms: Dict[asyncio.StreamWriter, Game] = {}
+        # what each socket sent that was not read yet travels with it on upgrade
+        self.readers: Dict[asyncio.StreamWriter, asyncio.StreamReader] = {}
+        # set while draining for the server process taking over
+        self.successor: Optional[socket.socket] = None
+        self.room_manager: RoomManager = RoomManager(
+            self.connections,
+            max_players,
+            race_length,
+            max_rooms,
+            answer_time_limit,
+            prepare_time_limit,
+            router.first_room_id() if router else 1,
+            router.room_id_step() if router else 1,
+            scores_keyframe_interval,
+            question_seed,
+        )
+        metrics.CONNECTIONS.set_function(lambda: len(self.connections))
+        metrics.ROOMS.set_function(lambda: len(self.room_manager.rooms))
+        metrics.PLAYERS.set_function(
+            lambda: sum(
+                len(game.player_manager.players)
+                for game in self.room_manager.rooms.values()
+            )
+        )
 
+    def send(self, writer: asyncio.StreamWriter, command: str, *args: Any) -> None:
+        conn: Optional[Connection] = self.connections.get(writer)
+        if conn:
+            conn.send_message(command, args)
 
-class GameState(Enum):
-    # LOBBY: accept REGISTER, READY, UNREADY
-    LOBBY = 1
-    # PROCESSING: will not accept any command
-    PROCESSING = 2
-    # WAITING_FOR_ANSWERS: accept ANSWER
-    WAITING_FOR_ANSWERS = 3
-
-
-class Game:
-    def __init__(self, max_players: int, race_length: int):
-        self.race_length: int = race_length
-        self.max_players: int = max_players
-        self.reset_game()
-
-    def reset_game(self) -> None:
-        self.player_manager: PlayerManager = PlayerManager(self.max_players)
-        self.question_manager: QuestionManager = QuestionManager()
-        self.state: GameState = GameState.LOBBY
-
-    def handle_registration(self, nickname: str) -> Player:
-        if self.state != GameState.LOBBY:
-            raise WrongStateError("Cannot register. Game has already started.")
-        return self.player_manager.register_player(nickname)
-
-    async def handle_ready(self, nickname: str) -> None:
-        if self.state != GameState.LOBBY:
-            raise WrongStateError("Cannot ready up. Game has already started.")
-
-        self.player_manager.players[nickname].ready()
-        if self.player_manager.can_start_game():
-            # Start the game
-            self.state = GameState.PROCESSING
-            await client.broadcast(
-                f"GAME_STARTING;{self.race_length};{ANSWER_TIME_LIMIT};{PREPARE_TIME_LIMIT}"
-            )
-            asyncio.create_task(game.game_loop())
+    def is_registered(self, writer: asyncio.StreamWriter) -> bool:
+        game: Optional[Game] = self.rooms.get(writer)
+        return game is not None and writer in game.clients.clients
 
-    def handle_unready(self, nickname: str) -> None:
-        if self.state != GameState.LOBBY:
-            raise WrongStateError("Cannot unready. Game has already started.")
+    def disconnect(
+        self, writer: asyncio.StreamWriter, reason: str, message: str
+    ) -> None:
+        # The caller stops reading, which closes the connection after this
+        metrics.REJECTIONS.inc(label=reason)
+        CONNECTIONS_LOGGER.info(
+            "[Client Thread] Disconnecting %s: %s",
+            writer.get_extra_info("peername"),
+            message,
+        )
+        self.send(writer, "DISCONNECTED", message)
+
+    def refuse_request(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        metrics.REJECTIONS.inc(label="rate_limit")
+        command: Optional[str]
+        try:
+            command = self.connections[writer].codec.decode(data)[0]
+        except ProtocolError as e:
+            command = e.command
+        if command in FAILURE_COMMANDS:
+            self.send(writer, FAILURE_COMMANDS[command], "Too many requests.")
+
+    async def read_request(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        idle_since: float,
+    ) -> bytes:
+        read: Awaitable[bytes] = self.connections[writer].codec.read_frame(
+            reader, READ_LIMIT
+        )
+        # Only clients that have not registered yet can be idle; spectators
+        # have nothing to send
+        if (
+            IDLE_TIMEOUT > 0
+            and not self.is_registered(writer)
+            and not self.is_spectating(writer)
+        ):
+            idle: float = time.monotonic() - idle_since
+            return await asyncio.wait_for(read, max(IDLE_TIMEOUT - idle, 0))
+        return await read
+
+    def is_spectating(self, writer: asyncio.StreamWriter) -> bool:
+        game: Optional[Game] = self.rooms.get(writer)
+        return game is not None and writer in game.clients.spectators
+
+    def get_player(self, writer: asyncio.StreamWriter) -> Tuple[Game, str]:
+        game: Optional[Game] = self.rooms.get(writer)
+        if game is None or writer not in game.clients.clients:
+            raise WrongStateError("You have not registered.")
+        return game, game.clients.clients[writer]
+
+    def check_can_leave_room(self, writer: asyncio.StreamWriter) -> None:
+        game: Optional[Game] = self.rooms.get(writer)
+        if game and writer in game.clients.clients:
+            raise RoomError("Cannot leave a room after registering.")
+
+    def join_room(self, writer: asyncio.StreamWriter, game: Game) -> None:
+        current: Optional[Game] = self.rooms.get(writer)
+        if current is game:
+            return
+        if current is not None:
+            self.check_can_leave_room(writer)
+            self.leave_room(writer)
+        game.clients.members.add(writer)
+        self.rooms[writer] = game
+        self.connections[writer].room_id = game.room_id
+
+    def leave_room(self, writer: asyncio.StreamWriter) -> None:
+        game: Optional[Game] = self.rooms.pop(writer, None)
+        if game is None:
+            return
+        game.clients.members.discard(writer)
+        game.clients.remove_spectator(writer)
+        conn: Connection = self.connections[writer]
+        conn.room_id = 0
+        if conn.session is not None and game.is_playing():
+            # Lost mid-match, the seat is held for a RESUME
+            game.clients.suspend(
+                conn.session, RESUME_GRACE, functools.partial(self.expire_session, game)
+            )
+        else:
+            if conn.session is not None:
+                game.clients.end_session(conn.session)
+            nickname: Optional[str] = game.clients.remove_client(writer)
+            if nickname is not None:
+                game.handle_disconnection(nickname)
+        self.room_manager.close_room_if_abandoned(game)
+
+    def expire_session(self, game: Game, session: Session) -> None:
+        game.clients.end_session(session)
+        nickname: Optional[str] = game.clients.remove_client(session.writer)
+        if nickname is not None:
+            LOGGER.info("[Room %d] %s did not resume in time.", game.room_id, nickname)
+            game.handle_disconnection(nickname)
+        self.room_manager.close_room_if_abandoned(game)
+
+    def resume(self, writer: asyncio.StreamWriter, token: str, received: int) -> Game:
+        """Seat a player again after their socket dropped, see sessions.py."""
+        room_id: Optional[int] = token_room_id(token)
+        game: Optional[Game] = (
+            self.room_manager.rooms.get(room_id) if room_id is not None else None
+        )
+        session: Optional[Session] = game.clients.sessions.get(token) if game else None
+        if session is None:
+            raise RegistrationError("Unknown or expired session.")
+        old_conn: Optional[Connection] = self.connections.get(session.writer)
+        if old_conn is not None:
+            # The old socket has not noticed it is gone yet; it is closed
+            # without giving the seat up
+            session.detach()
+            old_conn.writer.transport.abort()
+        self.join_room(writer, game)
+        conn: Connection = self.connections[writer]
+        conn.features.update(session.conn.features)
+        missed: Optional[List[Tuple[str, Tuple[Any, ...]]]] = session.missed(received)
+        conn.cork()
+        self.send(writer, "RESUMED", game.room_id, session.nickname)
+        if missed is not None:
+            for command, args in missed:
+                self.send(writer, command, *args)
+            game.clients.resume(session, writer, conn)
+        else:
+            # Too far behind for a replay, counting restarts from the client's
+            # number with the state of the match
+            session.sent = received
+            session.history.clear()
+            game.clients.resume(session, writer, conn)
+            for snapshot_command, snapshot_args in game.pack_snapshot():
+                self.send(writer, snapshot_command, *snapshot_args)
+        # Everything goes out in one write
+        conn.uncork()
+        return game
+
+    async def hand_off(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        data: bytes,
+        worker_id: int,
+    ) -> None:
+        self.leave_room(writer)
+        conn: Connection = self.connections.pop(writer)
+        # Let replies already queued reach the client before it moves
+        await conn.detach()
+        # The triggering frame goes along so the owner handles it itself
+        pending: bytes = data + unread_bytes(reader)
+        try:
+            self.router.send_connection(worker_id, writer, pending, conn.codec)
+        except (OSError, ValueError) as e:
+            LOGGER.info("[Client Thread] Could not hand off %s: %s.", conn.address, e)
+            writer.close()
 
-        self.player_manager.players[nickname].unready()
+    async def pass_on_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, data: bytes
+    ) -> None:
+        self.leave_room(writer)
+        conn: Connection = self.connections.pop(writer)
+        await conn.detach()
+        # The successor handles the request, from a fresh start
+        pending: bytes = data + unread_bytes(reader)
+        try:
+            send_connection(self.successor, writer, pending, conn.codec)
+        except (OSError, ValueError) as e:
+            LOGGER.info("[Upgrade] Could not pass on %s: %s.", conn.address, e)
+            writer.close()
 
-    def handle_answer(self, nickname: str, answer: int) -> None:
-        if self.state != GameState.WAITING_FOR_ANSWERS:
-            raise WrongStateError("Not in answering phase.")
-        LOGGER.info(f"[Game Thread] {nickname} answered: {answer}.")
+    def is_pinned(self, writer: asyncio.StreamWriter) -> bool:
+        """Whether the socket is in a room that has players, lobby or match."""
+        game: Optional[Game] = self.rooms.get(writer)
+        return game is not None and bool(game.clients.clients)
+
+    def pass_on(self, writer: asyncio.StreamWriter, successor: socket.socket) -> bool:
+        """Move an idle socket to the server taking over, if it can go now."""
+        conn: Connection = self.connections[writer]
+        # A relayed client has no socket of its own, a busy one would lose
+        # what it has not been sent yet
+        if (
+            isinstance(conn, RelayedConnection)
+            or conn.writer_task is not None
+            or conn.pending
+            or writer.transport.get_write_buffer_size()
+        ):
+            return False
+        pending: bytes = unread_bytes(self.readers[writer])
+        try:
+            send_connection(successor, writer, pending, conn.codec)
+        except (OSError, ValueError) as e:
+            LOGGER.info("[Upgrade] Could not pass on %s: %s.", conn.address, e)
+            return False
+        # Nothing awaits between the checks and here, so no request was missed
+        self.leave_room(writer)
+        self.connections.pop(writer)
+        return True
+
+    async def drain(self, successor: socket.socket, timeout: float) -> None:
+        """Pass every connection on to the successor as soon as it may go.
+
+        Whoever is in a room with players stays until its match ends or they
+        leave, since the room only exists here. After timeout seconds (0 for
+        no limit) the rest are disconnected; their matches stay in the
+        snapshot, if any, for the successor to resume.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        deadline: float = loop.time() + timeout
+        # Rooms are only opened by the successor now, it took over our ids
+        self.room_manager.is_handed_over = True
+        # Requests from the others go along with them, see handle_conversation
+        self.successor = successor
+        while True:
+            for writer in list(self.connections):
+                if not self.is_pinned(writer):
+                    self.pass_on(writer, successor)
+            if not any(map(self.is_pinned, self.connections)):
+                break
+            if timeout > 0 and loop.time() >= deadline:
+                break
+            await asyncio.sleep(upgrade.DRAIN_INTERVAL)
+        LOGGER.info(
+            "[Upgrade] Drained, disconnecting %d clients.", len(self.connections)
+        )
+        for writer in list(self.connections):
+            # Left in their rooms, so nothing is closed in the snapshot
+            conn: Connection = self.connections.pop(writer)
+            conn.send_message("DISCONNECTED", ["Server is restarting."])
+            await conn.close()
 
-        player: Player = self.player_manager.players[nickname]
-        player.answer = answer
-        player.answer_time = time.time()
+    async def handle_conversation(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        codec: Codec = TEXT,
+    ) -> None:
+        if MAX_CONNECTIONS and len(self.connections) >= MAX_CONNECTIONS:
+            metrics.REJECTIONS.inc(label="max_connections")
+            CONNECTIONS_LOGGER.info(
+                "[Client Thread] Refused connection from %s: server is full.",
+                writer.get_extra_info("peername"),
+            )
+            writer.write(codec.encode("DISCONNECTED", ["Server is full."]))
+            writer.close()
+            return
 
-    async def handle_disconnection(self, nickname: str) -> None:
-        if self.state == GameState.LOBBY:
-            self.player_manager.remove_player(nickname)
-        else:
-            player: Player = self.player_manager.players[nickname]
-            player.disqualify()
-        await client.broadcast(f"PLAYER_LEFT;{nickname}", [nickname])
-
-    def is_over(self) -> Tuple[bool, Optional[Player]]:
-        is_over: bool = False
-        qualified_players: List[Player] = self.player_manager.get_qualified_players()
-        if len(qualified_players) == 0:
-            is_over = True
-        else:
-            for player in qualified_players:
-                if player.position >= self.race_length:
-                    is_over = True
+        # Clients behind an edge relay write through the relay's link
+        connection_class: type = (
+            RelayedConnection if isinstance(writer, SessionWriter) else Connection
+        )
+        conn: Connection = connection_class(
+            writer,
+            MAX_PENDING_BYTES,
+            MAX_SEND_LATENCY,
+            codec,
+            WRITE_HIGH_WATER,
+            WRITE_LOW_WATER,
+        )
+        self.connections[writer] = conn
+        self.readers[writer] = reader
+        if recorder.RECORDER is not None:
+            recorder.RECORDER.open(conn.conn_id, codec.codec_id)
+        try:
+            address: Tuple[str, int] = writer.get_extra_info("peername")
+            CONNECTIONS_LOGGER.info("[Client Thread] Accepted connection from %s.", address)
+            bucket: Optional[TokenBucket] = (
+                TokenBucket(COMMAND_RATE, COMMAND_BURST) if COMMAND_RATE > 0 else None
+            )
+            # PING and PONG do not hold off the idle timeout
+            idle_since: float = time.monotonic()
+            while True:
+                try:
+                    data: bytes = await self.read_request(reader, writer, idle_since)
+                except ProtocolError:
+                    self.disconnect(writer, "message_too_long", "Message is too long.")
                     break
-
-        if is_over:
-            winner: Optional[Player] = None
-            for player in qualified_players:
-                if winner is None:
-                    winner = player
-                elif player.position > winner.position:
-                    winner = player
-                elif (
-                    player.position == winner.position
-                    and player.answer_time < winner.answer_time
+                except asyncio.TimeoutError:
+                    self.disconnect(writer, "idle_timeout", "Idle for too long.")
+                    break
+                if not data:
+                    break
+                conn.last_heard = time.monotonic()
+                if (
+                    self.successor is not None
+                    and not self.is_pinned(writer)
+                    and not isinstance(conn, RelayedConnection)
                 ):
-                    winner = player
-            return is_over, winner
+                    # Draining for an upgrade, even a finished match's players
+                    # start their next one on the new server
+                    await self.pass_on_request(reader, writer, data)
+                    break
+                metrics.BYTES_RECEIVED.inc(len(data))
+                if recorder.RECORDER is not None:
+                    recorder.RECORDER.inbound(conn.conn_id, conn.room_id, data)
+                if bucket is not None and not bucket.take():
+                    self.refuse_request(writer, data)
+                    continue
+                command: str
+                args: List[Any]
+                try:
+                    command, args = conn.codec.decode(data)
+                except ProtocolError as e:
+                    if e.command in FAILURE_COMMANDS:
+                        self.send(
+                            writer, FAILURE_COMMANDS[e.command], "Invalid arguments."
+                        )
+                    continue
 
-        return is_over, None
+                # Unknown commands share one label to bound the series count
+                metrics.MESSAGES_RECEIVED.inc(
+                    label=command if command in SCHEMAS else "UNKNOWN"
+                )
+                if command in heartbeat.COMMANDS:
+                    heartbeat.answer(conn, command, args)
+                    continue
+                idle_since = conn.last_heard
+                MESSAGES_LOGGER.info(
+                    "[Client Thread] Received message from %s: %s %s",
+                    address,
+                    command,
+                    args,
+                )
 
-    async def game_loop(self):
-        round_index: int = 0
-        while self.state != GameState.LOBBY:
-            round_index += 1
-            LOGGER.info(f"[Game Thread] Starting round {round_index}.")
+                if command == "HELLO":
+                    if conn.codec is not TEXT:
+                        continue
 
-            # Generate a new question
-            for player in self.player_manager.get_qualified_players():
-                player.reset_new_round()
+                    # Reply in text, then switch to whatever was agreed on
+                    features: List[str] = [
+                        feature.strip().lower()
+                        for feature in args
+                        if feature.strip().lower() in SUPPORTED_FEATURES
+                    ]
+                    self.send(writer, "HELLO", *features)
+                    conn.features.update(features)
+                    if "binary" in features:
+                        conn.codec = BINARY
+
+                elif command == "ROOM_LIST":
+                    if len(args) != 0:
+                        self.send(writer, "ROOM_FAILURE", "Invalid arguments.")
+                        continue
 
-            self.state = GameState.PROCESSING
-            await asyncio.sleep(PREPARE_TIME_LIMIT)
+                    self.send(writer, "ROOM_LIST", *self.room_manager.pack_rooms_info())
 
-            question: Question = self.question_manager.generate_question()
-            LOGGER.info(
-                f"[Game Thread] Question #{round_index}: {question.first_number} {question.operator} {question.second_number} = {question.answer}."
-            )
+                elif command == "ROOM_CREATE":
+                    if len(args) not in (0, 2):
+                        self.send(writer, "ROOM_FAILURE", "Invalid arguments.")
+                        continue
 
-            # Send the question to all clients
-            await client.broadcast(f"QUESTION;{round_index};{question}")
-
-            self.state = GameState.WAITING_FOR_ANSWERS
-            LOGGER.info("[Game Thread] State changed: WAITING_FOR_ANSWERS.")
-            # Wait for the clients to answer
-            await asyncio.sleep(ANSWER_TIME_LIMIT)
-
-            self.state = GameState.PROCESSING
-            LOGGER.info("[Game Thread] State changed: PROCESSING.")
-            # Process the answers and update the scores
-            fastest_player: Optional[Player] = None
-            fastest_bonus: int = 0
-            for player in self.player_manager.players.values():
-                if not player.is_disqualified:
-                    nickname: str = player.nickname
-                    answer: Optional[int] = player.answer
-
-                    if self.question_manager.check_player_answer(question, answer):
-                        # Correct answer
-                        player.update_state(1)
-                        player.wa_streak = 0
-
-                        await client.write_to_player(
-                            nickname, f"ANSWER_CORRECT;{question.answer}"
-                        )
-                        if (
-                            fastest_player is None
-                            or player.answer_time < fastest_player.answer_time
-                        ):
-                            fastest_player = player
-                        LOGGER.info(
-                            f"[Game Thread] {nickname} answered correctly, position: {player.position}."
-                        )
-                    else:
-                        # Incorrect answer
-                        player.update_state(-1)
-                        player.wa_streak += 1
-
-                        fastest_bonus += 1
-                        await client.write_to_player(
-                            nickname, f"ANSWER_INCORRECT;{question.answer}"
-                        )
-                        LOGGER.info(
-                            f"[Game Thread] {nickname} answered incorrectly, position: {player.position}."
+                    try:
+                        max_players: Optional[int] = None
+                        race_length: Optional[int] = None
+                        if args:
+                            max_players, race_length = args
+
+                        # Handle command
+                        if writer in self.rooms:
+                            self.check_can_leave_room(writer)
+                        game: Game = self.room_manager.create_room(
+                            max_players, race_length
                         )
-                else:
-                    nickname: str = player.nickname
-                    await client.write_to_player(nickname, f"ANSWER;{question.answer}")
-
-            # Add bonus score for the fastest player
-            if fastest_player is not None:
-                fastest_player.update_state(fastest_bonus)
-                LOGGER.info(
-                    f"[Game Thread] Fastest player: {fastest_player.nickname}, bonus: {fastest_bonus}."
-                )
+                        self.join_room(writer, game)
 
-            # Disqualify players with consecutive wrong answers
-            disqualified_players: List[Player] = (
-                self.player_manager.disqualify_players()
-            )
-            if disqualified_players:
-                packed_disqualified_players = ";".join(
-                    player.nickname for player in disqualified_players
-                )
-                await client.broadcast(
-                    f"DISQUALIFICATION;{packed_disqualified_players}"
-                )
-                LOGGER.info(
-                    f"[Game Thread] Disqualified players: {packed_disqualified_players}."
-                )
+                        self.send(writer, "ROOM_CREATED", game.room_id)
+                        LOGGER.info("[Client Thread] Created room %d.", game.room_id)
 
-            # Send the updated scores to all clients
-            scores: str = self.player_manager.pack_players_round_info()
-            fastest_player_nickname = (
-                fastest_player.nickname if fastest_player else None
-            )
-            await client.broadcast(f"SCORES;{fastest_player_nickname or ''};{scores}")
-
-            # Check if the game is over
-            is_over: bool
-            winner: Optional[Player]
-            is_over, winner = self.is_over()
-            winner_nickname = winner.nickname if winner else None
-            if is_over:
-                await client.broadcast(f"GAME_OVER;{winner_nickname or ''}")
-                LOGGER.info(
-                    f"[Game Thread] Game over. Winner is {winner_nickname or ''}."
-                )
-                self.reset_game()
-                client.reset_clients()
+                    except RoomError as e:
+                        self.send(writer, "ROOM_FAILURE", str(e))
 
+                elif command == "ROOM_JOIN":
+                    if len(args) != 1:
+                        self.send(writer, "ROOM_FAILURE", "Invalid arguments.")
+                        continue
 
-class ClientManager:
-    def __init__(self):
-        self.clients: Dict[asyncio.StreamWriter, str] = {}
+                    try:
+                        room_id: int = args[0]
 
-    def reset_clients(self) -> None:
-        self.clients = {}
+                        # Handle command
+                        if self.router and not self.router.owns(room_id):
+                            self.check_can_leave_room(writer)
+                            await self.hand_off(
+                                reader, writer, data, self.router.owner(room_id)
+                            )
+                            return
+                        game: Game = self.room_manager.get_room(room_id)
+                        self.join_room(writer, game)
+
+                        self.send(writer, "ROOM_JOINED", game.room_id)
+                        LOGGER.info("[Client Thread] Joined room %d.", game.room_id)
+
+                    except RoomError as e:
+                        self.send(writer, "ROOM_FAILURE", str(e))
+
+                elif command == "SPECTATE":
+                    if len(args) != 1:
+                        self.send(writer, "ROOM_FAILURE", "Invalid arguments.")
+                        continue
 
-    async def broadcast(self, message: str, except_nicknames: List[str] = []) -> None:
-        byte_message: bytes = (message + "\n").encode()
-        for client in self.clients:
-            if self.clients[client] not in except_nicknames:
-                client.write(byte_message)
-                await client.drain()  # Ensure the message is sent before continuing
+                    try:
+                        room_id: int = args[0]
 
-    async def write_to_player(self, nickname: str, message: str) -> None:
-        if nickname not in game.player_manager.players:
-            return
-        player = game.player_manager.players.get(nickname)
-        if player and player.writer:
-            byte_message: bytes = (message + "\n").encode()
-            writer: asyncio.StreamWriter = player.writer
-            writer.write(byte_message)
-            await writer.drain()
+                        # Handle command
+                        if self.is_registered(writer):
+                            raise RoomError("Players cannot spectate.")
+                        if self.router and not self.router.owns(room_id):
+                            await self.hand_off(
+                                reader, writer, data, self.router.owner(room_id)
+                            )
+                            return
+                        game: Game = self.room_manager.get_room(room_id)
+                        self.join_room(writer, game)
+
+                        self.send(writer, "SPECTATING", game.room_id)
+                        for snapshot_command, snapshot_args in game.pack_snapshot():
+                            self.send(writer, snapshot_command, *snapshot_args)
+                        game.clients.add_spectator(writer)
+                        LOGGER.info(
+                            "[Client Thread] Spectating room %d.", game.room_id
+                        )
 
-    async def handle_conversation(
-        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
-    ) -> None:
-        try:
-            address: Tuple[str, int] = writer.get_extra_info("peername")
-            LOGGER.info(f"[Client Thread] Accepted connection from {address}.")
-            while True:
-                data: bytes = await reader.readline()
-                if not data:
-                    break
-                message: str = data.decode().strip()
-                command: str
-                args: List[str]
-                command, *args = message.split(";")
-                command = command.upper()
+                    except RoomError as e:
+                        self.send(writer, "ROOM_FAILURE", str(e))
 
-                LOGGER.info(
-                    f"[Client Thread] Received message from {address}: {message}"
-                )
+                elif command == "RESUME":
+                    if len(args) != 2:
+                        self.send(writer, "RESUME_FAILURE", "Invalid arguments.")
+                        continue
+
+                    try:
+                        token: str = args[0]
+                        received: int = args[1]
+
+                        # Handle command
+                        if self.is_registered(writer):
+                            raise RegistrationError("You have already registered.")
+                        room_id: Optional[int] = token_room_id(token)
+                        if (
+                            self.router
+                            and room_id is not None
+                            and not self.router.owns(room_id)
+                        ):
+                            self.check_can_leave_room(writer)
+                            await self.hand_off(
+                                reader, writer, data, self.router.owner(room_id)
+                            )
+                            return
+                        game = self.resume(writer, token, received)
+                        LOGGER.info(
+                            "[Client Thread] Resumed as %s in room %d.",
+                            game.clients.clients[writer],
+                            game.room_id,
+                        )
+
+                    except RegistrationError as e:
+                        self.send(writer, "RESUME_FAILURE", str(e))
+                    except RoomError as e:
+                        self.send(writer, "RESUME_FAILURE", str(e))
 
-                if command == "REGISTER":
+                elif command == "REGISTER":
                     if len(args) != 1:
-                        writer.write(b"REGISTRATION_FAILURE;Invalid arguments.\n")
+                        self.send(writer, "REGISTRATION_FAILURE", "Invalid arguments.")
                         continue
 
                     # Parse message data
@@ -274,93 +589,144 @@ class ClientManager:
 
                     # Handle command
                     try:
-                        if writer in self.clients:
+                        game: Optional[Game] = self.rooms.get(writer)
+                        if game and writer in game.clients.clients:
                             raise RegistrationError("You have already registered.")
-
-                        player: Player = game.handle_registration(nickname)
-                        player.writer = writer
-                        self.clients[writer] = nickname
-
-                        writer.write(
-                            f"REGISTRATION_SUCCESS;{game.player_manager.pack_players_lobby_info()}\n".encode()
+                        if game is None:
+                            # Clients that never picked a room get the first open one
+                            game = self.room_manager.find_open_room()
+                            self.join_room(writer, game)
+
+                        nickname = game.handle_registration(nickname).nickname
+                        game.clients.add_client(writer, nickname)
+                        # A spectator who registers watches as a player from now on
+                        game.clients.remove_spectator(writer)
+
+                        self.send(
+                            writer,
+                            "REGISTRATION_SUCCESS",
+                            *game.player_manager.pack_players_lobby_info(),
+                        )
+                        if "resume" in conn.features and RESUME_GRACE > 0:
+                            session: Session = game.clients.open_session(
+                                writer, RESUME_HISTORY
+                            )
+                            self.send(writer, "SESSION", session.token)
+                            session.attach(writer, conn)
+                        # A player back in a restored match catches up on it
+                        if game.is_playing():
+                            for snapshot_command, snapshot_args in game.pack_snapshot():
+                                self.send(writer, snapshot_command, *snapshot_args)
+                        game.clients.broadcast(
+                            "PLAYER_JOINED", nickname, except_nicknames=[nickname]
+                        )
+                        LOGGER.info(
+                            "[Client Thread] Registered as %s in room %d.",
+                            nickname,
+                            game.room_id,
                         )
-                        await client.broadcast(f"PLAYER_JOINED;{nickname}", [nickname])
-                        LOGGER.info(f"[Client Thread] Registered as {nickname}")
 
                     except RegistrationError as e:
-                        writer.write(f"REGISTRATION_FAILURE;{str(e)}\n".encode())
+                        self.send(writer, "REGISTRATION_FAILURE", str(e))
                     except WrongStateError as e:
-                        writer.write(f"REGISTRATION_FAILURE;{str(e)}\n".encode())
+                        self.send(writer, "REGISTRATION_FAILURE", str(e))
+                    except RoomError as e:
+                        self.send(writer, "REGISTRATION_FAILURE", str(e))
 
                 elif command == "READY":
                     if len(args) != 0:
-                        writer.write(b"READY_FAILURE;Invalid arguments.\n")
+                        self.send(writer, "READY_FAILURE", "Invalid arguments.")
                         continue
 
                     try:
                         # Handle command
-                        nickname: str = self.clients[writer]
-                        await game.handle_ready(nickname)
+                        game, nickname = self.get_player(writer)
+                        game.handle_ready(nickname)
 
-                        await client.broadcast(f"PLAYER_READY;{nickname}", [nickname])
-                        LOGGER.info(f"[Client Thread] {nickname} is ready.")
+                        game.clients.broadcast(
+                            "PLAYER_READY", nickname, except_nicknames=[nickname]
+                        )
+                        LOGGER.info("[Client Thread] %s is ready.", nickname)
 
                     except WrongStateError as e:
-                        writer.write(f"READY_FAILURE;{str(e)}\n".encode())
+                        self.send(writer, "READY_FAILURE", str(e))
 
                 elif command == "UNREADY":
                     if len(args) != 0:
-                        writer.write(b"UNREADY_FAILURE;Invalid arguments.\n")
+                        self.send(writer, "UNREADY_FAILURE", "Invalid arguments.")
                         continue
 
                     try:
                         # Handle command
-                        nickname: str = self.clients[writer]
+                        game, nickname = self.get_player(writer)
                         game.handle_unready(nickname)
 
-                        await client.broadcast(f"PLAYER_UNREADY;{nickname}", [nickname])
-                        LOGGER.info(f"[Client Thread] {nickname} is unready.")
+                        game.clients.broadcast(
+                            "PLAYER_UNREADY", nickname, except_nicknames=[nickname]
+                        )
+                        LOGGER.info("[Client Thread] %s is unready.", nickname)
 
                     except WrongStateError as e:
-                        writer.write(f"UNREADY_FAILURE;{str(e)}\n".encode())
+                        self.send(writer, "UNREADY_FAILURE", str(e))
 
                 elif command == "ANSWER":
                     if len(args) != 1:
-                        writer.write(b"ANSWER_FAILURE;Invalid arguments.\n")
+                        self.send(writer, "ANSWER_FAILURE", "Invalid arguments.")
                         continue
 
                     try:
-                        player_answer: int = int(args[0].strip())
+                        player_answer: int = args[0]
 
                         # Handle command
-                        nickname: str = self.clients[writer]
+                        game, nickname = self.get_player(writer)
                         game.handle_answer(nickname, player_answer)
-                        LOGGER.info(
-                            f"[Client Thread] {nickname} answered: {player_answer}."
+                        ANSWERS_LOGGER.info(
+                            "[Client Thread] %s answered: %d.", nickname, player_answer
                         )
 
                     except WrongStateError as e:
-                        writer.write(f"ANSWER_FAILURE;{str(e)}\n".encode())
+                        self.send(writer, "ANSWER_FAILURE", str(e))
+
+                elif command == "SCORES_KEYFRAME":
+                    if len(args) != 0:
+                        self.send(writer, "SCORES_FAILURE", "Invalid arguments.")
+                        continue
 
-                await writer.drain()
+                    try:
+                        # Handle command
+                        game, nickname = self.get_player(writer)
+                        self.send(
+                            writer,
+                            "SCORES",
+                            game.fastest_nickname,
+                            *game.player_manager.pack_players_round_info(),
+                        )
+
+                    except WrongStateError as e:
+                        self.send(writer, "SCORES_FAILURE", str(e))
         except ConnectionResetError as e:
-            LOGGER.info(f"[Client Thread] Connection reset by peer, address {address}.")
+            CONNECTIONS_LOGGER.info(
+                "[Client Thread] Connection reset by peer, address %s.", address
+            )
         except Exception as e:
             LOGGER.info(
-                f"[Client Thread] Exception occurred with peer connection, address {address}: {str(e)}."
+                "[Client Thread] Exception occurred with peer connection, address %s: %s.",
+                address,
+                e,
             )
         finally:
-            LOGGER.info(f"[Client Thread] Closing connection with {address}.")
-            if writer in self.clients:
-                nickname: str = self.clients[writer]
-                del self.clients[writer]
-            await game.handle_disconnection(nickname)
-
-            player = game.player_manager.players.get(nickname)
-            if player:
-                player.writer = None
+            self.readers.pop(writer, None)
+            if recorder.RECORDER is not None:
+                recorder.RECORDER.close_connection(conn.conn_id, conn.room_id)
+            # Handed off connections are no longer ours to close
+            if writer in self.connections:
+                CONNECTIONS_LOGGER.info(
+                    "[Client Thread] Closing connection with %s.", address
+                )
+                self.leave_room(writer)
 
-            writer.close()
+                conn: Connection = self.connections.pop(writer)
+                await conn.close()
 
 
 if __name__ == "__main__":
@@ -370,7 +736,7 @@ if __name__ == "__main__":
         "--players",
         type=int,
         default=10,
-        help="Set the maximum number of players Default to 10.",
+        help="Set the maximum number of players per room. Default to 10.",
     )
     parser.add_argument(
         "-r",
@@ -386,21 +752,408 @@ if __name__ == "__main__":
         default=ANSWER_TIME_LIMIT,
         help=f"Set the answer time limit. Default to {ANSWER_TIME_LIMIT} (seconds).",
     )
+    parser.add_argument(
+        "--rooms",
+        type=int,
+        default=MAX_ROOMS,
+        help=f"Set the maximum number of concurrent rooms. Default to {MAX_ROOMS}.",
+    )
+    parser.add_argument(
+        "--max-pending-bytes",
+        type=int,
+        default=MAX_PENDING_BYTES,
+        help=f"Evict a client whose unsent data exceeds this many bytes. Default to {MAX_PENDING_BYTES}.",
+    )
+    parser.add_argument(
+        "--max-send-latency",
+        type=float,
+        default=MAX_SEND_LATENCY,
+        help=f"Evict a client whose queued messages wait longer than this. Default to {MAX_SEND_LATENCY} (seconds).",
+    )
+    parser.add_argument(
+        "--read-limit",
+        type=int,
+        default=READ_LIMIT,
+        help=f"Disconnect a client whose message or unread backlog exceeds this many bytes. Default to {READ_LIMIT}.",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=MAX_CONNECTIONS,
+        help=f"Refuse connections past this many open at once, 0 for no limit. Default to {MAX_CONNECTIONS}.",
+    )
+    parser.add_argument(
+        "--command-rate",
+        type=float,
+        default=COMMAND_RATE,
+        help=f"Refuse a client's commands past this many per second, 0 for no limit. Default to {COMMAND_RATE}.",
+    )
+    parser.add_argument(
+        "--command-burst",
+        type=int,
+        default=COMMAND_BURST,
+        help=f"Commands a client may send at once before --command-rate applies. Default to {COMMAND_BURST}.",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=IDLE_TIMEOUT,
+        help=f"Disconnect a client that sends nothing for this long before registering or spectating, 0 to never. Default to {IDLE_TIMEOUT} (seconds).",
+    )
+    parser.add_argument(
+        "--resume-grace",
+        type=float,
+        default=RESUME_GRACE,
+        help=f"Hold the seat of a player who dropped mid-match this long for a RESUME, 0 to disqualify at once. Default to {RESUME_GRACE} (seconds).",
+    )
+    parser.add_argument(
+        "--resume-history",
+        type=int,
+        default=RESUME_HISTORY,
+        help=f"Keep this many recent messages per player for a RESUME to replay. Default to {RESUME_HISTORY}.",
+    )
+    parser.add_argument(
+        "--heartbeat-interval",
+        type=float,
+        default=HEARTBEAT_INTERVAL,
+        help=f"PING clients that asked for heartbeats this often, 0 to never. Default to {HEARTBEAT_INTERVAL} (seconds).",
+    )
+    parser.add_argument(
+        "--heartbeat-timeout",
+        type=float,
+        default=HEARTBEAT_TIMEOUT,
+        help=f"Evict a client that asked for heartbeats and sent nothing for this long. Default to {HEARTBEAT_TIMEOUT} (seconds).",
+    )
+    parser.add_argument(
+        "--write-high-water",
+        type=int,
+        default=WRITE_HIGH_WATER,
+        help=f"Wait for a client once this many bytes sit in its socket buffer. Default to {WRITE_HIGH_WATER}.",
+    )
+    parser.add_argument(
+        "--write-low-water",
+        type=int,
+        default=WRITE_LOW_WATER,
+        help=f"Resume writing to a waited for client once its socket buffer is down to this many bytes. Default to {WRITE_LOW_WATER}.",
+    )
+    parser.add_argument(
+        "--scores-keyframe",
+        type=int,
+        default=SCORES_KEYFRAME_INTERVAL,
+        help=f"Send full SCORES to clients using delta scores every this many rounds. Default to {SCORES_KEYFRAME_INTERVAL}.",
+    )
+    parser.add_argument(
+        "--question-seed",
+        type=int,
+        help="Seed the questions; room N draws the sequence of seed + N, so matches can be replayed. Random by default.",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Append every message received and sent to a session log at PATH, for tools/replay.py; workers add their id to the name. Off by default.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="PATH",
+        help="Keep the matches in progress in a snapshot file at PATH and resume them from it on start; workers add their id to the name. Off by default.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Run this many worker processes sharing the port, each owning its own rooms. Default to 1.",
+    )
+    parser.add_argument(
+        "--relay-port",
+        type=int,
+        help="Accept edge relay links (see relay.py) on this port; needs a single worker. Off by default.",
+    )
+    parser.add_argument(
+        "--upgrade-socket",
+        metavar="PATH",
+        help="Wait on this Unix socket for a new server process to take over (see upgrade.py); needs a single worker. Off by default.",
+    )
+    parser.add_argument(
+        "--take-over",
+        action="store_true",
+        help="Take the listening sockets and idle clients of the server waiting on --upgrade-socket.",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=upgrade.DRAIN_TIMEOUT,
+        help="After handing over, disconnect players still in a match after this many seconds; 0 waits for every match to end. Default to 0.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics over HTTP on this port; workers use consecutive ports. Off by default.",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=loops.LOOP_CHOICES,
+        default="asyncio",
+        help="Event loop implementation. uvloop falls back to asyncio when it is not installed; auto picks uvloop when available. Default to asyncio.",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        type=str.upper,
+        help="Set the logging level. Default to INFO.",
+    )
+    parser.add_argument(
+        "--log-sample",
+        action="append",
+        default=[],
+        metavar="CATEGORY=N",
+        help=f"Log only one in N messages of a category ({', '.join(log.CATEGORIES)}). Can be repeated.",
+    )
+    parser.add_argument(
+        "--log-rate-limit",
+        action="append",
+        default=[],
+        metavar="CATEGORY=N",
+        help="Log at most N messages per second of a category. Can be repeated.",
+    )
     args = parser.parse_args()
 
+    def parse_categories(values: List[str], kind: type) -> Dict[str, Any]:
+        limits: Dict[str, Any] = {}
+        for value in values:
+            category, _, limit = value.partition("=")
+            if category not in log.CATEGORIES:
+                parser.error(f"Unknown log category: {category}")
+            try:
+                limits[category] = kind(limit)
+            except ValueError:
+                parser.error(f"Invalid limit for {category}: {limit}")
+        return limits
+
+    log_sample_every = parse_categories(args.log_sample, int)
+    log_rate_limits = parse_categories(args.log_rate_limit, float)
+
+    def setup_logging() -> log.QueueListener:
+        return log.setup_logging(args.log_level, log_sample_every, log_rate_limits)
+
     max_players = args.players
     race_length = args.race_length
     ANSWER_TIME_LIMIT = args.time_answer
+    MAX_PENDING_BYTES = args.max_pending_bytes
+    MAX_SEND_LATENCY = args.max_send_latency
+    READ_LIMIT = args.read_limit
+    WRITE_HIGH_WATER = args.write_high_water
+    WRITE_LOW_WATER = args.write_low_water
+    MAX_CONNECTIONS = args.max_connections
+    COMMAND_RATE = args.command_rate
+    COMMAND_BURST = args.command_burst
+    IDLE_TIMEOUT = args.idle_timeout
+    RESUME_GRACE = args.resume_grace
+    RESUME_HISTORY = args.resume_history
+    HEARTBEAT_INTERVAL = args.heartbeat_interval
+    HEARTBEAT_TIMEOUT = args.heartbeat_timeout
+    if COMMAND_RATE > 0 and COMMAND_BURST < 1:
+        parser.error("--command-burst must be at least 1")
+    if RESUME_HISTORY < 0:
+        parser.error("--resume-history cannot be negative")
+    if HEARTBEAT_INTERVAL > 0 and HEARTBEAT_TIMEOUT <= HEARTBEAT_INTERVAL:
+        # A live client only answers once per interval
+        parser.error("--heartbeat-timeout must be longer than --heartbeat-interval")
+    if not 0 <= WRITE_LOW_WATER <= WRITE_HIGH_WATER:
+        parser.error("--write-low-water must be between 0 and --write-high-water")
+    if args.relay_port is not None and args.workers > 1:
+        # A relayed client has no socket of its own to hand to another worker
+        parser.error("--relay-port needs a single worker")
+    if args.upgrade_socket and args.workers > 1:
+        # Workers share the port with SO_REUSEPORT, there is no one socket
+        parser.error("--upgrade-socket needs a single worker")
+    if args.take_over and not args.upgrade_socket:
+        parser.error("--take-over needs --upgrade-socket")
+    question_seed: Optional[int] = args.question_seed
+    if question_seed is None and args.record:
+        # A replay needs the questions, so recorded sessions are always seeded
+        question_seed = random.randrange(2**31)
 
-    game: Game = Game(max_players, race_length)
-    client: ClientManager = ClientManager()
     address = ("localhost", 54321)
-    loop = asyncio.get_event_loop()
-    coro = asyncio.start_server(client.handle_conversation, *address)
-    server = loop.run_until_complete(coro)
-    print("Listening at {}".format(address))
+
+    async def serve(
+        router: Optional[WorkerRouter], listen_sock: Optional[socket.socket]
+    ) -> None:
+        server_state: Server = Server(
+            max_players,
+            race_length,
+            args.rooms,
+            ANSWER_TIME_LIMIT,
+            PREPARE_TIME_LIMIT,
+            router,
+            args.scores_keyframe,
+            question_seed,
+        )
+        # the loop only holds weak references to tasks
+        background_tasks: List[asyncio.Task] = []
+
+        def resume_snapshots() -> None:
+            path: str = (
+                f"{args.snapshot}.{router.worker_id}" if router else args.snapshot
+            )
+            started: float = time.perf_counter()
+            rooms: Dict[int, snapshots.RoomState] = snapshots.read_snapshot(path)
+            for state in list(rooms.values()):
+                try:
+                    server_state.room_manager.restore_room(state)
+                except RoomError as e:
+                    # Never take the place of a room that is playing here
+                    LOGGER.warning("[Snapshots] Dropped a saved match: %s", e)
+                    del rooms[state.room_id]
+            store: snapshots.SnapshotStore = snapshots.start_snapshots(path, rooms)
+            background_tasks.append(
+                asyncio.create_task(store.run(server_state.room_manager.rooms))
+            )
+            LOGGER.info(
+                "[Snapshots] Resumed %d matches from %s in %.1f ms.",
+                len(rooms),
+                path,
+                (time.perf_counter() - started) * 1000,
+            )
+
+        # sockets of the server being replaced, by name
+        listeners: Dict[str, socket.socket] = {}
+        if args.take_over:
+            control, listeners, next_room_id = upgrade.take_over(args.upgrade_socket)
+            # Rooms the predecessor still runs may come back from its snapshot
+            server_state.room_manager.next_room_id = next_room_id
+            predecessor_exited: asyncio.Future = upgrade.adopt_connections(
+                control, server_state.handle_conversation, READ_LIMIT
+            )
+            if args.snapshot:
+                # The predecessor still writes the file until its matches end
+                predecessor_exited.add_done_callback(lambda _: resume_snapshots())
+        elif args.snapshot:
+            resume_snapshots()
+        if HEARTBEAT_INTERVAL > 0:
+            background_tasks.append(
+                asyncio.create_task(
+                    heartbeat.run(
+                        server_state.connections, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT
+                    )
+                )
+            )
+
+        async def listen_at(
+            name: str,
+            port: int,
+            start: Callable[..., Awaitable[asyncio.AbstractServer]],
+            **kwargs: Any,
+        ) -> List[asyncio.AbstractServer]:
+            # The predecessor's sockets if it handed any over, else new ones
+            if name in listeners:
+                return [await start(sock=sock, **kwargs) for sock in listeners[name]]
+            return [await start(host=address[0], port=port, **kwargs)]
+
+        servers: Dict[str, List[asyncio.AbstractServer]] = {}
+        if listen_sock is not None:
+            servers["clients"] = [
+                await asyncio.start_server(
+                    server_state.handle_conversation, sock=listen_sock, limit=READ_LIMIT
+                )
+            ]
+        else:
+            servers["clients"] = await listen_at(
+                "clients",
+                address[1],
+                functools.partial(
+                    asyncio.start_server, server_state.handle_conversation
+                ),
+                reuse_port=router is not None,
+                limit=READ_LIMIT,
+            )
+        if args.relay_port is not None:
+            servers["relays"] = await listen_at(
+                "relays",
+                args.relay_port,
+                functools.partial(
+                    asyncio.start_server,
+                    relay_link_handler(server_state.handle_conversation, READ_LIMIT),
+                ),
+            )
+        if args.metrics_port is not None:
+            metrics_port: int = args.metrics_port + (router.worker_id if router else 0)
+            servers["metrics"] = await listen_at(
+                "metrics", metrics_port, metrics.start_metrics_server
+            )
+        if router is not None:
+            router.start(
+                asyncio.get_running_loop(),
+                server_state.handle_conversation,
+                READ_LIMIT,
+            )
+            print(f"Worker {router.worker_id} listening at {address}")
+        else:
+            print("Listening at {}".format(address))
+        if args.upgrade_socket is None:
+            await asyncio.gather(
+                *(server.serve_forever() for server in servers["clients"])
+            )
+        else:
+            successor: socket.socket = await upgrade.wait_for_successor(
+                args.upgrade_socket
+            )
+            upgrade.hand_over(
+                successor, servers, server_state.room_manager.next_room_id
+            )
+            await server_state.drain(successor, args.drain_timeout)
+            # The successor sees the end of the stream and resumes snapshots
+            successor.close()
+
+    def run_server(
+        router: Optional[WorkerRouter] = None,
+        listen_sock: Optional[socket.socket] = None,
+    ) -> None:
+        if router is not None:
+            # The parent's log thread did not survive the fork
+            worker_log_listener: log.QueueListener = setup_logging()
+        if args.record:
+            recorder.start_recording(
+                f"{args.record}.{router.worker_id}" if router else args.record,
+                {
+                    "max_players": max_players,
+                    "race_length": race_length,
+                    "max_rooms": args.rooms,
+                    "answer_time_limit": ANSWER_TIME_LIMIT,
+                    "prepare_time_limit": PREPARE_TIME_LIMIT,
+                    "scores_keyframe_interval": args.scores_keyframe,
+                    "question_seed": question_seed,
+                    "first_room_id": router.first_room_id() if router else 1,
+                    "room_id_step": router.room_id_step() if router else 1,
+                    "max_pending_bytes": MAX_PENDING_BYTES,
+                    "max_send_latency": MAX_SEND_LATENCY,
+                    "command_rate": COMMAND_RATE,
+                    "command_burst": COMMAND_BURST,
+                    "idle_timeout": IDLE_TIMEOUT,
+                    "resume_grace": RESUME_GRACE,
+                    "resume_history": RESUME_HISTORY,
+                },
+            )
+        loop: asyncio.AbstractEventLoop = loops.new_event_loop(args.loop)
+        asyncio.set_event_loop(loop)
+        # Stopping unwinds through the finally below, which flushes the
+        # session log; workers get this from the parent when it stops
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            loop.run_until_complete(serve(router, listen_sock))
+        finally:
+            loop.close()
+            recorder.stop_recording()
+            snapshots.stop_snapshots()
+            if router is not None:
+                worker_log_listener.stop()
+
+    log_listener: log.QueueListener = setup_logging()
     try:
-        loop.run_forever()
+        if args.workers > 1:
+            start_workers(args.workers, address, run_server)
+        else:
+            run_server()
     finally:
-        server.close()
-        loop.close()
+        log_listener.stop()
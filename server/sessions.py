@@ -0,0 +1,73 @@
+"""Resumable player sessions.
+
+A client that negotiated HELLO;resume gets SESSION;<token> right after
+REGISTRATION_SUCCESS. From then on the messages sent to the player are
+counted and the last RESUME_HISTORY of them kept. When the connection
+drops during a match, the player keeps their seat for RESUME_GRACE seconds
+and their messages are still kept. A new connection sending
+RESUME;<token>;<received> takes the seat back and gets the messages after
+the first <received> in one write.
+"""
+import asyncio
+import secrets
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+
+from connection import Connection
+
+# Keep a dropped player's seat this long for them to resume (seconds)
+RESUME_GRACE = 15.0
+# Messages kept per player for a resume to replay
+RESUME_HISTORY = 256
+
+
+def new_token(room_id: int) -> str:
+    # The room id routes a RESUME to the worker that owns the room
+    return f"{room_id}-{secrets.token_hex(16)}"
+
+
+def token_room_id(token: str) -> Optional[int]:
+    room_id, _, _ = token.partition("-")
+    return int(room_id) if room_id.isdigit() else None
+
+
+class Session:
+    __slots__ = ("token", "nickname", "writer", "conn", "sent", "history", "expiry")
+
+    def __init__(self, token: str, nickname: str, history_size: int):
+        self.token: str = token
+        self.nickname: str = nickname
+        # the player's socket, or the last one while suspended
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.conn: Optional[Connection] = None
+        # messages sent to the player since SESSION
+        self.sent: int = 0
+        self.history: Deque[Tuple[str, Tuple[Any, ...]]] = deque(maxlen=history_size)
+        # set while suspended
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+    def record(self, command: str, args: Tuple[Any, ...]) -> None:
+        self.sent += 1
+        self.history.append((command, args))
+
+    def missed(self, received: int) -> Optional[List[Tuple[str, Tuple[Any, ...]]]]:
+        """The messages after the first received, None if they are not all kept."""
+        count: int = self.sent - received
+        if not 0 <= count <= len(self.history):
+            return None
+        return list(self.history)[len(self.history) - count :]
+
+    def attach(self, writer: asyncio.StreamWriter, conn: Connection) -> None:
+        self.writer = writer
+        self.conn = conn
+        conn.session = self
+
+    def detach(self) -> None:
+        # The connection stays, its features decide what gets kept meanwhile
+        if self.conn is not None:
+            self.conn.session = None
+
+    def cancel_expiry(self) -> None:
+        if self.expiry is not None:
+            self.expiry.cancel()
+            self.expiry = None
@@ -0,0 +1,291 @@
+"""Crash-safe snapshots of the matches in progress, for a warm restart.
+
+The snapshot file starts with MAGIC and is only appended to. Every record
+is a RECORD header followed by its payload:
+
+    !B kind, !i room id, !I payload length
+
+    ROOM    the room's match as packed by pack_room; replaces any earlier
+            record of the room
+    CLOSED  the room has no match in progress any more
+
+A room is written when a round starts, when its question goes out and,
+while answers come in, every INTERVAL seconds, so a crash loses at most
+that much of a match. Rooms in the lobby are not kept. Once the file grows
+past COMPACT_FACTOR times the size of the latest records it is rewritten
+with only those, atomically.
+"""
+import asyncio
+import logging
+import math
+import os
+import struct
+from typing import Any, BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"RACESNP1"
+RECORD = struct.Struct("!BiI")
+ROOM = 1
+CLOSED = 2
+
+# Save rooms whose players answered at most this often (seconds)
+INTERVAL = 1.0
+# Compact once the file is this many times the size of the live records
+COMPACT_FACTOR = 4
+# ...but never below this size (bytes)
+COMPACT_MIN_BYTES = 1024 * 1024
+
+# max players, race length, answer time limit, prepare time limit, scores
+# keyframe interval, seeded, question seed, questions taken, round index,
+# answering, phase deadline (Unix time), question first number, operator,
+# second number, answer, wrong answers this round
+_ROOM = struct.Struct("!iiiii?qIi?dqcqqi")
+# position, diff points, wrong answer streak, ready, disqualified, answer
+# time (Unix time, NaN for none), awaited, rank among correct answers
+_PLAYER = struct.Struct("!iii??d?i")
+_STRING = struct.Struct("!H")
+_COUNT = struct.Struct("!I")
+
+
+class PlayerState(NamedTuple):
+    nickname: str
+    position: int
+    diff_points: int
+    wa_streak: int
+    is_ready: bool
+    is_disqualified: bool
+    answer_time: Optional[float]
+    # has not answered the open question yet
+    is_awaited: bool
+    # order among this round's correct answers, -1 when not one of them
+    correct_rank: int
+
+
+class RoomState(NamedTuple):
+    room_id: int
+    max_players: int
+    race_length: int
+    answer_time_limit: int
+    prepare_time_limit: int
+    scores_keyframe_interval: int
+    question_seed: Optional[int]
+    questions_taken: int
+    round_index: int
+    # waiting for answers, otherwise preparing the round
+    is_answering: bool
+    # Unix time the current phase ends
+    deadline: float
+    # first number, operator, second number and answer of the open question
+    question: Optional[Tuple[int, str, int, int]]
+    incorrect_count: int
+    fastest_nickname: str
+    players: List[PlayerState]
+
+
+def _pack_string(value: str, parts: List[bytes]) -> None:
+    data: bytes = value.encode()
+    parts.append(_STRING.pack(len(data)))
+    parts.append(data)
+
+
+def _unpack_string(payload: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _STRING.unpack_from(payload, offset)
+    offset += _STRING.size
+    return payload[offset : offset + length].decode(), offset + length
+
+
+def pack_room(state: RoomState) -> bytes:
+    first, operator, second, answer = state.question or (0, " ", 0, 0)
+    parts: List[bytes] = [
+        _ROOM.pack(
+            state.max_players,
+            state.race_length,
+            state.answer_time_limit,
+            state.prepare_time_limit,
+            state.scores_keyframe_interval,
+            state.question_seed is not None,
+            state.question_seed or 0,
+            state.questions_taken,
+            state.round_index,
+            state.is_answering,
+            state.deadline,
+            first,
+            operator.encode(),
+            second,
+            answer,
+            state.incorrect_count,
+        )
+    ]
+    _pack_string(state.fastest_nickname, parts)
+    parts.append(_COUNT.pack(len(state.players)))
+    for player in state.players:
+        _pack_string(player.nickname, parts)
+        parts.append(
+            _PLAYER.pack(
+                player.position,
+                player.diff_points,
+                player.wa_streak,
+                player.is_ready,
+                player.is_disqualified,
+                math.nan if player.answer_time is None else player.answer_time,
+                player.is_awaited,
+                player.correct_rank,
+            )
+        )
+    return b"".join(parts)
+
+
+def pack_record(state: RoomState) -> bytes:
+    payload: bytes = pack_room(state)
+    return RECORD.pack(ROOM, state.room_id, len(payload)) + payload
+
+
+def unpack_room(room_id: int, payload: bytes) -> RoomState:
+    fields: Tuple[Any, ...] = _ROOM.unpack_from(payload)
+    offset: int = _ROOM.size
+    fastest_nickname, offset = _unpack_string(payload, offset)
+    (count,) = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    players: List[PlayerState] = []
+    for _ in range(count):
+        nickname, offset = _unpack_string(payload, offset)
+        player: PlayerState = PlayerState(
+            nickname, *_PLAYER.unpack_from(payload, offset)
+        )
+        offset += _PLAYER.size
+        if math.isnan(player.answer_time):
+            player = player._replace(answer_time=None)
+        players.append(player)
+    is_answering: bool = fields[9]
+    question: Optional[Tuple[int, str, int, int]] = (
+        (fields[11], fields[12].decode(), fields[13], fields[14])
+        if is_answering
+        else None
+    )
+    return RoomState(
+        room_id,
+        *fields[:5],
+        fields[6] if fields[5] else None,
+        *fields[7:9],
+        is_answering,
+        fields[10],
+        question,
+        fields[15],
+        fastest_nickname,
+        players,
+    )
+
+
+def read_snapshot(path: str) -> Dict[int, RoomState]:
+    """The latest state of every room with a match in progress.
+
+    A record cut short by a crash ends the file.
+    """
+    payloads: Dict[int, bytes] = {}
+    try:
+        file: BinaryIO = open(path, "rb")
+    except FileNotFoundError:
+        return {}
+    with file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file.")
+        while True:
+            header: bytes = file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            kind, room_id, length = RECORD.unpack(header)
+            payload: bytes = file.read(length)
+            if len(payload) < length:
+                break
+            if kind == ROOM:
+                payloads[room_id] = payload
+            elif kind == CLOSED:
+                payloads.pop(room_id, None)
+    return {
+        room_id: unpack_room(room_id, payload) for room_id, payload in payloads.items()
+    }
+
+
+class SnapshotStore:
+    def __init__(self, path: str):
+        self.path: str = path
+        # latest ROOM record of every room with a match in progress
+        self.records: Dict[int, bytes] = {}
+        self.records_size: int = 0
+        self.file: BinaryIO = open(path, "ab", buffering=0)
+        self.size: int = self.file.tell()
+        if self.size == 0:
+            self.write(MAGIC)
+
+    def write(self, data: bytes) -> None:
+        # Unbuffered, each record reaches the OS in one write
+        self.file.write(data)
+        self.size += len(data)
+
+    def keep(self, room_id: int, record: Optional[bytes]) -> None:
+        old: Optional[bytes] = self.records.pop(room_id, None)
+        if old is not None:
+            self.records_size -= len(old)
+        if record is not None:
+            self.records[room_id] = record
+            self.records_size += len(record)
+
+    def save(self, state: RoomState) -> None:
+        record: bytes = pack_record(state)
+        self.keep(state.room_id, record)
+        self.write(record)
+        if self.size > max(COMPACT_MIN_BYTES, COMPACT_FACTOR * self.records_size):
+            self.compact()
+
+    def close_room(self, room_id: int) -> None:
+        if room_id in self.records:
+            self.keep(room_id, None)
+            self.write(RECORD.pack(CLOSED, room_id, 0))
+
+    def compact(self) -> None:
+        """Rewrite the file with only the latest record of each room."""
+        temporary: str = f"{self.path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(MAGIC)
+            file.writelines(self.records.values())
+            file.flush()
+            os.fsync(file.fileno())
+        self.file.close()
+        os.replace(temporary, self.path)
+        self.file = open(self.path, "ab", buffering=0)
+        self.size = self.file.tell()
+
+    async def run(self, rooms: Dict[int, Any]) -> None:
+        """Save the rooms whose players answered since they were last saved."""
+        while True:
+            await asyncio.sleep(INTERVAL)
+            for game in list(rooms.values()):
+                if game.snapshot_dirty:
+                    game.save_snapshot()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+# The active store, None unless snapshots were started
+STORE: Optional[SnapshotStore] = None
+
+
+def start_snapshots(path: str, rooms: Dict[int, RoomState]) -> SnapshotStore:
+    """Keep snapshots at path, starting from the given restored rooms."""
+    global STORE
+    STORE = SnapshotStore(path)
+    for state in rooms.values():
+        STORE.keep(state.room_id, pack_record(state))
+    # Drops whatever was superseded before the restart
+    STORE.compact()
+    LOGGER.info("[Snapshots] Saving matches to %s.", path)
+    return STORE
+
+
+def stop_snapshots() -> None:
+    global STORE
+    if STORE is not None:
+        STORE.close()
+        STORE = None
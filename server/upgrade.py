@@ -0,0 +1,123 @@
+"""Zero-downtime upgrades: handing the listening sockets to a new process.
+
+    python server/server.py --upgrade-socket /tmp/racing-arena.sock
+    # later, with the new code in place
+    python server/server.py --upgrade-socket /tmp/racing-arena.sock --take-over
+
+A server started with --upgrade-socket waits for a successor on that Unix
+socket. The process started with --take-over connects to it and receives
+every listening socket of the running one, so the ports never stop
+accepting. The old process then stops accepting and drains: connections
+with nothing to lose (no seat or audience in a match in progress) are
+passed to the successor as they become idle, the same way workers pass
+connections (see workers.py). Players stay until their match ends. When
+none is left the old process exits and closes the socket, and the new one
+listens on the path in turn for its own successor.
+
+The first message on the socket is a JSON object with how many sockets each
+listener has (a host name may resolve to both IPv4 and IPv6) and the next
+room id, and carries their descriptors in that order; each further
+message carries one client connection. The successor numbers its rooms from
+that id on, so the matches it resumes from the snapshot keep their ids (and
+their players' RESUME tokens) without taking one of its own rooms'.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Dict, List, Tuple
+
+from workers import ConnectionHandler, receive_connection
+
+LOGGER = logging.getLogger(__name__)
+
+# Most listening sockets a server hands over
+MAX_LISTENERS = 8
+# How often a draining server looks for connections it can pass on (seconds)
+DRAIN_INTERVAL = 0.5
+# Disconnect players still in a match this long after the upgrade began
+# (seconds, 0 to wait for every match to end)
+DRAIN_TIMEOUT = 0
+
+
+def take_over(path: str) -> Tuple[socket.socket, Dict[str, List[socket.socket]], int]:
+    """Connect to the running server and receive its listening sockets.
+
+    Also returns the room id to number new rooms from.
+    """
+    control: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    control.connect(path)
+    message, fds, _, _ = socket.recv_fds(control, 4096, MAX_LISTENERS)
+    handed: Dict[str, Any] = json.loads(message)
+    listeners: Dict[str, List[socket.socket]] = {}
+    for name, count in handed["listeners"].items():
+        listeners[name] = [socket.socket(fileno=fd) for fd in fds[:count]]
+        fds = fds[count:]
+    LOGGER.info("[Upgrade] Took over %s from %s.", ", ".join(listeners), path)
+    return control, listeners, handed["next_room_id"]
+
+
+async def wait_for_successor(path: str) -> socket.socket:
+    """Listen on path until a process started with --take-over connects."""
+    # A predecessor leaves its path behind once it hands over
+    if os.path.exists(path):
+        os.unlink(path)
+    listener: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    listener.bind(path)
+    listener.listen(1)
+    listener.setblocking(False)
+    try:
+        successor, _ = await asyncio.get_running_loop().sock_accept(listener)
+    finally:
+        listener.close()
+    successor.setblocking(True)
+    return successor
+
+
+def hand_over(
+    successor: socket.socket,
+    servers: Dict[str, List[asyncio.AbstractServer]],
+    next_room_id: int,
+) -> None:
+    """Send every listening socket to the successor and stop accepting on them."""
+    sockets: Dict[str, List[socket.socket]] = {
+        name: [sock for server in named for sock in server.sockets]
+        for name, named in servers.items()
+    }
+    handed: Dict[str, Any] = {
+        "listeners": {name: len(socks) for name, socks in sockets.items()},
+        "next_room_id": next_room_id,
+    }
+    socket.send_fds(
+        successor,
+        [json.dumps(handed).encode()],
+        [sock.fileno() for socks in sockets.values() for sock in socks],
+    )
+    # Closes only our copies, the successor accepts from now on
+    for named in servers.values():
+        for server in named:
+            server.close()
+    LOGGER.info("[Upgrade] Handed over %s.", ", ".join(servers))
+
+
+def adopt_connections(
+    control: socket.socket, handle_conversation: ConnectionHandler, read_limit: int
+) -> asyncio.Future:
+    """Serve the connections the predecessor passes on.
+
+    The returned future is done once the predecessor has exited.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    done: asyncio.Future = loop.create_future()
+    control.setblocking(False)
+
+    def receive() -> None:
+        if not receive_connection(control, handle_conversation, read_limit):
+            loop.remove_reader(control.fileno())
+            control.close()
+            LOGGER.info("[Upgrade] The previous server has exited.")
+            done.set_result(None)
+
+    loop.add_reader(control.fileno(), receive)
+    return done
@@ -0,0 +1,199 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import signal
+import socket
+import struct
+import sys
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from connection import READ_LIMIT
+from protocol import CODECS, Codec
+
+LOGGER = logging.getLogger(__name__)
+
+# Largest read-ahead that can travel with a handed off connection
+MAX_HANDOFF_SIZE = 64 * 1024
+
+_CODEC_ID = struct.Struct("!B")
+
+ConnectionHandler = Callable[
+    [asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]
+]
+
+
+class WorkerRouter:
+    """Moves client sockets between worker processes.
+
+    Every worker owns the rooms whose id maps to it. A connection that asks
+    for a room owned by another worker is passed, together with the bytes it
+    already sent and its wire format, over that worker's Unix datagram
+    inbox.
+    """
+
+    def __init__(
+        self,
+        worker_id: int,
+        worker_count: int,
+        outboxes: List[socket.socket],
+        inbox: socket.socket,
+    ):
+        self.worker_id: int = worker_id
+        self.worker_count: int = worker_count
+        self.outboxes: List[socket.socket] = outboxes
+        self.inbox: socket.socket = inbox
+        # adopted connections read with the same limit as accepted ones
+        self.read_limit: int = READ_LIMIT
+
+    def first_room_id(self) -> int:
+        return self.worker_id + 1
+
+    def room_id_step(self) -> int:
+        return self.worker_count
+
+    def owner(self, room_id: int) -> int:
+        return (room_id - 1) % self.worker_count
+
+    def owns(self, room_id: int) -> bool:
+        return self.owner(room_id) == self.worker_id
+
+    def start(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        handle_conversation: ConnectionHandler,
+        read_limit: int = READ_LIMIT,
+    ) -> None:
+        self.read_limit = read_limit
+        self.inbox.setblocking(False)
+        loop.add_reader(
+            self.inbox.fileno(), self.receive_connection, handle_conversation
+        )
+
+    def send_connection(
+        self,
+        worker_id: int,
+        writer: asyncio.StreamWriter,
+        pending: bytes,
+        codec: Codec,
+    ) -> None:
+        send_connection(self.outboxes[worker_id], writer, pending, codec)
+        LOGGER.info(
+            "[Worker %d] Handed off %s to worker %d.",
+            self.worker_id,
+            writer.get_extra_info("peername"),
+            worker_id,
+        )
+
+    def receive_connection(self, handle_conversation: ConnectionHandler) -> None:
+        receive_connection(self.inbox, handle_conversation, self.read_limit)
+
+
+def send_connection(
+    outbox: socket.socket, writer: asyncio.StreamWriter, pending: bytes, codec: Codec
+) -> None:
+    """Pass a client socket, its unread bytes and wire format to another process."""
+    if len(pending) > MAX_HANDOFF_SIZE:
+        raise ValueError("Too much unread data to hand off.")
+    sock = writer.get_extra_info("socket")
+    # The kernel duplicates the descriptor into the message, so closing
+    # our transport afterwards leaves the peer connected to the new owner
+    socket.send_fds(
+        outbox, [_CODEC_ID.pack(codec.codec_id), pending], [sock.fileno()]
+    )
+    writer.transport.abort()
+
+
+def receive_connection(
+    inbox: socket.socket, handle_conversation: ConnectionHandler, read_limit: int
+) -> bool:
+    """Serve a socket passed with send_connection, if one is waiting.
+
+    Returns False once the sending end is closed.
+    """
+    try:
+        message, fds, _, _ = socket.recv_fds(
+            inbox, _CODEC_ID.size + MAX_HANDOFF_SIZE, 1
+        )
+    except BlockingIOError:
+        return True
+    if not fds:
+        return bool(message)
+    sock = socket.socket(fileno=fds[0])
+    sock.setblocking(False)
+    (codec_id,) = _CODEC_ID.unpack_from(message)
+    asyncio.create_task(
+        adopt_connection(
+            sock,
+            message[_CODEC_ID.size :],
+            functools.partial(handle_conversation, codec=CODECS[codec_id]),
+            read_limit,
+        )
+    )
+    return True
+
+
+async def adopt_connection(
+    sock: socket.socket,
+    pending: bytes,
+    handle_conversation: ConnectionHandler,
+    read_limit: int,
+) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(read_limit)
+    # Replay what the previous owner read but did not handle
+    reader.feed_data(pending)
+    protocol = asyncio.StreamReaderProtocol(reader, handle_conversation)
+    await loop.connect_accepted_socket(lambda: protocol, sock)
+
+
+def start_workers(
+    worker_count: int,
+    address: Tuple[str, int],
+    run_worker: Callable[[WorkerRouter, Optional[socket.socket]], None],
+) -> None:
+    """Fork worker_count processes that all serve address.
+
+    With SO_REUSEPORT each worker binds its own listening socket and the
+    kernel spreads new connections; otherwise they share one socket opened
+    here. run_worker is called in each child with its router and the shared
+    socket (None when the worker must bind with reuse_port itself).
+    """
+    context = multiprocessing.get_context("fork")
+    inboxes: List[Tuple[socket.socket, socket.socket]] = [
+        socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        for _ in range(worker_count)
+    ]
+    outboxes: List[socket.socket] = [send_end for send_end, _ in inboxes]
+
+    listen_sock: Optional[socket.socket] = None
+    if not hasattr(socket, "SO_REUSEPORT"):
+        listen_sock = socket.create_server(address)
+
+    processes: List[multiprocessing.Process] = []
+    for worker_id in range(worker_count):
+        router = WorkerRouter(worker_id, worker_count, outboxes, inboxes[worker_id][1])
+        process = context.Process(
+            target=run_worker,
+            args=(router, listen_sock),
+            name=f"racing-arena-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    LOGGER.info("[Main] Started %d workers.", worker_count)
+
+    # Take the workers down with us when asked to stop
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        # Workers flush their session logs and snapshots on SIGTERM
+        for process in processes:
+            process.join()
@@ -0,0 +1,90 @@
+"""A server on an ephemeral port and a text protocol client, for the tests.
+
+The server modules import each other by bare name, as server/server.py does
+when run as a script, so their directory goes on the path.
+"""
+import asyncio
+import contextlib
+import os
+import sys
+from typing import Any, AsyncIterator, List, Tuple
+
+ROOT: str = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+import server  # noqa: E402
+
+# Long enough for a loaded machine, short enough to fail fast
+TIMEOUT = 5.0
+
+
+class TextClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+
+    @classmethod
+    async def connect(cls, port: int) -> "TextClient":
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def send(self, command: str, *args: object) -> None:
+        self.writer.write((";".join([command, *map(str, args)]) + "\n").encode())
+        await self.writer.drain()
+
+    async def receive(self, timeout: float = TIMEOUT) -> Tuple[str, List[str]]:
+        """The next message, ("", []) once the server closed the connection."""
+        line: bytes = await asyncio.wait_for(self.reader.readline(), timeout)
+        command, *args = line.decode().strip().split(";")
+        return command, args
+
+    async def receive_until(self, command: str, timeout: float = TIMEOUT) -> List[str]:
+        """Arguments of the next message named command, skipping the others."""
+        while True:
+            received, args = await self.receive(timeout)
+            if received == command:
+                return args
+            assert received, f"Connection closed while waiting for {command}"
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+@contextlib.asynccontextmanager
+async def connected_streams() -> AsyncIterator[
+    Tuple[asyncio.StreamWriter, asyncio.StreamReader]
+]:
+    """Both ends of a local TCP connection: the server's writer, the peer's reader."""
+    accepted: asyncio.Future = asyncio.get_running_loop().create_future()
+    listener: asyncio.AbstractServer = await asyncio.start_server(
+        lambda reader, writer: accepted.set_result(writer), "127.0.0.1", 0
+    )
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", listener.sockets[0].getsockname()[1]
+    )
+    server_writer: asyncio.StreamWriter = await accepted
+    try:
+        yield server_writer, reader
+    finally:
+        writer.close()
+        server_writer.close()
+        listener.close()
+
+
+@contextlib.asynccontextmanager
+async def running_server(
+    max_players: int = 4, race_length: int = 3, **kwargs: Any
+) -> AsyncIterator[Tuple[server.Server, int]]:
+    """A Server on a free local port, with the module's current settings.
+
+    Keyword arguments go to Server, e.g. shorter phases for a whole match.
+    """
+    state: server.Server = server.Server(
+        max_players, race_length, server.MAX_ROOMS, **kwargs
+    )
+    listener: asyncio.AbstractServer = await asyncio.start_server(
+        state.handle_conversation, "127.0.0.1", 0, limit=server.READ_LIMIT
+    )
+    try:
+        yield state, listener.sockets[0].getsockname()[1]
+    finally:
+        listener.close()
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from helpers import TextClient, running_server, server
+from admission import TokenBucket
+
+
+def test_bucket_allows_a_burst_then_the_rate() -> None:
+    async def scenario() -> None:
+        bucket: TokenBucket = TokenBucket(100, 2)
+        assert bucket.take()
+        assert bucket.take()
+        assert not bucket.take()
+        await asyncio.sleep(0.02)
+        assert bucket.take()
+
+    asyncio.run(scenario())
+
+
+def test_requests_past_the_rate_are_refused(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, "COMMAND_RATE", 5)
+    monkeypatch.setattr(server, "COMMAND_BURST", 3)
+
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            client: TextClient = await TextClient.connect(port)
+            for _ in range(3):
+                await client.send("ROOM_LIST")
+                assert (await client.receive())[0] == "ROOM_LIST"
+            await client.send("ROOM_LIST")
+            assert await client.receive() == ("ROOM_FAILURE", ["Too many requests."])
+            # Refused, but still connected once the bucket refilled
+            await asyncio.sleep(0.25)
+            await client.send("ROOM_LIST")
+            assert (await client.receive())[0] == "ROOM_LIST"
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_connections_past_the_limit_are_turned_away(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(server, "MAX_CONNECTIONS", 1)
+
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            first: TextClient = await TextClient.connect(port)
+            await first.send("ROOM_LIST")
+            await first.receive_until("ROOM_LIST")
+            second: TextClient = await TextClient.connect(port)
+            assert await second.receive() == ("DISCONNECTED", ["Server is full."])
+            assert await second.receive() == ("", [])
+            first.close()
+            second.close()
+
+    asyncio.run(scenario())
+
+
+def test_overlong_messages_get_the_client_disconnected(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(server, "READ_LIMIT", 64)
+
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            client: TextClient = await TextClient.connect(port)
+            await client.send("REGISTER", "x" * 100)
+            assert await client.receive() == ("DISCONNECTED", ["Message is too long."])
+            assert await client.receive() == ("", [])
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import asyncio
+from typing import List
+
+from helpers import TextClient, running_server
+from client_manager import ClientManager
+from game import Game, GameState
+from question_manager import Question
+
+QUESTION = Question(1, 2, "+", 3)
+
+
+def playing_game(*nicknames: str) -> Game:
+    game: Game = Game(1, 4, 10, ClientManager({}))
+    for nickname in nicknames:
+        game.handle_registration(nickname)
+    game.state = GameState.PROCESSING
+    return game
+
+
+def test_window_closes_once_everybody_answered() -> None:
+    game: Game = playing_game("alice", "bob")
+    game.open_answer_window(QUESTION)
+    game.handle_answer("alice", 3)
+    assert not game.all_answered.is_set()
+    game.handle_answer("bob", 4)
+    assert game.all_answered.is_set()
+
+    # A new window waits for everybody again
+    game.open_answer_window(QUESTION)
+    assert not game.all_answered.is_set()
+
+
+def test_window_closes_when_the_last_awaited_player_leaves() -> None:
+    game: Game = playing_game("alice", "bob", "carol")
+    game.open_answer_window(QUESTION)
+    game.handle_answer("alice", 3)
+    game.handle_disconnection("bob")
+    assert not game.all_answered.is_set()
+    game.handle_disconnection("carol")
+    assert game.all_answered.is_set()
+
+
+def test_window_with_nobody_to_wait_for_is_closed() -> None:
+    game: Game = playing_game("alice")
+    game.player_manager.disqualify(game.player_manager.players["alice"])
+    game.open_answer_window(QUESTION)
+    assert game.all_answered.is_set()
+
+
+def test_round_ends_without_waiting_out_the_time_limit() -> None:
+    async def scenario() -> None:
+        async with running_server(
+            answer_time_limit=60, prepare_time_limit=0
+        ) as (_, port):
+            players: List[TextClient] = []
+            for nickname in ("alice", "bob"):
+                player: TextClient = await TextClient.connect(port)
+                await player.send("REGISTER", nickname)
+                await player.receive_until("REGISTRATION_SUCCESS")
+                players.append(player)
+            for player in players:
+                await player.send("READY")
+            for player in players:
+                await player.receive_until("QUESTION")
+                await player.send("ANSWER", 0)
+            # Well within the helpers' timeout, far from the time limit
+            for player in players:
+                await player.receive_until("SCORES")
+                player.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from helpers import ROOT
+
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+import bench_server  # noqa: E402
+
+
+def test_every_benchmark_runs_and_is_in_the_baseline() -> None:
+    results: Dict[str, Dict[str, float]] = bench_server.run([10], 1, 0.001)
+    with open(os.path.join(ROOT, "benchmarks", "baseline.json")) as file:
+        baseline: Dict[str, Dict[str, float]] = json.load(file)["results"]
+    # The baseline may also hold the ScoreBoard cases, NumPy or not
+    assert set(results) <= set(baseline)
+    assert "finish_round[10]" in results
+    for timing in results.values():
+        assert 0 < timing["best"] <= timing["median"]
+
+
+def test_setups_give_every_call_fresh_work() -> None:
+    for name in ("disqualify_players", "handle_answer", "finish_round"):
+        bench: Dict[str, Any] = bench_server.benchmarks(10, False)[name]
+        for _ in range(2):
+            bench["setup"]()
+            bench["func"]()
+    bench = bench_server.benchmarks(10, False)["disqualify_players"]
+    bench["setup"]()
+    assert len(bench["func"]()) == 10
+
+
+def test_only_slowdowns_past_the_tolerance_are_regressions() -> None:
+    baseline: Dict[str, Dict[str, float]] = {
+        "fast": {"best": 1.0},
+        "slow": {"best": 1.0},
+    }
+    results: Dict[str, Dict[str, float]] = {
+        "fast": {"best": 1.4},
+        "slow": {"best": 1.6},
+        "new": {"best": 9.0},
+    }
+    regressions: List[str] = bench_server.compare(results, baseline, 0.5)
+    assert regressions == ["slow"]
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+from typing import Any, Dict
+
+import pytest
+
+from helpers import ROOT, running_server
+
+sys.path.append(os.path.join(ROOT, "tools"))
+
+from bot_swarm import parse_distribution, percentiles, run_swarm  # noqa: E402
+
+
+def swarm_args(port: int, **overrides: Any) -> argparse.Namespace:
+    """The command line defaults, scaled down to a match of a few rounds."""
+    args: Dict[str, Any] = {
+        "host": "127.0.0.1",
+        "port": port,
+        "bots": 6,
+        "room_size": 3,
+        "race_length": 3,
+        "matches": 2,
+        "spectators": 1,
+        "correct_ratio": 0.8,
+        "think_time": parse_distribution("uniform:0,0.02"),
+        "connect_rate": 0,
+        "binary": False,
+        "delta": False,
+        "heartbeat": False,
+        "seed": 0,
+        "idle_timeout": 5,
+        "timeout": 30,
+    }
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_distributions() -> None:
+    rng: random.Random = random.Random(0)
+    assert parse_distribution("const:1.5")(rng) == 1.5
+    assert 1 <= parse_distribution("uniform:1,2")(rng) <= 2
+    assert parse_distribution("exp:0")(rng) == 0.0
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_distribution("uniform:1")
+
+
+def test_percentiles() -> None:
+    report: Dict[str, float] = percentiles([i / 1000 for i in range(1, 101)])
+    assert report["count"] == 100
+    assert report["p50_ms"] == pytest.approx(51)
+    assert report["p99_ms"] == pytest.approx(100)
+    assert report["max_ms"] == pytest.approx(100)
+    assert percentiles([]) == {"count": 0}
+
+
+@pytest.mark.parametrize(
+    "features",
+    [{}, {"binary": True, "delta": True, "heartbeat": True}],
+    ids=["text", "binary-delta-heartbeat"],
+)
+def test_swarm_plays_its_matches_without_errors(features: Dict[str, bool]) -> None:
+    async def scenario() -> Dict[str, Any]:
+        async with running_server(
+            answer_time_limit=1, prepare_time_limit=0
+        ) as (_, port):
+            return await run_swarm(swarm_args(port, **features))
+
+    report: Dict[str, Any] = asyncio.run(scenario())
+    assert report["errors"] == {"timed_out_bots": 0}
+    assert report["connections"] == 8
+    assert report["matches_finished"] == 4
+    assert report["answer_to_result"]["count"] > 0
+    assert report["spectator_lag"]["count"] > 0
+    assert set(report["broadcast_fan_out"]) >= {"QUESTION", "SCORES", "GAME_OVER"}
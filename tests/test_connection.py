@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+from typing import List
+
+from helpers import TIMEOUT, connected_streams
+from client_manager import ClientManager
+from connection import Connection
+
+
+def test_messages_arrive_in_order() -> None:
+    async def scenario() -> None:
+        async with connected_streams() as (writer, reader):
+            conn: Connection = Connection(writer)
+            for round_index in range(1, 4):
+                assert conn.send_message("PLAYER_JOINED", [f"p{round_index}"])
+            lines: List[bytes] = [
+                await asyncio.wait_for(reader.readline(), TIMEOUT) for _ in range(3)
+            ]
+            assert lines == [
+                b"PLAYER_JOINED;p1\n",
+                b"PLAYER_JOINED;p2\n",
+                b"PLAYER_JOINED;p3\n",
+            ]
+            # The writer task only lives while there is something to write
+            await asyncio.sleep(0)
+            assert conn.writer_task is None
+
+    asyncio.run(scenario())
+
+
+def test_peer_over_budget_is_evicted_without_holding_up_others() -> None:
+    async def scenario() -> None:
+        async with contextlib.AsyncExitStack() as stack:
+            slow_writer, _ = await stack.enter_async_context(connected_streams())
+            fast_writer, fast_reader = await stack.enter_async_context(
+                connected_streams()
+            )
+            slow: Connection = Connection(slow_writer, max_pending_bytes=64 * 1024)
+            fast: Connection = Connection(fast_writer)
+            clients: ClientManager = ClientManager(
+                {slow_writer: slow, fast_writer: fast}
+            )
+            clients.add_client(slow_writer, "slow")
+            clients.add_client(fast_writer, "fast")
+
+            # The slow peer never reads, so its backlog grows past the budget
+            chunk: bytes = b"x" * 64 * 1024
+            for _ in range(1000):
+                if not slow.send(chunk):
+                    break
+                await asyncio.sleep(0)
+            assert slow.is_closed
+
+            clients.broadcast("PLAYER_LEFT", "slow")
+            line: bytes = await asyncio.wait_for(fast_reader.readline(), TIMEOUT)
+            assert line == b"PLAYER_LEFT;slow\n"
+            assert not fast.is_closed
+
+    asyncio.run(scenario())
+
+
+def test_batch_sends_a_burst_in_one_write() -> None:
+    async def scenario() -> None:
+        async with connected_streams() as (writer, reader):
+            conn: Connection = Connection(writer)
+            clients: ClientManager = ClientManager({writer: conn})
+            clients.add_client(writer, "alice")
+            writes: List[List[bytes]] = []
+            write_through = writer.writelines
+
+            def writelines(chunks: List[bytes]) -> None:
+                writes.append(list(chunks))
+                write_through(chunks)
+
+            writer.writelines = writelines  # type: ignore[method-assign]
+
+            with clients.batch():
+                clients.broadcast("ANSWER_CORRECT", 1)
+                clients.broadcast("SCORES", "alice", ("alice", 1, 2))
+                clients.broadcast("GAME_OVER", "alice")
+                # Corked: queued, but nothing is being written yet
+                await asyncio.sleep(0)
+                assert conn.writer_task is None
+                assert len(conn.pending) == 3
+            assert not conn.is_corked
+
+            lines: List[bytes] = [
+                await asyncio.wait_for(reader.readline(), TIMEOUT) for _ in range(3)
+            ]
+            assert lines == [
+                b"ANSWER_CORRECT;1\n",
+                b"SCORES;alice;alice,1,2\n",
+                b"GAME_OVER;alice\n",
+            ]
+            assert writes == [lines]
+
+    asyncio.run(scenario())
@@ -0,0 +1,189 @@
+import random
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+import helpers  # noqa: F401
+import scoring
+from client_manager import ClientManager
+from exceptions import WrongStateError
+from game import Game, GameState
+from player_manager import MAX_WA_STREAK, Player
+from question_manager import Question
+
+QUESTION = Question(1, 2, "+", 3)
+RACE_LENGTH = 8
+
+# (nickname, answer or None to leave the room)
+Event = Tuple[str, Optional[int]]
+
+
+class ReferenceMatch:
+    """The rules as they were before answers were graded on arrival.
+
+    Answers were only kept until the window closed, then every qualified
+    player was graded in registration order; a player who left was
+    disqualified and not graded at all.
+    """
+
+    def __init__(self, nicknames: List[str]):
+        self.positions: Dict[str, int] = dict.fromkeys(nicknames, 1)
+        self.diff_points: Dict[str, int] = dict.fromkeys(nicknames, 0)
+        self.streaks: Dict[str, int] = dict.fromkeys(nicknames, 0)
+        self.disqualified: Dict[str, bool] = dict.fromkeys(nicknames, False)
+
+    def move(self, nickname: str, points: int) -> None:
+        position: int = max(1, self.positions[nickname] + points)
+        self.diff_points[nickname] += position - self.positions[nickname]
+        self.positions[nickname] = position
+
+    def play_round(self, events: List[Event]) -> str:
+        for nickname in self.positions:
+            if not self.disqualified[nickname]:
+                self.diff_points[nickname] = 0
+        answers: Dict[str, int] = {}
+        for nickname, answer in events:
+            if answer is None:
+                self.disqualified[nickname] = True
+            else:
+                answers.setdefault(nickname, answer)
+
+        fastest: Optional[str] = None
+        bonus: int = 0
+        arrival: List[str] = list(answers)
+        for nickname in self.positions:
+            if self.disqualified[nickname]:
+                continue
+            if answers.get(nickname) == QUESTION.answer:
+                self.move(nickname, 1)
+                self.streaks[nickname] = 0
+                if fastest is None or arrival.index(nickname) < arrival.index(
+                    fastest
+                ):
+                    fastest = nickname
+            else:
+                self.move(nickname, -1)
+                self.streaks[nickname] += 1
+                bonus += 1
+        if fastest is not None:
+            self.move(fastest, bonus)
+        for nickname, streak in self.streaks.items():
+            if streak >= MAX_WA_STREAK:
+                self.disqualified[nickname] = True
+        return fastest or ""
+
+    def is_over(self) -> bool:
+        qualified: List[str] = [
+            nickname for nickname, out in self.disqualified.items() if not out
+        ]
+        return not qualified or any(
+            self.positions[nickname] >= RACE_LENGTH for nickname in qualified
+        )
+
+
+def random_round(rng: random.Random, game: Game) -> List[Event]:
+    """Some players answer, right or wrong; some leave, answered or not."""
+    events: List[Event] = []
+    for player in game.player_manager.get_qualified_players():
+        choice: float = rng.random()
+        if choice < 0.4:
+            events.append((player.nickname, QUESTION.answer))
+        elif choice < 0.8:
+            events.append((player.nickname, QUESTION.answer + 1))
+        if rng.random() < 0.1:
+            events.append((player.nickname, None))
+    rng.shuffle(events)
+    # A player's answer comes before their leaving, if both happen
+    events.sort(key=lambda event: event[1] is None)
+    return events
+
+
+@pytest.mark.parametrize(
+    "use_score_board",
+    [
+        False,
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                not scoring.is_available(), reason="NumPy is not installed"
+            ),
+        ),
+    ],
+)
+def test_matches_follow_the_rules_of_grading_at_window_close(
+    use_score_board: bool,
+) -> None:
+    rng: random.Random = random.Random(2024)
+    for _ in range(300):
+        game: Game = Game(
+            1, 6, RACE_LENGTH, ClientManager({}), use_score_board=use_score_board
+        )
+        nicknames: List[str] = [f"p{index}" for index in range(rng.randint(2, 6))]
+        for nickname in nicknames:
+            game.handle_registration(nickname)
+        game.state = GameState.PROCESSING
+        reference: ReferenceMatch = ReferenceMatch(nicknames)
+
+        while game.is_playing():
+            players: Dict[str, Player] = dict(game.player_manager.players)
+            game.player_manager.start_round()
+            game.open_answer_window(QUESTION)
+            events: List[Event] = random_round(rng, game)
+            for nickname, answer in events:
+                if answer is None:
+                    game.handle_disconnection(nickname)
+                else:
+                    game.handle_answer(nickname, answer)
+            game.finish_round(QUESTION)
+            fastest: str = reference.play_round(events)
+
+            assert {
+                nickname: (player.diff_points, player.position)
+                for nickname, player in players.items()
+            } == {
+                nickname: (reference.diff_points[nickname], position)
+                for nickname, position in reference.positions.items()
+            }
+            assert game.is_playing() != reference.is_over()
+            if game.is_playing():
+                assert game.fastest_nickname == fastest
+
+
+def test_only_the_first_answer_counts() -> None:
+    game: Game = Game(1, 4, RACE_LENGTH, ClientManager({}))
+    for nickname in ("alice", "bob"):
+        game.handle_registration(nickname)
+    game.state = GameState.PROCESSING
+    game.open_answer_window(QUESTION)
+
+    game.handle_answer("alice", QUESTION.answer + 1)
+    with pytest.raises(WrongStateError, match="Already answered."):
+        game.handle_answer("alice", QUESTION.answer)
+    alice: Player = game.player_manager.players["alice"]
+    assert (alice.position, alice.wa_streak) == (1, 1)
+    assert game.correct_players == []
+
+
+def test_correct_answers_keep_their_arrival_order() -> None:
+    game: Game = Game(1, 4, RACE_LENGTH, ClientManager({}))
+    for nickname in ("alice", "bob", "carol"):
+        game.handle_registration(nickname)
+    game.state = GameState.PROCESSING
+    game.open_answer_window(QUESTION)
+
+    for nickname in ("carol", "alice", "bob"):
+        game.handle_answer(nickname, QUESTION.answer)
+    assert [player.nickname for player in game.correct_players] == [
+        "carol",
+        "alice",
+        "bob",
+    ]
+    # Graded on arrival, but nobody is told before the window closes
+    assert game.results == [
+        ("carol", "ANSWER_CORRECT"),
+        ("alice", "ANSWER_CORRECT"),
+        ("bob", "ANSWER_CORRECT"),
+    ]
+    game.finish_round(QUESTION)
+    assert game.results == []
+    assert game.fastest_nickname == "carol"
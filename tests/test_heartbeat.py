@@ -0,0 +1,68 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Tuple
+
+from helpers import TextClient, running_server, server
+import heartbeat
+
+INTERVAL = 0.05
+TIMEOUT = 0.3
+
+
+@contextlib.asynccontextmanager
+async def heartbeat_server() -> AsyncIterator[Tuple[server.Server, int]]:
+    async with running_server() as (state, port):
+        task: asyncio.Task = asyncio.create_task(
+            heartbeat.run(state.connections, INTERVAL, TIMEOUT)
+        )
+        try:
+            yield state, port
+        finally:
+            task.cancel()
+
+
+async def heartbeat_client(port: int) -> TextClient:
+    client: TextClient = await TextClient.connect(port)
+    await client.send("HELLO", "heartbeat")
+    assert await client.receive() == ("HELLO", ["heartbeat"])
+    return client
+
+
+def test_silent_peer_is_evicted_and_a_live_one_kept() -> None:
+    async def scenario() -> None:
+        async with heartbeat_server() as (state, port):
+            silent: TextClient = await heartbeat_client(port)
+            live: TextClient = await heartbeat_client(port)
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            deadline: float = loop.time() + 3 * TIMEOUT
+            while loop.time() < deadline:
+                command, args = await live.receive()
+                assert command == "PING"
+                await live.send("PONG", *args)
+
+            # The silent peer got pings, then the connection was dropped
+            assert (await silent.receive())[0] == "PING"
+            command = "PING"
+            while command == "PING":
+                command, _ = await silent.receive()
+            assert command == ""
+            # Each PONG gave the live peer a round-trip time
+            assert any(
+                conn.rtt is not None and conn.rtt < TIMEOUT
+                for conn in state.connections.values()
+            )
+            silent.close()
+            live.close()
+
+    asyncio.run(scenario())
+
+
+def test_server_answers_pings() -> None:
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            client: TextClient = await TextClient.connect(port)
+            await client.send("PING", 12345)
+            assert await client.receive() == ("PONG", ["12345"])
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from helpers import TextClient, running_server, server
+
+IDLE_TIMEOUT = 0.3
+
+
+@pytest.fixture(autouse=True)
+def short_idle_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, "IDLE_TIMEOUT", IDLE_TIMEOUT)
+
+
+def test_silent_client_is_disconnected() -> None:
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            client: TextClient = await TextClient.connect(port)
+            assert await client.receive() == ("DISCONNECTED", ["Idle for too long."])
+            assert await client.receive() == ("", [])
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_silent_spectator_is_kept() -> None:
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            player: TextClient = await TextClient.connect(port)
+            await player.send("ROOM_CREATE")
+            (room_id,) = await player.receive_until("ROOM_CREATED")
+            await player.send("REGISTER", "alice")
+            await player.receive_until("REGISTRATION_SUCCESS")
+
+            spectator: TextClient = await TextClient.connect(port)
+            await spectator.send("SPECTATE", room_id)
+            await spectator.receive_until("SPECTATING")
+            # The catch-up snapshot of a room in its lobby is only SCORES
+            await spectator.receive_until("SCORES")
+            with pytest.raises(asyncio.TimeoutError):
+                # Nothing arrives, the spectator is neither told off nor closed
+                await spectator.receive(timeout=IDLE_TIMEOUT * 4)
+
+            # ...and still watches the match start
+            await player.send("READY")
+            assert await spectator.receive_until("GAME_STARTING")
+            player.close()
+            spectator.close()
+
+    asyncio.run(scenario())
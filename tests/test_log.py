@@ -0,0 +1,78 @@
+import logging
+from typing import List, Tuple
+
+import pytest
+
+import helpers  # noqa: F401
+import log
+from log import CategoryLogger
+
+
+class Clock:
+    def __init__(self):
+        self.now: float = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Unformattable:
+    def __str__(self) -> str:
+        raise AssertionError("A dropped message was formatted")
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock: Clock = Clock()
+    monkeypatch.setattr(log.time, "monotonic", clock)
+    return clock
+
+
+def make_logger(
+    sample_every: int = 1, rate_limit: float = 0.0
+) -> Tuple[CategoryLogger, List[str]]:
+    """A logger outside the registry and the messages it lets through."""
+    logger: CategoryLogger = CategoryLogger("test", logging.INFO)
+    logger.propagate = False
+    logger.configure(sample_every, rate_limit)
+    messages: List[str] = []
+    handler: logging.Handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    logger.addHandler(handler)
+    return logger, messages
+
+
+def test_sampling_keeps_one_in_n_without_formatting_the_rest() -> None:
+    logger, messages = make_logger(sample_every=3)
+    for index in range(1, 10):
+        logger.info("%s", index if index % 3 == 0 else Unformattable())
+    assert messages == ["3", "6", "9"]
+    assert logger.dropped == 6
+
+
+def test_rate_limit_reports_what_it_dropped(clock: Clock) -> None:
+    logger, messages = make_logger(rate_limit=2)
+    for index in range(5):
+        logger.info("%s", index if index < 2 else Unformattable())
+    assert messages == ["0", "1"]
+
+    clock.now += 0.5
+    logger.info("later")
+    assert messages[2:] == ["[Log] Rate limit dropped 3 test messages.", "later"]
+    assert logger.dropped == 3
+
+
+def test_disabled_levels_are_not_counted() -> None:
+    logger, messages = make_logger(sample_every=2)
+    logger.debug("%s", Unformattable())
+    logger.info("first")
+    logger.info("second")
+    assert messages == ["second"]
+    assert logger.seen == 2
+
+
+def test_categories_get_their_own_loggers() -> None:
+    for category in log.CATEGORIES:
+        assert isinstance(log.get_logger(category), CategoryLogger)
+    # Other loggers are left alone
+    assert type(logging.getLogger("game")) is logging.Logger
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import sys
+import types
+
+import pytest
+
+import helpers  # noqa: F401
+from loops import new_event_loop
+
+
+def run_on(loop: asyncio.AbstractEventLoop) -> int:
+    async def answer() -> int:
+        await asyncio.sleep(0)
+        return 42
+
+    try:
+        return loop.run_until_complete(answer())
+    finally:
+        loop.close()
+
+
+def test_asyncio_loop() -> None:
+    loop: asyncio.AbstractEventLoop = new_event_loop("asyncio")
+    assert isinstance(loop, asyncio.BaseEventLoop)
+    assert run_on(loop) == 42
+
+
+@pytest.mark.parametrize("name,warns", [("uvloop", True), ("auto", False)])
+def test_missing_uvloop_falls_back_to_asyncio(
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+    name: str,
+    warns: bool,
+) -> None:
+    # A None entry makes the import fail as if uvloop was not installed
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    with caplog.at_level(logging.WARNING, "loops"):
+        loop: asyncio.AbstractEventLoop = new_event_loop(name)
+    assert isinstance(loop, asyncio.BaseEventLoop)
+    assert run_on(loop) == 42
+    assert bool(caplog.records) == warns
+
+
+@pytest.mark.parametrize("name", ["uvloop", "auto"])
+def test_installed_uvloop_is_used(monkeypatch: pytest.MonkeyPatch, name: str) -> None:
+    marker: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+    uvloop: types.ModuleType = types.ModuleType("uvloop")
+    uvloop.new_event_loop = lambda: marker  # type: ignore[attr-defined]
+    monkeypatch.setitem(sys.modules, "uvloop", uvloop)
+    try:
+        assert new_event_loop(name) is marker
+    finally:
+        marker.close()
+
+
+def test_unknown_loop() -> None:
+    with pytest.raises(ValueError):
+        new_event_loop("trio")
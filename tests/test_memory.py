@@ -0,0 +1,49 @@
+import asyncio
+import sys
+
+import pytest
+
+from helpers import TextClient, connected_streams, running_server, server
+from connection import Connection
+from player_manager import Player
+
+
+def test_players_and_connections_have_no_dict() -> None:
+    with pytest.raises(AttributeError):
+        Player("alice").__dict__
+
+    async def scenario() -> None:
+        async with connected_streams() as (writer, _):
+            conn: Connection = Connection(writer)
+            with pytest.raises(AttributeError):
+                conn.__dict__
+            # An idle connection holds no writer task
+            assert conn.writer_task is None
+
+    asyncio.run(scenario())
+
+
+def test_a_registered_nickname_is_one_shared_string() -> None:
+    async def scenario() -> None:
+        async with running_server() as (state, port):
+            client: TextClient = await TextClient.connect(port)
+            await client.send("REGISTER", "alice")
+            await client.receive_until("REGISTRATION_SUCCESS")
+            game: server.Game = next(iter(state.room_manager.rooms.values()))
+            (nickname,) = game.clients.clients.values()
+            assert nickname is sys.intern("alice")
+            assert next(iter(game.player_manager.players)) is nickname
+            assert game.player_manager.players[nickname].nickname is nickname
+            assert next(iter(game.player_manager.qualified)) is nickname
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_buffer_limits_are_applied() -> None:
+    async def scenario() -> None:
+        async with connected_streams() as (writer, _):
+            Connection(writer, write_high_water=8192, write_low_water=1024)
+            assert writer.transport.get_write_buffer_limits() == (1024, 8192)
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from helpers import TIMEOUT, TextClient, running_server
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch: pytest.MonkeyPatch) -> List[metrics.Metric]:
+    registry: List[metrics.Metric] = []
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def test_exposition_format(registry: List[metrics.Metric]) -> None:
+    sent: Counter = Counter("sent_total", "Messages sent.", "command")
+    sent.inc(label="SCORES")
+    sent.inc(2, label="QUESTION")
+    rooms: Gauge = Gauge("rooms", "Open rooms.")
+    rooms.set_function(lambda: 3)
+    drain: Histogram = Histogram("drain_seconds", "Drain time.", [0.1, 1.0])
+    drain.observe(0.05)
+    drain.observe(0.5)
+    drain.observe(5.0)
+
+    assert metrics.expose().splitlines() == [
+        "# HELP sent_total Messages sent.",
+        "# TYPE sent_total counter",
+        'sent_total{command="QUESTION"} 2',
+        'sent_total{command="SCORES"} 1',
+        "# HELP rooms Open rooms.",
+        "# TYPE rooms gauge",
+        "rooms 3",
+        "# HELP drain_seconds Drain time.",
+        "# TYPE drain_seconds histogram",
+        'drain_seconds_bucket{le="0.1"} 1',
+        'drain_seconds_bucket{le="1.0"} 2',
+        'drain_seconds_bucket{le="+Inf"} 3',
+        "drain_seconds_sum 5.55",
+        "drain_seconds_count 3",
+    ]
+
+
+async def scrape(port: int, path: str) -> List[str]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    response: bytes = await asyncio.wait_for(reader.read(), TIMEOUT)
+    writer.close()
+    return response.decode().splitlines()
+
+
+def test_scrape_counts_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The lag monitor belongs to this test's event loop
+    monkeypatch.setattr(metrics, "_monitor_task", None)
+
+    async def scenario() -> None:
+        endpoint: asyncio.AbstractServer = await metrics.start_metrics_server(
+            "127.0.0.1", 0
+        )
+        port: int = endpoint.sockets[0].getsockname()[1]
+        try:
+            before: float = metrics.MESSAGES_RECEIVED.values.get("ROOM_LIST", 0)
+            async with running_server() as (_, game_port):
+                client: TextClient = await TextClient.connect(game_port)
+                await client.send("ROOM_LIST")
+                await client.receive_until("ROOM_LIST")
+                client.close()
+
+            response: List[str] = await scrape(port, "/metrics")
+            assert response[0] == "HTTP/1.0 200 OK"
+            assert (
+                f'racing_arena_messages_received_total{{command="ROOM_LIST"}} '
+                f"{before + 1}" in response
+            )
+            assert (await scrape(port, "/other"))[0] == "HTTP/1.0 404 Not Found"
+        finally:
+            endpoint.close()
+            metrics._monitor_task.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+import helpers  # noqa: F401
+import scoring
+from exceptions import RegistrationError
+from player_manager import MAX_WA_STREAK, Player, PlayerManager
+
+RACE_LENGTH = 5
+
+
+def indexes(players: PlayerManager) -> Tuple[Any, ...]:
+    return (
+        players.ready_count,
+        # qualified players are kept in registration order
+        list(players.qualified),
+        sorted(players.disqualified),
+        sorted(players.streak_candidates),
+        sorted(players.finishers),
+    )
+
+
+@pytest.mark.parametrize(
+    "use_board",
+    [
+        False,
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                not scoring.is_available(), reason="NumPy is not installed"
+            ),
+        ),
+    ],
+)
+def test_indexes_match_a_rebuild(use_board: bool) -> None:
+    rng: random.Random = random.Random(16)
+    players: PlayerManager = PlayerManager(20, RACE_LENGTH, use_board)
+    names: List[str] = [f"p{index}" for index in range(20)]
+    for _ in range(2000):
+        nickname: str = rng.choice(names)
+        player: Optional[Player] = players.players.get(nickname)
+        action: float = rng.random()
+        if player is None:
+            players.register_player(nickname)
+        elif action < 0.1:
+            players.remove_player(nickname)
+        elif action < 0.3:
+            players.set_ready(nickname, rng.random() < 0.5)
+        elif action < 0.6:
+            players.move_player(player, rng.randint(-3, 3))
+        elif action < 0.8:
+            players.record_answer(player, rng.random() < 0.5)
+        elif action < 0.85:
+            players.disqualify(player)
+        elif action < 0.9:
+            players.record_missed_answers(players.get_qualified_players())
+        elif action < 0.95:
+            players.disqualify_players()
+        else:
+            players.start_round()
+
+        expected: Tuple[Any, ...] = indexes(players)
+        players.reindex()
+        assert indexes(players) == expected
+
+
+def test_disqualify_players_takes_the_streak_candidates() -> None:
+    players: PlayerManager = PlayerManager(4, RACE_LENGTH)
+    for nickname in ("alice", "bob"):
+        players.register_player(nickname)
+    alice: Player = players.players["alice"]
+    for _ in range(MAX_WA_STREAK):
+        players.record_answer(alice, False)
+    assert players.disqualify_players() == [alice]
+    assert players.disqualify_players() == []
+    assert list(players.qualified) == ["bob"]
+
+
+def test_registration_checks() -> None:
+    players: PlayerManager = PlayerManager(2)
+    players.register_player("alice")
+    errors: Dict[str, str] = {
+        "alice": "Nickname already exists.",
+        "no spaces": "Invalid nickname.",
+        "x" * 11: "Invalid nickname.",
+    }
+    for nickname, message in errors.items():
+        with pytest.raises(RegistrationError, match=message):
+            players.register_player(nickname)
+    players.register_player("bob")
+    with pytest.raises(RegistrationError, match="Lobby is full."):
+        players.register_player("carol")
@@ -0,0 +1,93 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from helpers import TIMEOUT, TextClient, running_server
+from protocol import BINARY, SCHEMAS, TEXT, Codec, ProtocolError, parse_schema
+
+SAMPLES = {"s": "alice", "q": -(2**40), "i": 7, "?": True}
+
+
+def sample_args(command: str) -> List[Any]:
+    """One value per fixed field, then two items of the repeated part."""
+    fixed, rest = parse_schema(SCHEMAS[command][1])
+    args: List[Any] = [SAMPLES[code] for code in fixed]
+    for _ in range(2):
+        if isinstance(rest, tuple):
+            args.append(tuple(SAMPLES[code] for code in rest))
+        elif rest is not None:
+            args.append(SAMPLES[rest])
+    return args
+
+
+@pytest.mark.parametrize("codec", [TEXT, BINARY], ids=lambda codec: codec.name)
+@pytest.mark.parametrize("command", sorted(SCHEMAS))
+def test_every_message_survives_a_round_trip(codec: Codec, command: str) -> None:
+    args: List[Any] = sample_args(command)
+    assert codec.decode(codec.encode(command, args)) == (command, args)
+
+
+@pytest.mark.parametrize("codec", [TEXT, BINARY], ids=lambda codec: codec.name)
+def test_empty_and_short_messages_survive_a_round_trip(codec: Codec) -> None:
+    assert codec.decode(codec.encode("ROOM_LIST", [])) == ("ROOM_LIST", [])
+    assert codec.decode(codec.encode("SCORES", ["bob"])) == ("SCORES", ["bob"])
+    # Fixed fields may be left out from the end
+    assert codec.decode(codec.encode("ROOM_CREATE", [])) == ("ROOM_CREATE", [])
+
+
+def test_text_passes_unknown_commands_and_extra_arguments_on() -> None:
+    assert TEXT.decode(b"dance;fast\n") == ("DANCE", ["fast"])
+    assert TEXT.decode(b"REGISTER;alice;bob\n") == ("REGISTER", ["alice", "bob"])
+
+
+def test_bad_arguments_name_their_command() -> None:
+    with pytest.raises(ProtocolError) as text_error:
+        TEXT.decode(b"ANSWER;seven\n")
+    assert text_error.value.command == "ANSWER"
+
+    frame: bytes = BINARY.encode("ANSWER", [7])
+    with pytest.raises(ProtocolError) as binary_error:
+        BINARY.decode(frame[:-1])
+    assert binary_error.value.command == "ANSWER"
+
+    with pytest.raises(ProtocolError):
+        BINARY.decode(b"\x00\x00\x00\x05\xff")
+
+
+def test_frames_are_read_one_at_a_time() -> None:
+    async def scenario() -> None:
+        reader: asyncio.StreamReader = asyncio.StreamReader()
+        first: bytes = BINARY.encode("REGISTER", ["alice"])
+        second: bytes = BINARY.encode("ANSWER", [42])
+        reader.feed_data(first + second)
+        reader.feed_eof()
+        assert await BINARY.read_frame(reader) == first
+        assert await BINARY.read_frame(reader) == second
+        # A clean end of stream reads as an empty frame, like readline
+        assert await BINARY.read_frame(reader) == b""
+
+        with pytest.raises(ProtocolError):
+            reader = asyncio.StreamReader()
+            reader.feed_data(BINARY.encode("REGISTER", ["x" * 100]))
+            await BINARY.read_frame(reader, max_size=64)
+
+    asyncio.run(scenario())
+
+
+def test_hello_switches_the_connection_to_binary() -> None:
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            client: TextClient = await TextClient.connect(port)
+            await client.send("HELLO", "binary", "teleport")
+            # The reply still comes in text and names what was agreed on
+            assert await client.receive() == ("HELLO", ["binary"])
+
+            client.writer.write(BINARY.encode("REGISTER", ["alice"]))
+            frame: bytes = await asyncio.wait_for(
+                BINARY.read_frame(client.reader), TIMEOUT
+            )
+            assert BINARY.decode(frame) == ("REGISTRATION_SUCCESS", [("alice", False)])
+            client.close()
+
+    asyncio.run(scenario())
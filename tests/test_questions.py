@@ -0,0 +1,77 @@
+import random
+from typing import List, Tuple
+
+import pytest
+
+import helpers  # noqa: F401
+import question_manager
+from question_manager import (
+    HIGH,
+    LOW,
+    Question,
+    QuestionManager,
+    QuestionPool,
+    compute_answer,
+    generate_batch_python,
+)
+
+
+def fields(questions: List[Question]) -> List[Tuple[int, str, int, int]]:
+    return [
+        (q.first_number, q.operator, q.second_number, q.answer) for q in questions
+    ]
+
+
+def check(questions: List[Question]) -> None:
+    for question in questions:
+        assert LOW <= question.first_number <= HIGH
+        assert LOW <= question.second_number <= HIGH
+        assert question.answer == compute_answer(
+            question.first_number, question.second_number, question.operator
+        )
+        if question.operator == "/":
+            # Division questions come out even
+            assert question.first_number % question.second_number == 0
+
+
+def test_batches_hold_valid_questions() -> None:
+    pool: QuestionPool = QuestionPool(0, batch_size=2000)
+    questions: List[Question] = pool.generate_batch()
+    assert len(questions) == 2000
+    assert {q.operator for q in questions} == set(question_manager.OPERATORS)
+    check(questions)
+    check(generate_batch_python(random.Random(0), 2000))
+
+
+def test_seeded_rooms_repeat_their_questions() -> None:
+    first: QuestionManager = QuestionManager(7)
+    second: QuestionManager = QuestionManager(7)
+    other: QuestionManager = QuestionManager(8)
+    # Past a refill, which runs in the background
+    count: int = 3 * question_manager.ROOM_BATCH_SIZE
+    taken: List[Question] = [first.generate_question() for _ in range(count)]
+    assert fields(taken) == fields([second.generate_question() for _ in range(count)])
+    assert fields(taken) != fields([other.generate_question() for _ in range(count)])
+
+
+def test_skip_picks_up_where_a_room_left_off() -> None:
+    played: QuestionManager = QuestionManager(7)
+    questions: List[Question] = [played.generate_question() for _ in range(5)]
+    restored: QuestionManager = QuestionManager(7)
+    restored.skip(3)
+    assert restored.taken == 3
+    assert fields([restored.generate_question() for _ in range(2)]) == fields(
+        questions[3:]
+    )
+
+
+def test_unseeded_rooms_share_a_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(question_manager, "_shared_pool", None)
+    assert QuestionManager().pool is QuestionManager().pool
+    assert QuestionManager(1).pool is not QuestionManager(1).pool
+
+
+def test_a_dry_pool_generates_in_the_caller() -> None:
+    pool: QuestionPool = QuestionPool(0, batch_size=4, low_water=1)
+    taken: List[Question] = [pool.take() for _ in range(10)]
+    check(taken)
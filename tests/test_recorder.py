@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+from typing import List
+
+import pytest
+
+from helpers import TextClient, running_server
+import recorder
+from protocol import BINARY
+from recorder import Record, Recorder
+
+
+def record_session(path: str, seed: int) -> None:
+    async def scenario() -> None:
+        log: Recorder = Recorder(path, {"question_seed": seed})
+        log.open(1, BINARY.codec_id)
+        log.inbound(1, 0, b"REGISTER;alice\n")
+        log.outbound(1, 2, "ROOM_JOINED", [2])
+        log.broadcast(2, 3, "PLAYER_LEFT", ["bob"])
+        log.close_connection(1, 2)
+        log.close()
+
+    asyncio.run(scenario())
+
+
+def test_records_read_back_as_written(tmp_path: os.PathLike) -> None:
+    path: str = os.path.join(tmp_path, "session.log")
+    record_session(path, 1)
+    (records,) = recorder.read_recordings(path)
+    assert json.loads(records[0].payload) == {"question_seed": 1}
+    assert [
+        (recorder.KIND_NAMES[r.kind], r.room_id, r.conn_id) for r in records[1:]
+    ] == [
+        ("OPEN", 0, 1),
+        ("INBOUND", 0, 1),
+        ("OUTBOUND", 2, 1),
+        ("BROADCAST", 2, 3),
+        ("CLOSE", 2, 1),
+    ]
+    assert records[2].payload == b"REGISTER;alice\n"
+    assert BINARY.decode(records[4].payload) == ("PLAYER_LEFT", ["bob"])
+    timestamps: List[float] = [r.timestamp for r in records]
+    assert timestamps == sorted(timestamps)
+
+
+def test_appended_recordings_stay_apart(tmp_path: os.PathLike) -> None:
+    path: str = os.path.join(tmp_path, "session.log")
+    record_session(path, 1)
+    # A crash cut this one short in the middle of a record
+    record_session(path, 2)
+    with open(path, "rb+") as file:
+        file.truncate(os.path.getsize(path) - 3)
+    record_session(path, 3)
+
+    recordings: List[List[Record]] = recorder.read_recordings(path)
+    assert [json.loads(r[0].payload)["question_seed"] for r in recordings] == [1, 2, 3]
+    assert [len(r) for r in recordings] == [6, 5, 6]
+
+
+def test_not_a_session_log(tmp_path: os.PathLike) -> None:
+    path: str = os.path.join(tmp_path, "other.log")
+    with open(path, "wb") as file:
+        file.write(b"hello")
+    with pytest.raises(ValueError):
+        recorder.read_recordings(path)
+
+
+def test_server_records_a_conversation(
+    tmp_path: os.PathLike, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path: str = os.path.join(tmp_path, "session.log")
+
+    async def scenario() -> None:
+        monkeypatch.setattr(recorder, "RECORDER", Recorder(path, {}))
+        async with running_server() as (state, port):
+            client: TextClient = await TextClient.connect(port)
+            await client.send("ROOM_LIST")
+            await client.receive_until("ROOM_LIST")
+            client.close()
+            while state.connections:
+                await asyncio.sleep(0.01)
+        recorder.RECORDER.close()
+
+    asyncio.run(scenario())
+    (records,) = recorder.read_recordings(path)
+    assert [recorder.KIND_NAMES[r.kind] for r in records] == [
+        "CONFIG",
+        "OPEN",
+        "INBOUND",
+        "OUTBOUND",
+        "CLOSE",
+    ]
+    assert records[2].payload == b"ROOM_LIST\n"
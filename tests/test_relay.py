@@ -0,0 +1,93 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, List, Tuple
+
+import pytest
+
+from helpers import TextClient, running_server, server
+import mux
+from relay import Relay
+from relay_link import RelayedConnection, relay_link_handler
+
+
+def test_link_frames_survive_a_round_trip() -> None:
+    async def scenario() -> None:
+        reader: asyncio.StreamReader = asyncio.StreamReader()
+        reader.feed_data(mux.pack(mux.OPEN, 7, b"127.0.0.1:5000"))
+        reader.feed_data(mux.pack(mux.CLOSE, 7))
+        reader.feed_data(mux.pack_broadcast([1, 2, 3], b"PLAYER_LEFT;bob\n"))
+        reader.feed_eof()
+
+        assert await mux.read_frame(reader) == (mux.OPEN, 7, b"127.0.0.1:5000")
+        assert await mux.read_frame(reader) == (mux.CLOSE, 7, b"")
+        frame: mux.Frame = await mux.read_frame(reader)
+        assert frame.kind == mux.BROADCAST
+        assert mux.unpack_broadcast(frame.payload) == (
+            (1, 2, 3),
+            b"PLAYER_LEFT;bob\n",
+        )
+        assert await mux.read_frame(reader) is None
+
+        reader = asyncio.StreamReader()
+        reader.feed_data(mux.HEADER.pack(2, mux.DATA, 1))
+        with pytest.raises(ValueError):
+            await mux.read_frame(reader)
+
+    asyncio.run(scenario())
+
+
+@contextlib.asynccontextmanager
+async def relayed_server() -> AsyncIterator[Tuple[server.Server, int]]:
+    """A server behind a relay of one link, and the relay's client port."""
+    async with running_server() as (state, _):
+        links: asyncio.AbstractServer = await asyncio.start_server(
+            relay_link_handler(state.handle_conversation, server.READ_LIMIT),
+            "127.0.0.1",
+            0,
+        )
+        relay: Relay = Relay(("127.0.0.1", links.sockets[0].getsockname()[1]), 1)
+        relay.start()
+        clients: asyncio.AbstractServer = await asyncio.start_server(
+            relay.handle_client, "127.0.0.1", 0
+        )
+        while relay.links[0] is None:
+            await asyncio.sleep(0.01)
+        try:
+            yield state, clients.sockets[0].getsockname()[1]
+        finally:
+            clients.close()
+            for task in relay.link_tasks:
+                task.cancel()
+            await asyncio.gather(*relay.link_tasks, return_exceptions=True)
+            links.close()
+
+
+def test_clients_play_through_the_relay() -> None:
+    async def scenario() -> None:
+        async with relayed_server() as (state, port):
+            players: List[TextClient] = []
+            for nickname in ("alice", "bob"):
+                player: TextClient = await TextClient.connect(port)
+                await player.send("REGISTER", nickname)
+                await player.receive_until("REGISTRATION_SUCCESS")
+                players.append(player)
+            alice, bob = players
+            assert await alice.receive_until("PLAYER_JOINED") == ["bob"]
+            assert all(
+                isinstance(conn, RelayedConnection)
+                for conn in state.connections.values()
+            )
+
+            # Broadcasts cross the link once and reach every recipient
+            await alice.send("READY")
+            await bob.send("READY")
+            assert await alice.receive_until("GAME_STARTING")
+            assert await bob.receive_until("GAME_STARTING")
+
+            alice.close()
+            assert await bob.receive_until("PLAYER_LEFT") == ["alice"]
+            bob.close()
+            while state.connections:
+                await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
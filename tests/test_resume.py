@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+from typing import Any, Iterator, List, Tuple
+
+import pytest
+
+from helpers import ROOT, TIMEOUT, TextClient, running_server, server
+
+# After the server's directory, the modules both sides share are the same
+sys.path.append(os.path.join(ROOT, "client"))
+
+import connection_manager  # noqa: E402
+from connection_manager import ConnectionManager  # noqa: E402
+
+
+@pytest.fixture
+def manager(monkeypatch: pytest.MonkeyPatch) -> Iterator[ConnectionManager]:
+    # Slow enough to see the server hold the seat first
+    monkeypatch.setattr(connection_manager, "RECONNECT_DELAY", 0.5)
+    # The manager shares its state between instances, start from scratch
+    monkeypatch.setattr(ConnectionManager, "_shared_state", {})
+    manager: ConnectionManager = ConnectionManager()
+    yield manager
+    if manager.thread is not None:
+        manager.stop()
+
+
+async def receive_until(manager: ConnectionManager, command: str) -> List[Any]:
+    """Arguments of the next message named command the manager passed on."""
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    while True:
+        message: Tuple[str, List[Any]] = await loop.run_in_executor(
+            None, manager.messages.get, True, TIMEOUT
+        )
+        if message[0] == command:
+            return message[1]
+
+
+async def wait_for_hello(manager: ConnectionManager) -> None:
+    while "resume" not in manager.features:
+        await asyncio.sleep(0.01)
+
+
+async def wait_for_resuming(manager: ConnectionManager) -> None:
+    while not manager.is_resuming:
+        await asyncio.sleep(0.01)
+
+
+async def wait_for_suspension(game: server.Game, nickname: str) -> None:
+    while nickname not in [s.nickname for s in game.clients.suspended.values()]:
+        await asyncio.sleep(0.01)
+
+
+def test_dropped_player_resumes_and_gets_what_was_missed(
+    manager: ConnectionManager,
+) -> None:
+    async def scenario() -> None:
+        async with running_server() as (state, port):
+            manager.start("127.0.0.1", port, heartbeat_interval=0)
+            await asyncio.wait_for(wait_for_hello(manager), TIMEOUT)
+            manager.submit(manager.send_registration("alice"))
+            await receive_until(manager, "SESSION")
+            others: List[TextClient] = []
+            for nickname in ("bob", "carol"):
+                client: TextClient = await TextClient.connect(port)
+                await client.send("REGISTER", nickname)
+                await client.receive_until("REGISTRATION_SUCCESS")
+                others.append(client)
+            bob, carol = others
+
+            manager.submit(manager.send_ready_signal())
+            await bob.send("READY")
+            await carol.send("READY")
+            await receive_until(manager, "GAME_STARTING")
+            game: server.Game = next(iter(state.room_manager.rooms.values()))
+
+            manager.loop.call_soon_threadsafe(manager.writer.transport.abort)
+            await asyncio.wait_for(wait_for_suspension(game, "alice"), TIMEOUT)
+            # Sent while alice is away, kept for her
+            carol.close()
+            # Asked for while reconnecting, held until the seat is back
+            await asyncio.wait_for(wait_for_resuming(manager), TIMEOUT)
+            manager.submit(manager.request_scores_keyframe())
+
+            assert await receive_until(manager, "RESUMED") == [game.room_id, "alice"]
+            assert await receive_until(manager, "PLAYER_LEFT") == ["carol"]
+            await receive_until(manager, "SCORES")
+            (session,) = game.clients.sessions.values()
+            assert manager.received == session.sent
+            assert "alice" in game.clients.clients.values()
+            bob.close()
+
+    asyncio.run(scenario())
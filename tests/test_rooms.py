@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from helpers import TextClient, running_server
+from exceptions import RoomError
+from game import Game
+from room_manager import RoomManager
+
+
+def test_rooms_are_listed_and_kept_apart() -> None:
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            alice: TextClient = await TextClient.connect(port)
+            await alice.send("ROOM_CREATE", 2, 3)
+            (first_room,) = await alice.receive_until("ROOM_CREATED")
+            await alice.send("REGISTER", "alice")
+            await alice.receive_until("REGISTRATION_SUCCESS")
+
+            bob: TextClient = await TextClient.connect(port)
+            await bob.send("ROOM_CREATE")
+            (second_room,) = await bob.receive_until("ROOM_CREATED")
+            await bob.send("REGISTER", "bob")
+            await bob.receive_until("REGISTRATION_SUCCESS")
+            await bob.send("ROOM_LIST")
+            assert await bob.receive_until("ROOM_LIST") == [
+                f"{first_room},1,2,False",
+                f"{second_room},1,4,False",
+            ]
+
+            # The same nickname is free in another room
+            carol: TextClient = await TextClient.connect(port)
+            await carol.send("ROOM_JOIN", first_room)
+            await carol.receive_until("ROOM_JOINED")
+            await carol.send("REGISTER", "bob")
+            await carol.receive_until("REGISTRATION_SUCCESS")
+            assert await alice.receive() == ("PLAYER_JOINED", ["bob"])
+            with pytest.raises(asyncio.TimeoutError):
+                await bob.receive(timeout=0.2)
+            for client in (alice, bob, carol):
+                client.close()
+
+    asyncio.run(scenario())
+
+
+def test_room_manager_fills_the_oldest_lobby_and_caps_rooms() -> None:
+    async def scenario() -> None:
+        room_manager: RoomManager = RoomManager({}, 4, 3, 2)
+        with pytest.raises(RoomError):
+            room_manager.create_room(max_players=5)
+        first: Game = room_manager.create_room(max_players=1)
+        # Nobody joined it, so it makes way for the next one
+        first = room_manager.create_room(max_players=1)
+        assert list(room_manager.rooms) == [first.room_id]
+        first.clients.members.add("alice's socket")
+        second: Game = room_manager.create_room()
+        second.clients.members.add("bob's socket")
+        with pytest.raises(RoomError, match="Too many rooms."):
+            room_manager.create_room()
+
+        first.handle_registration("alice")
+        # The first room is full, so the next player goes to the second
+        assert room_manager.find_open_room() is second
+
+    asyncio.run(scenario())
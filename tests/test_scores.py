@@ -0,0 +1,95 @@
+import asyncio
+import contextlib
+from typing import List
+
+import pytest
+
+from helpers import TIMEOUT, connected_streams
+import scoring
+from client_manager import ClientManager
+from connection import Connection
+from game import Game
+from player_manager import PlayerManager
+
+BOARD = pytest.mark.parametrize(
+    "use_board",
+    [
+        False,
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                not scoring.is_available(), reason="NumPy is not installed"
+            ),
+        ),
+    ],
+)
+
+
+@BOARD
+def test_delta_names_only_the_players_who_changed(use_board: bool) -> None:
+    players: PlayerManager = PlayerManager(4, 10, use_board)
+    for nickname in ("alice", "bob", "carol"):
+        players.register_player(nickname)
+    # Everybody starts where clients assume they do
+    assert players.pack_players_round_delta() == []
+
+    players.start_round()
+    players.move_player(players.players["alice"], 2)
+    players.move_player(players.players["bob"], -1)  # already at the start
+    assert players.pack_players_round_delta() == [("alice", 2, 3)]
+    assert players.pack_players_round_delta() == []
+
+    players.start_round()
+    assert players.pack_players_round_delta() == [("alice", 0, 3)]
+
+    # After a keyframe the delta is taken against the defaults again
+    players.forget_sent_scores()
+    assert players.pack_players_round_delta() == [("alice", 0, 3)]
+
+
+def test_delta_clients_get_keyframes_every_interval() -> None:
+    async def scenario() -> None:
+        async with contextlib.AsyncExitStack() as stack:
+            plain_writer, plain_reader = await stack.enter_async_context(
+                connected_streams()
+            )
+            delta_writer, delta_reader = await stack.enter_async_context(
+                connected_streams()
+            )
+            delta: Connection = Connection(delta_writer)
+            delta.features.add("delta")
+            clients: ClientManager = ClientManager(
+                {plain_writer: Connection(plain_writer), delta_writer: delta}
+            )
+            game: Game = Game(1, 4, 10, clients, scores_keyframe_interval=2)
+            for writer, nickname in ((plain_writer, "alice"), (delta_writer, "bob")):
+                game.handle_registration(nickname)
+                clients.add_client(writer, nickname)
+
+            async def receive(reader: asyncio.StreamReader) -> bytes:
+                return await asyncio.wait_for(reader.readline(), TIMEOUT)
+
+            game.round_index = 1
+            game.player_manager.move_player(game.player_manager.players["bob"], 1)
+            game.fastest_nickname = "bob"
+            game.send_scores()
+            assert await receive(plain_reader) == b"SCORES;bob;alice,0,1;bob,1,2\n"
+            assert await receive(delta_reader) == b"SCORES_DELTA;bob;bob,1,2\n"
+
+            game.round_index = 2
+            game.send_scores()
+            assert await receive(plain_reader) == b"SCORES;bob;alice,0,1;bob,1,2\n"
+            assert await receive(delta_reader) == b"SCORES;bob;alice,0,1;bob,1,2\n"
+
+            # With nobody left who needs full rosters, deltas go out alone
+            clients.remove_client(plain_writer)
+            game.round_index = 3
+            game.player_manager.move_player(game.player_manager.players["alice"], 1)
+            game.send_scores()
+            assert await receive(delta_reader) == b"SCORES_DELTA;bob;alice,1,2\n"
+            lines: List[bytes] = []
+            with contextlib.suppress(asyncio.TimeoutError):
+                lines.append(await asyncio.wait_for(plain_reader.readline(), 0.1))
+            assert lines == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import random
+from typing import Any, List, Tuple
+
+import pytest
+
+import helpers  # noqa: F401
+
+pytest.importorskip("numpy")
+
+from client_manager import ClientManager  # noqa: E402
+from game import Game, GameState  # noqa: E402
+from player_manager import PlayerManager  # noqa: E402
+from question_manager import Question  # noqa: E402
+from scoring import ScoreBoard  # noqa: E402
+
+QUESTION = Question(1, 2, "+", 3)
+
+
+def play(use_score_board: bool, seed: int) -> List[Tuple[Any, ...]]:
+    """Every broadcast of a seeded match, with the players' final state."""
+    rng: random.Random = random.Random(seed)
+    clients: ClientManager = ClientManager({})
+    sent: List[Tuple[Any, ...]] = []
+    # Nobody is connected, note what would have been broadcast instead
+    clients.broadcast = lambda *args, **kwargs: sent.append(args)
+    game: Game = Game(1, 64, 60, clients, use_score_board=use_score_board)
+    for index in range(rng.randint(2, 64)):
+        game.handle_registration(f"p{index}")
+    game.state = GameState.PROCESSING
+    players: PlayerManager = game.player_manager
+    while game.is_playing():
+        game.round_index += 1
+        players.start_round()
+        game.open_answer_window(QUESTION)
+        for player in players.get_qualified_players():
+            choice: float = rng.random()
+            if choice < 0.05:
+                game.handle_disconnection(player.nickname)
+            elif choice < 0.5:
+                game.handle_answer(player.nickname, QUESTION.answer)
+            elif choice < 0.8:
+                game.handle_answer(player.nickname, QUESTION.answer + 1)
+        game.finish_round(QUESTION)
+    sent.append(
+        tuple(
+            (p.nickname, p.position, p.diff_points, p.wa_streak, p.is_disqualified)
+            for p in players.players.values()
+        )
+    )
+    return sent
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_board_scores_like_players(seed: int) -> None:
+    assert play(True, seed) == play(False, seed)
+
+
+def test_board_grows_past_its_capacity() -> None:
+    board: ScoreBoard = ScoreBoard(capacity=2)
+    slots: List[int] = [board.add(f"p{index}") for index in range(5)]
+    assert slots == [0, 1, 2, 3, 4]
+    board.positions[3] = 4
+    board.remove(1)
+    board.grow()
+    assert board.pack_round_info() == [
+        ("p0", 0, 1),
+        ("p2", 0, 1),
+        ("p3", 0, 4),
+        ("p4", 0, 1),
+    ]
@@ -0,0 +1,97 @@
+import asyncio
+from typing import List, Tuple
+
+import pytest
+
+from helpers import TextClient, running_server, server
+from sessions import Session, new_token, token_room_id
+
+
+def test_missed_messages_come_from_the_history() -> None:
+    session: Session = Session(new_token(1), "alice", 3)
+    for index in range(5):
+        session.record("PLAYER_JOINED", (f"p{index}",))
+    assert session.missed(5) == []
+    assert session.missed(3) == [("PLAYER_JOINED", ("p3",)), ("PLAYER_JOINED", ("p4",))]
+    assert [args for _, args in session.missed(2)] == [("p2",), ("p3",), ("p4",)]
+    # Older than the history, or more than was ever sent
+    assert session.missed(1) is None
+    assert session.missed(6) is None
+
+
+def test_tokens_name_their_room() -> None:
+    token: str = new_token(42)
+    assert token_room_id(token) == 42
+    assert token != new_token(42)
+    assert token_room_id("nonsense") is None
+
+
+async def start_match(port: int) -> Tuple[TextClient, TextClient, str]:
+    """alice, who can resume, and bob in a match; and alice's session token."""
+    alice: TextClient = await TextClient.connect(port)
+    await alice.send("HELLO", "resume")
+    await alice.receive_until("HELLO")
+    await alice.send("REGISTER", "alice")
+    (token,) = await alice.receive_until("SESSION")
+    bob: TextClient = await TextClient.connect(port)
+    await bob.send("REGISTER", "bob")
+    await bob.receive_until("REGISTRATION_SUCCESS")
+    await alice.send("READY")
+    await bob.send("READY")
+    await alice.receive_until("GAME_STARTING")
+    return alice, bob, token
+
+
+def test_resume_too_far_behind_gets_the_match_state(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(server, "RESUME_HISTORY", 1)
+
+    async def scenario() -> None:
+        async with running_server() as (state, port):
+            alice, bob, token = await start_match(port)
+            alice.close()
+            game: server.Game = next(iter(state.room_manager.rooms.values()))
+            while not game.clients.suspended:
+                await asyncio.sleep(0.01)
+
+            again: TextClient = await TextClient.connect(port)
+            await again.send("RESUME", token, 0)
+            messages: List[Tuple[str, List[str]]] = [
+                await again.receive() for _ in range(3)
+            ]
+            assert messages == [
+                ("RESUMED", [str(game.room_id), "alice"]),
+                ("GAME_STARTING", ["3", "30", "10"]),
+                ("SCORES", ["", "alice,0,1", "bob,0,1"]),
+            ]
+            # Counting goes on from the client's number
+            (session,) = game.clients.sessions.values()
+            assert session.sent == 2
+            again.close()
+            bob.close()
+
+    asyncio.run(scenario())
+
+
+def test_seat_is_given_up_after_the_grace_period(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(server, "RESUME_GRACE", 0.2)
+
+    async def scenario() -> None:
+        async with running_server() as (_, port):
+            alice, bob, token = await start_match(port)
+            alice.close()
+            assert await bob.receive_until("PLAYER_LEFT") == ["alice"]
+
+            again: TextClient = await TextClient.connect(port)
+            await again.send("RESUME", token, 0)
+            assert await again.receive() == (
+                "RESUME_FAILURE",
+                ["Unknown or expired session."],
+            )
+            again.close()
+            bob.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+@pytest.mark.parametrize("name", ["protocol.py", "loops.py"])
+def test_client_copy_matches_server(name: str) -> None:
+    # The client is packaged on its own, so it carries copies of these
+    with open(os.path.join(ROOT, "server", name), "rb") as file:
+        server: bytes = file.read()
+    with open(os.path.join(ROOT, "client", name), "rb") as file:
+        client: bytes = file.read()
+    assert client == server, f"client/{name} differs from server/{name}"
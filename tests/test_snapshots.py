@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+import pytest
+
+import helpers  # noqa: F401
+import snapshots
+from client_manager import ClientManager
+from game import Game, GameState
+from snapshots import PlayerState, RoomState, SnapshotStore
+
+
+def room_state(room_id: int, round_index: int) -> RoomState:
+    return RoomState(
+        room_id,
+        4,
+        10,
+        30,
+        10,
+        10,
+        7,
+        round_index,
+        round_index,
+        True,
+        1.7e9,
+        (6, "*", 7, 42),
+        1,
+        "",
+        [
+            PlayerState("alice", 3, 1, 0, True, False, 1.7e9, False, 0),
+            PlayerState("bob", 1, 0, 2, True, False, None, True, -1),
+        ],
+    )
+
+
+def test_records_pack_and_unpack() -> None:
+    state: RoomState = room_state(3, 2)
+    assert snapshots.unpack_room(3, snapshots.pack_room(state)) == state
+    lobby: RoomState = state._replace(is_answering=False, question=None)
+    assert snapshots.unpack_room(3, snapshots.pack_room(lobby)) == lobby
+
+
+def test_store_keeps_the_latest_record_of_open_rooms(
+    tmp_path: os.PathLike, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path: str = os.path.join(tmp_path, "rooms.snapshot")
+    store: SnapshotStore = SnapshotStore(path)
+    for round_index in range(1, 4):
+        store.save(room_state(1, round_index))
+        store.save(room_state(2, round_index))
+    store.close_room(2)
+    store.save(room_state(3, 1))
+    store.close()
+    assert snapshots.read_snapshot(path) == {1: room_state(1, 3), 3: room_state(3, 1)}
+
+    # A record cut short by a crash is dropped, the ones before it stay
+    with open(path, "ab") as file:
+        file.write(snapshots.pack_record(room_state(1, 4))[:-5])
+    assert snapshots.read_snapshot(path) == {1: room_state(1, 3), 3: room_state(3, 1)}
+
+    # Compaction keeps exactly the latest records
+    monkeypatch.setattr(snapshots, "COMPACT_MIN_BYTES", 0)
+    store = snapshots.start_snapshots(path, snapshots.read_snapshot(path))
+    size: int = os.path.getsize(path)
+    for _ in range(snapshots.COMPACT_FACTOR * 2):
+        store.save(room_state(3, 2))
+    snapshots.stop_snapshots()
+    assert os.path.getsize(path) <= snapshots.COMPACT_FACTOR * size
+    assert snapshots.read_snapshot(path) == {1: room_state(1, 3), 3: room_state(3, 2)}
+    assert snapshots.read_snapshot(os.path.join(tmp_path, "missing")) == {}
+
+
+def test_restored_match_picks_up_where_it_was() -> None:
+    async def scenario() -> None:
+        game: Game = Game(5, 4, 10, ClientManager({}), question_seed=3)
+        for nickname in ("alice", "bob", "carol", "dave"):
+            game.handle_registration(nickname)
+            game.player_manager.set_ready(nickname, True)
+        game.state = GameState.PROCESSING
+        for _ in range(2):
+            game.round_index += 1
+            game.player_manager.start_round()
+            game.open_answer_window(game.question_manager.generate_question())
+            game.handle_answer("bob", game.question.answer)
+            game.handle_answer("alice", game.question.answer)
+            game.handle_answer("carol", game.question.answer + 1)
+            if game.round_index == 1:
+                game.finish_round(game.question)
+        game.deadline = asyncio.get_running_loop().time() + 20
+        saved: RoomState = game.pack_state()
+
+        restored: Game = Game(5, 4, 10, ClientManager({}), question_seed=3)
+        restored.restore(snapshots.unpack_room(5, snapshots.pack_room(saved)))
+        try:
+            again: RoomState = restored.pack_state()
+            assert again._replace(deadline=0) == saved._replace(deadline=0)
+            assert again.deadline == pytest.approx(saved.deadline, abs=1)
+            assert restored.results == [
+                ("carol", "ANSWER_INCORRECT"),
+                ("bob", "ANSWER_CORRECT"),
+                ("alice", "ANSWER_CORRECT"),
+            ]
+            assert sorted(restored.results) == sorted(game.results)
+            assert list(restored.awaiting) == ["dave"]
+            # Players come back under their nicknames
+            assert restored.vacant == {"alice", "bob", "carol", "dave"}
+            restored.handle_registration("alice")
+            assert "alice" not in restored.vacant
+            # The seeded questions continue from the same place
+            assert vars(restored.question_manager.generate_question()) == vars(
+                game.question_manager.generate_question()
+            )
+        finally:
+            restored.loop_task.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import asyncio
+from typing import List
+
+from helpers import TextClient, running_server, server
+
+
+async def start_match(port: int) -> List[TextClient]:
+    players: List[TextClient] = []
+    for nickname in ("alice", "bob"):
+        player: TextClient = await TextClient.connect(port)
+        await player.send("REGISTER", nickname)
+        await player.receive_until("REGISTRATION_SUCCESS")
+        players.append(player)
+    for player in players:
+        await player.send("READY")
+    for player in players:
+        await player.receive_until("QUESTION")
+    return players
+
+
+def test_spectator_catches_up_and_follows_the_match() -> None:
+    async def scenario() -> None:
+        async with running_server(
+            answer_time_limit=60, prepare_time_limit=0
+        ) as (state, port):
+            alice, bob = await start_match(port)
+            (room_id,) = state.room_manager.rooms
+
+            spectator: TextClient = await TextClient.connect(port)
+            await spectator.send("SPECTATE", room_id)
+            assert await spectator.receive() == ("SPECTATING", [str(room_id)])
+            assert (await spectator.receive())[0] == "GAME_STARTING"
+            command, args = await spectator.receive()
+            assert (command, args[0]) == ("QUESTION", "1")
+            assert await spectator.receive() == (
+                "SCORES",
+                ["", "alice,0,1", "bob,0,1"],
+            )
+
+            # Round results, but not the players' own replies
+            await alice.send("ANSWER", 0)
+            await bob.send("ANSWER", 0)
+            command, _ = await spectator.receive()
+            assert command in ("SCORES", "SCORES_DELTA")
+            assert (await spectator.receive())[0] == "QUESTION"
+
+            # A player leaving is not news to spectators, the next SCORES is
+            alice.close()
+            await bob.receive_until("PLAYER_LEFT")
+            bob.close()
+            command, _ = await spectator.receive()
+            assert command in ("SCORES", "SCORES_DELTA", "GAME_OVER")
+            spectator.close()
+
+    asyncio.run(scenario())
+
+
+def test_players_cannot_spectate() -> None:
+    async def scenario() -> None:
+        async with running_server() as (state, port):
+            player: TextClient = await TextClient.connect(port)
+            await player.send("REGISTER", "alice")
+            await player.receive_until("REGISTRATION_SUCCESS")
+            (room_id,) = state.room_manager.rooms
+            await player.send("SPECTATE", room_id)
+            assert await player.receive() == (
+                "ROOM_FAILURE",
+                ["Players cannot spectate."],
+            )
+            player.close()
+
+    asyncio.run(scenario())
+
+
+def test_spectator_who_registers_becomes_a_player() -> None:
+    async def scenario() -> None:
+        async with running_server() as (state, port):
+            player: TextClient = await TextClient.connect(port)
+            await player.send("ROOM_CREATE")
+            (room_id,) = await player.receive_until("ROOM_CREATED")
+
+            spectator: TextClient = await TextClient.connect(port)
+            await spectator.send("SPECTATE", room_id)
+            await spectator.receive_until("SCORES")
+            await spectator.send("REGISTER", "carol")
+            await spectator.receive_until("REGISTRATION_SUCCESS")
+            game: server.Game = state.room_manager.rooms[int(room_id)]
+            assert not game.clients.spectators
+            assert list(game.clients.clients.values()) == ["carol"]
+            player.close()
+            spectator.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import asyncio
+import os
+from typing import Any, List
+
+import pytest
+
+import helpers  # noqa: F401
+import upgrade
+from exceptions import RoomError
+from game import Game
+from room_manager import RoomManager
+
+
+def test_restore_room_keeps_open_room() -> None:
+    async def scenario() -> None:
+        room_manager: RoomManager = RoomManager({}, 4, 3, 10)
+        game: Game = room_manager.create_room()
+        with pytest.raises(RoomError):
+            room_manager.restore_room(game.pack_state())
+        assert room_manager.rooms[game.room_id] is game
+
+    asyncio.run(scenario())
+
+
+def test_successor_gets_every_socket_and_room_id(tmp_path) -> None:
+    async def scenario() -> None:
+        path: str = os.path.join(tmp_path, "upgrade.sock")
+        # One listener on two sockets, as a name resolving to IPv4 and IPv6 has
+        clients: asyncio.AbstractServer = await asyncio.start_server(
+            lambda reader, writer: None, ["127.0.0.1", "127.0.0.2"], 0
+        )
+        addresses: List[Any] = [sock.getsockname() for sock in clients.sockets]
+        waiting: asyncio.Task = asyncio.create_task(upgrade.wait_for_successor(path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        taking_over = asyncio.get_running_loop().run_in_executor(
+            None, upgrade.take_over, path
+        )
+        successor = await waiting
+        upgrade.hand_over(successor, {"clients": [clients]}, 7)
+        control, listeners, next_room_id = await taking_over
+        assert [sock.getsockname() for sock in listeners["clients"]] == addresses
+        assert next_room_id == 7
+        for sock in (control, successor, *listeners["clients"]):
+            sock.close()
+
+    asyncio.run(scenario())
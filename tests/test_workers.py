@@ -0,0 +1,79 @@
+import asyncio
+import contextlib
+import socket
+from typing import AsyncIterator, List, Tuple
+
+import pytest
+
+from helpers import TextClient, server
+import workers
+from workers import WorkerRouter
+
+
+def test_room_ids_name_their_worker() -> None:
+    router: WorkerRouter = WorkerRouter(1, 3, [], socket.socket())
+    assert (router.first_room_id(), router.room_id_step()) == (2, 3)
+    assert [router.owner(room_id) for room_id in range(1, 7)] == [0, 1, 2, 0, 1, 2]
+    assert router.owns(5) and not router.owns(6)
+    router.inbox.close()
+
+
+@contextlib.asynccontextmanager
+async def two_workers() -> AsyncIterator[Tuple[List[server.Server], int]]:
+    """Two workers in this process, with clients accepted by the first."""
+    pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(2)]
+    outboxes: List[socket.socket] = [send_end for send_end, _ in pairs]
+    states: List[server.Server] = []
+    for worker_id in range(2):
+        router: WorkerRouter = WorkerRouter(
+            worker_id, 2, outboxes, pairs[worker_id][1]
+        )
+        state: server.Server = server.Server(4, 3, server.MAX_ROOMS, router=router)
+        router.start(asyncio.get_running_loop(), state.handle_conversation)
+        states.append(state)
+    listener: asyncio.AbstractServer = await asyncio.start_server(
+        states[0].handle_conversation, "127.0.0.1", 0
+    )
+    try:
+        yield states, listener.sockets[0].getsockname()[1]
+    finally:
+        listener.close()
+        for pair in pairs:
+            asyncio.get_running_loop().remove_reader(pair[1].fileno())
+            for sock in pair:
+                sock.close()
+
+
+def test_joining_another_workers_room_moves_the_connection() -> None:
+    async def scenario() -> None:
+        async with two_workers() as (states, port):
+            room_id: int = states[1].room_manager.create_room().room_id
+            assert room_id == 2
+            client: TextClient = await TextClient.connect(port)
+            # Both requests reach the first worker; the second one goes along
+            # unread with the connection
+            client.writer.write(f"ROOM_JOIN;{room_id}\nREGISTER;alice\n".encode())
+            assert await client.receive() == ("ROOM_JOINED", [str(room_id)])
+            assert await client.receive() == ("REGISTRATION_SUCCESS", ["alice,False"])
+            assert not states[0].connections
+            assert len(states[1].connections) == 1
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_connection_that_cannot_move_is_closed(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(workers, "MAX_HANDOFF_SIZE", 4)
+
+    async def scenario() -> None:
+        async with two_workers() as (states, port):
+            room_id: int = states[1].room_manager.create_room().room_id
+            client: TextClient = await TextClient.connect(port)
+            await client.send("ROOM_JOIN", room_id)
+            assert await client.receive() == ("", [])
+            assert not states[0].connections and not states[1].connections
+            client.close()
+
+    asyncio.run(scenario())
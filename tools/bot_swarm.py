@@ -0,0 +1,447 @@
+"""Headless load generator for the Racing Arena server.
+
+Opens many bot connections against a local server and plays real matches
+with them: each group of --room-size bots creates or joins a room,
+registers, readies up and answers every question after a think time, right
+or wrong at the configured ratio. --spectators more connections per room
+watch the matches with SPECTATE. At the end it reports connection setup
+rate, broadcast fan-out latency, how far spectators trail the players,
+answer-to-result latency percentiles and error counts.
+
+    python tools/bot_swarm.py --bots 2000 --room-size 10 --think-time exp:2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from loops import LOOP_CHOICES, new_event_loop  # noqa: E402
+from protocol import BINARY, TEXT, Codec, ProtocolError  # noqa: E402
+
+OPERATIONS: Dict[str, Callable[[int, int], int]] = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a // b,
+    "%": lambda a, b: a % b,
+}
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """const:S, uniform:LO,HI or exp:MEAN, all in seconds."""
+    kind, _, params = spec.partition(":")
+    values: List[float] = [float(value) for value in params.split(",") if value]
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise argparse.ArgumentTypeError(f"Invalid distribution: {spec}")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered: List[float] = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": at(0.50) * 1000,
+        "p90_ms": at(0.90) * 1000,
+        "p99_ms": at(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.connect_times: List[float] = []
+        self.first_connect: Optional[float] = None
+        self.last_connect: Optional[float] = None
+        self.answer_latencies: List[float] = []
+        # (room id, match, round index, command) -> arrival time at each bot
+        self.broadcasts: DefaultDict[Tuple[int, int, int, str], List[float]] = (
+            defaultdict(list)
+        )
+        # same keys, arrival time at each spectator
+        self.spectated: DefaultDict[Tuple[int, int, int, str], List[float]] = (
+            defaultdict(list)
+        )
+        self.errors: DefaultDict[str, int] = defaultdict(int)
+        self.matches: int = 0
+
+    def connected(self, started: float, finished: float) -> None:
+        self.connect_times.append(finished - started)
+        self.first_connect = min(self.first_connect or started, started)
+        self.last_connect = max(self.last_connect or finished, finished)
+
+    def report(self) -> Dict[str, Any]:
+        fan_out: Dict[str, List[float]] = defaultdict(list)
+        for (_, _, _, command), arrivals in self.broadcasts.items():
+            if len(arrivals) > 1:
+                fan_out[command].append(max(arrivals) - min(arrivals))
+        # How long after the first player each spectator got a broadcast
+        spectator_lag: List[float] = [
+            arrival - min(self.broadcasts[key])
+            for key, arrivals in self.spectated.items()
+            if key in self.broadcasts
+            for arrival in arrivals
+        ]
+        setup_window: float = (
+            (self.last_connect - self.first_connect) if self.connect_times else 0.0
+        )
+        return {
+            "connections": len(self.connect_times),
+            "connect_rate_per_s": (
+                len(self.connect_times) / setup_window if setup_window > 0 else None
+            ),
+            "connect_latency": percentiles(self.connect_times),
+            "broadcast_fan_out": {
+                command: percentiles(spreads) for command, spreads in fan_out.items()
+            },
+            "spectator_lag": percentiles(spectator_lag),
+            "answer_to_result": percentiles(self.answer_latencies),
+            "matches_finished": self.matches,
+            "errors": dict(self.errors),
+        }
+
+
+class Group:
+    """Bots sharing one room. The first bot creates it, the rest join."""
+
+    def __init__(self, size: int):
+        self.size: int = size
+        self.room: "asyncio.Future[int]" = asyncio.get_running_loop().create_future()
+        # match number -> bots registered for it
+        self.registered: DefaultDict[int, int] = defaultdict(int)
+        self.all_registered: DefaultDict[int, asyncio.Event] = defaultdict(
+            asyncio.Event
+        )
+
+    async def wait_for_players(self, match: int) -> None:
+        # A lone ready player would start the race before the others register
+        self.registered[match] += 1
+        if self.registered[match] == self.size:
+            self.all_registered[match].set()
+        await self.all_registered[match].wait()
+
+
+class Bot:
+    def __init__(
+        self,
+        index: int,
+        args: argparse.Namespace,
+        stats: Stats,
+        group: Group,
+        is_leader: bool,
+    ):
+        self.nickname: str = f"b{index}"
+        self.args: argparse.Namespace = args
+        self.stats: Stats = stats
+        self.group: Group = group
+        self.is_leader: bool = is_leader
+        self.rng: random.Random = random.Random(args.seed * 1_000_003 + index)
+        self.codec: Codec = TEXT
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.room_id: int = 0
+        self.match: int = 0
+        self.round_index: int = 0
+        self.answered_at: Optional[float] = None
+        self.is_disqualified: bool = False
+
+    async def send(self, command: str, *args: Any) -> None:
+        self.writer.write(self.codec.encode(command, args))
+        await self.writer.drain()
+
+    async def receive(self) -> Tuple[str, List[Any]]:
+        while True:
+            data: bytes = await asyncio.wait_for(
+                self.codec.read_frame(self.reader), self.args.idle_timeout
+            )
+            if not data:
+                raise ConnectionResetError("Server closed the connection.")
+            command, args = self.codec.decode(data)
+            if command != "PING":
+                break
+            await self.send("PONG", *args)
+        if command == "DISCONNECTED":
+            self.stats.errors[command] += 1
+            raise ConnectionResetError(f"Disconnected by server: {args[0]}")
+        return command, args
+
+    async def connect(self) -> None:
+        started: float = time.perf_counter()
+        self.reader, self.writer = await asyncio.open_connection(
+            self.args.host, self.args.port
+        )
+        features: List[str] = []
+        if self.args.binary:
+            features.append("binary")
+        if self.args.delta:
+            features.append("delta")
+        if self.args.heartbeat:
+            features.append("heartbeat")
+        if features:
+            await self.send("HELLO", *features)
+            _, accepted = TEXT.decode(await self.reader.readline())
+            if "binary" in accepted:
+                self.codec = BINARY
+        self.stats.connected(started, time.perf_counter())
+
+    async def enter_room(self) -> None:
+        if self.is_leader:
+            await self.send("ROOM_CREATE", self.args.room_size, self.args.race_length)
+            command, args = await self.receive()
+            if command != "ROOM_CREATED":
+                self.group.room.set_exception(RuntimeError(f"{command} {args}"))
+                raise RuntimeError(f"Could not create a room: {command} {args}")
+            self.group.room.set_result(args[0])
+        self.room_id = await self.group.room
+        if not self.is_leader:
+            await self.send("ROOM_JOIN", self.room_id)
+            command, args = await self.receive()
+            if command != "ROOM_JOINED":
+                raise RuntimeError(f"Could not join room {self.room_id}: {args}")
+
+    async def answer(self, question: List[Any]) -> None:
+        _, first_number, operator, second_number = question
+        await asyncio.sleep(self.args.think_time(self.rng))
+        answer: int = OPERATIONS[operator](first_number, second_number)
+        if self.rng.random() >= self.args.correct_ratio:
+            answer += 1
+        self.answered_at = time.perf_counter()
+        await self.send("ANSWER", answer)
+
+    async def register(self) -> None:
+        await self.send("REGISTER", self.nickname)
+        while True:
+            command, args = await self.receive()
+            if command == "REGISTRATION_SUCCESS":
+                return
+            if command == "REGISTRATION_FAILURE":
+                self.stats.errors[command] += 1
+                raise RuntimeError(f"Could not register: {args}")
+
+    def record_broadcast(self, command: str, now: float) -> None:
+        self.stats.broadcasts[
+            (self.room_id, self.match, self.round_index, command)
+        ].append(now)
+
+    async def play_match(self, match: int) -> None:
+        self.match = match
+        self.round_index = 0
+        await self.register()
+        await self.group.wait_for_players(match)
+        await self.send("READY")
+        self.is_disqualified = False
+        answer_task: Optional[asyncio.Task] = None
+        while True:
+            command, args = await self.receive()
+            now: float = time.perf_counter()
+            if command.endswith("_FAILURE"):
+                self.stats.errors[command] += 1
+            elif command == "QUESTION":
+                self.round_index = args[0]
+                self.record_broadcast(command, now)
+                if not self.is_disqualified:
+                    answer_task = asyncio.create_task(self.answer(args))
+            elif command in ("ANSWER_CORRECT", "ANSWER_INCORRECT"):
+                if self.answered_at is not None:
+                    self.stats.answer_latencies.append(now - self.answered_at)
+                    self.answered_at = None
+            elif command in ("SCORES", "SCORES_DELTA", "DISQUALIFICATION"):
+                self.record_broadcast(
+                    "SCORES" if command == "SCORES_DELTA" else command, now
+                )
+                if command == "DISQUALIFICATION" and self.nickname in args:
+                    self.is_disqualified = True
+            elif command == "GAME_OVER":
+                self.record_broadcast(command, now)
+                if answer_task is not None:
+                    answer_task.cancel()
+                if self.is_leader:
+                    self.stats.matches += 1
+                return
+
+    async def play(self) -> None:
+        await self.connect()
+        await self.enter_room()
+        for match in range(self.args.matches):
+            await self.play_match(match)
+
+    async def run(self) -> None:
+        try:
+            await self.play()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.stats.errors[type(e).__name__] += 1
+        except asyncio.TimeoutError:
+            # The room went quiet, e.g. its game loop died
+            self.stats.errors["idle_timeout"] += 1
+        except ProtocolError:
+            self.stats.errors["ProtocolError"] += 1
+        except RuntimeError as e:
+            self.stats.errors["RuntimeError"] += 1
+            print(f"{self.nickname}: {e}", file=sys.stderr)
+        except OSError as e:
+            self.stats.errors[type(e).__name__] += 1
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+
+
+class Spectator(Bot):
+    """Watches a group's room instead of playing in it."""
+
+    async def play(self) -> None:
+        await self.connect()
+        self.room_id = await self.group.room
+        await self.send("SPECTATE", self.room_id)
+        command, args = await self.receive()
+        if command != "SPECTATING":
+            raise RuntimeError(f"Could not spectate room {self.room_id}: {args}")
+        # The catch-up snapshot of a lobby belongs to no round, skip it
+        is_watching: bool = False
+        while self.match < self.args.matches:
+            command, args = await self.receive()
+            now: float = time.perf_counter()
+            if command == "GAME_STARTING":
+                is_watching = True
+            elif not is_watching:
+                continue
+            elif command == "QUESTION":
+                self.round_index = args[0]
+                self.record_spectated(command, now)
+            elif command in ("SCORES", "SCORES_DELTA", "DISQUALIFICATION"):
+                self.record_spectated(
+                    "SCORES" if command == "SCORES_DELTA" else command, now
+                )
+            elif command == "GAME_OVER":
+                self.record_spectated(command, now)
+                self.match += 1
+                self.round_index = 0
+                is_watching = False
+
+    def record_spectated(self, command: str, now: float) -> None:
+        self.stats.spectated[
+            (self.room_id, self.match, self.round_index, command)
+        ].append(now)
+
+
+async def run_swarm(args: argparse.Namespace) -> Dict[str, Any]:
+    stats = Stats()
+    groups: List[Group] = [
+        Group(min(args.room_size, args.bots - start))
+        for start in range(0, args.bots, args.room_size)
+    ]
+    tasks: List[asyncio.Task] = []
+    for index in range(args.bots):
+        bot = Bot(
+            index,
+            args,
+            stats,
+            groups[index // args.room_size],
+            index % args.room_size == 0,
+        )
+        tasks.append(asyncio.create_task(bot.run()))
+        if args.connect_rate > 0:
+            await asyncio.sleep(1 / args.connect_rate)
+    for index in range(args.spectators * len(groups)):
+        spectator = Spectator(
+            args.bots + index, args, stats, groups[index % len(groups)], False
+        )
+        tasks.append(asyncio.create_task(spectator.run()))
+
+    started: float = time.perf_counter()
+    done, pending = await asyncio.wait(tasks, timeout=args.timeout)
+    for task in pending:
+        task.cancel()
+    stats.errors["timed_out_bots"] += len(pending)
+    report: Dict[str, Any] = stats.report()
+    report["elapsed_s"] = time.perf_counter() - started
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bot swarm for Racing Arena")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("-n", "--bots", type=int, default=100)
+    parser.add_argument(
+        "--room-size",
+        type=int,
+        default=10,
+        help="Bots per room; must not exceed the server's --players.",
+    )
+    parser.add_argument("--race-length", type=int, default=5)
+    parser.add_argument("--matches", type=int, default=1, help="Matches per bot.")
+    parser.add_argument(
+        "--spectators",
+        type=int,
+        default=0,
+        help="Connections per room that only watch, with SPECTATE.",
+    )
+    parser.add_argument(
+        "--correct-ratio",
+        type=float,
+        default=0.8,
+        help="Probability that a bot answers correctly.",
+    )
+    parser.add_argument(
+        "--think-time",
+        type=parse_distribution,
+        default=parse_distribution("uniform:0.5,2"),
+        help="Delay before answering: const:S, uniform:LO,HI or exp:MEAN (seconds).",
+    )
+    parser.add_argument(
+        "--connect-rate",
+        type=float,
+        default=0,
+        help="New connections per second, 0 for as fast as possible.",
+    )
+    parser.add_argument("--binary", action="store_true", help="Use binary framing.")
+    parser.add_argument("--delta", action="store_true", help="Use delta scores.")
+    parser.add_argument(
+        "--heartbeat", action="store_true", help="Answer the server's heartbeats."
+    )
+    parser.add_argument(
+        "--loop",
+        choices=LOOP_CHOICES,
+        default="asyncio",
+        help="Event loop driving the bots. Default to asyncio.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=60,
+        help="Give up on a bot that hears nothing from the server for this long.",
+    )
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    loop: asyncio.AbstractEventLoop = new_event_loop(args.loop)
+    try:
+        report: Dict[str, Any] = loop.run_until_complete(run_swarm(args))
+    finally:
+        loop.close()
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
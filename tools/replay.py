@@ -0,0 +1,307 @@
+"""Replay a session log recorded with server.py --record.
+
+Builds a fresh server with the recorded settings and question seed, and
+feeds it every recorded connection's frames at their recorded times, so
+the rooms replay the same matches. A frame sent to a room is timed from the
+room's last broadcast before it rather than from the start, so that timer
+drift does not move an answer to the other side of a window's close. The
+messages the server sends are counted and compared with the recorded ones.
+
+By default the replay runs in real time. With --max-speed it runs on an
+event loop whose clock jumps straight to the next timer whenever there is
+nothing to do, so the prepare delays, answer windows and the gaps between
+frames take no time and the whole session replays as fast as the server
+can process it.
+
+    python tools/replay.py session.log --max-speed
+"""
+import argparse
+import asyncio
+import json
+import os
+import selectors
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, DefaultDict, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import log  # noqa: E402
+import metrics  # noqa: E402
+import recorder  # noqa: E402
+import server  # noqa: E402
+from loops import LOOP_CHOICES, new_event_loop  # noqa: E402
+from protocol import BINARY, CODECS  # noqa: E402
+from recorder import Record  # noqa: E402
+
+# Fall back to the recorded time when a room takes this much longer than
+# recorded to make a broadcast, i.e. the replay diverged (seconds)
+ANCHOR_TIMEOUT = 5.0
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock only moves by skipping ahead to the next timer.
+
+    Processing takes no time on this clock, so a replay comes out the same
+    on every run. Only suited to in-memory streams: sockets are still
+    polled, but never waited for.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.now: float = 0.0
+        select = self._selector.select
+
+        def skip_ahead(
+            timeout: Optional[float] = None,
+        ) -> List[Tuple[selectors.SelectorKey, int]]:
+            events = select(0)
+            if not events and timeout:
+                self.now += timeout
+            return events
+
+        self._selector.select = skip_ahead
+
+    def time(self) -> float:
+        return self.now
+
+
+class ReplayTransport:
+    def __init__(self):
+        self.is_aborted: bool = False
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def set_write_buffer_limits(self, high: int, low: int) -> None:
+        pass
+
+    def abort(self) -> None:
+        self.is_aborted = True
+
+
+class ReplayWriter:
+    """Stands in for a client socket, counting what the server writes."""
+
+    def __init__(self, conn_id: int):
+        self.transport: ReplayTransport = ReplayTransport()
+        self.peername: Tuple[str, int] = ("replay", conn_id)
+        self.bytes_written: int = 0
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self.peername if name == "peername" else default
+
+    def write(self, data: bytes) -> None:
+        self.bytes_written += len(data)
+
+    def writelines(self, chunks: List[bytes]) -> None:
+        self.bytes_written += sum(map(len, chunks))
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class BroadcastClock:
+    """Takes the recorder's place to note when the replayed rooms broadcast."""
+
+    def __init__(self):
+        self.times: DefaultDict[int, List[float]] = defaultdict(list)
+        self.changed: asyncio.Event = asyncio.Event()
+
+    def broadcast(
+        self, room_id: int, recipients: int, command: str, args: Sequence[Any]
+    ) -> None:
+        self.times[room_id].append(asyncio.get_running_loop().time())
+        self.changed.set()
+
+    def open(self, conn_id: int, codec_id: int) -> None:
+        pass
+
+    def inbound(self, conn_id: int, room_id: int, frame: bytes) -> None:
+        pass
+
+    def outbound(
+        self, conn_id: int, room_id: int, command: str, args: Sequence[Any]
+    ) -> None:
+        pass
+
+    def close_connection(self, conn_id: int, room_id: int) -> None:
+        pass
+
+    async def wait_for(self, room_id: int, count: int) -> Optional[float]:
+        """When the room made its count-th broadcast, None if it did not."""
+        try:
+            while len(self.times[room_id]) < count:
+                self.changed.clear()
+                await asyncio.wait_for(self.changed.wait(), ANCHOR_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        return self.times[room_id][count - 1]
+
+
+def recorded_messages(records: List[Record]) -> Counter:
+    # Same counting as metrics.MESSAGES_SENT: one per recipient
+    messages: Counter = Counter()
+    for record in records:
+        if record.kind == recorder.OUTBOUND:
+            messages[BINARY.decode(record.payload)[0]] += 1
+        elif record.kind == recorder.BROADCAST:
+            messages[BINARY.decode(record.payload)[0]] += record.conn_id
+    return messages
+
+
+async def replay(records: List[Record]) -> Dict[str, Any]:
+    config: Dict[str, Any] = json.loads(records[0].payload)
+    server.MAX_PENDING_BYTES = config["max_pending_bytes"]
+    server.MAX_SEND_LATENCY = config["max_send_latency"]
+    server.COMMAND_RATE = config["command_rate"]
+    server.COMMAND_BURST = config["command_burst"]
+    server.IDLE_TIMEOUT = config["idle_timeout"]
+    server.RESUME_GRACE = config["resume_grace"]
+    server.RESUME_HISTORY = config["resume_history"]
+    server.MAX_CONNECTIONS = 0
+    state = server.Server(
+        config["max_players"],
+        config["race_length"],
+        config["max_rooms"],
+        config["answer_time_limit"],
+        config["prepare_time_limit"],
+        None,
+        config["scores_keyframe_interval"],
+        config["question_seed"],
+    )
+    # Room ids, and with them the question seeds, follow the recorded worker
+    state.room_manager.next_room_id = config["first_room_id"]
+    state.room_manager.room_id_step = config["room_id_step"]
+
+    clock = BroadcastClock()
+    recorder.RECORDER = clock
+    # recorded broadcast times of each room so far
+    broadcasts: DefaultDict[int, List[float]] = defaultdict(list)
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    readers: Dict[int, asyncio.StreamReader] = {}
+    conversations: List[asyncio.Task] = []
+    inbound: int = 0
+    started: float = loop.time()
+    for record in records[1:]:
+        if record.kind == recorder.BROADCAST:
+            broadcasts[record.room_id].append(record.timestamp)
+            continue
+        if record.kind == recorder.OUTBOUND:
+            continue
+        deadline: float = started + record.timestamp
+        if broadcasts[record.room_id]:
+            count: int = len(broadcasts[record.room_id])
+            anchor: Optional[float] = await clock.wait_for(record.room_id, count)
+            if anchor is not None:
+                deadline = anchor + record.timestamp - broadcasts[record.room_id][-1]
+        # Always yield, so the server handles a frame before the next one
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        if record.kind == recorder.OPEN:
+            reader = asyncio.StreamReader()
+            readers[record.conn_id] = reader
+            (codec_id,) = recorder.CODEC_ID.unpack(record.payload)
+            conversations.append(
+                asyncio.create_task(
+                    state.handle_conversation(
+                        reader, ReplayWriter(record.conn_id), CODECS[codec_id]
+                    )
+                )
+            )
+        elif record.conn_id in readers:
+            if record.kind == recorder.INBOUND:
+                readers[record.conn_id].feed_data(record.payload)
+                inbound += 1
+            else:
+                readers.pop(record.conn_id).feed_eof()
+
+    # The recording may stop mid-match, when the server was shut down
+    for reader in readers.values():
+        reader.feed_eof()
+    await asyncio.gather(*conversations)
+    await asyncio.gather(
+        *(
+            game.loop_task
+            for game in list(state.room_manager.rooms.values())
+            if game.loop_task is not None
+        ),
+        return_exceptions=True,
+    )
+    return {
+        "connections": len(conversations),
+        "inbound_frames": inbound,
+        "recorded_duration_s": records[-1].timestamp,
+        "replayed_duration_s": loop.time() - started,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Racing Arena session replay")
+    parser.add_argument("log", help="Session log written by server.py --record.")
+    parser.add_argument(
+        "--recording",
+        type=int,
+        default=-1,
+        help="Which recording of the log to replay, counting from 0. Default to the last one.",
+    )
+    parser.add_argument(
+        "--max-speed",
+        action="store_true",
+        help="Skip every wait instead of replaying in real time.",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=LOOP_CHOICES,
+        default="asyncio",
+        help="Event loop for real time replays. Default to asyncio.",
+    )
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    recordings: List[List[Record]] = recorder.read_recordings(args.log)
+    if not recordings:
+        parser.error(f"No recording in {args.log}")
+    try:
+        records: List[Record] = recordings[args.recording]
+    except IndexError:
+        parser.error(f"{args.log} holds {len(recordings)} recordings")
+
+    log_listener = log.setup_logging("WARNING")
+    loop: asyncio.AbstractEventLoop = (
+        VirtualClockLoop() if args.max_speed else new_event_loop(args.loop)
+    )
+    try:
+        started: float = time.perf_counter()
+        report: Dict[str, Any] = loop.run_until_complete(replay(records))
+        report["wall_time_s"] = time.perf_counter() - started
+    finally:
+        loop.close()
+        log_listener.stop()
+
+    expected: Counter = recorded_messages(records)
+    replayed: Counter = Counter(metrics.MESSAGES_SENT.values)
+    report["inbound_frames_per_s"] = report["inbound_frames"] / max(
+        report["wall_time_s"], 1e-9
+    )
+    report["messages_sent"] = sum(replayed.values())
+    # Commands sent a different number of times than in the recording
+    report["diverged"] = {
+        command: {"recorded": expected[command], "replayed": replayed[command]}
+        for command in sorted(expected.keys() | replayed.keys())
+        if expected[command] != replayed[command]
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    if report["diverged"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()